@@ -0,0 +1,86 @@
+"""count issues with triggers
+
+Revision ID: b3e7d2a9c864
+Revises: f7c3a9e5d148
+Create Date: 2026-10-18 21:04:37.219518
+
+The triggers maintaining the issue counts of the repositories are left out of
+autogenerate. A batch migration recreating `issues` drops the SQLite triggers, it
+must create them again.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e7d2a9c864'
+down_revision = 'f7c3a9e5d148'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute(sa.text(
+            "CREATE OR REPLACE FUNCTION issues_count() RETURNS trigger AS $$ BEGIN"
+            " IF TG_OP IN ('UPDATE', 'DELETE') THEN"
+            " UPDATE repositories SET issues_count = issues_count - 1,"
+            " open_issues_count = open_issues_count - OLD.state::int WHERE id = OLD.repository_id;"
+            " END IF;"
+            " IF TG_OP IN ('INSERT', 'UPDATE') THEN"
+            " UPDATE repositories SET issues_count = issues_count + 1,"
+            " open_issues_count = open_issues_count + NEW.state::int WHERE id = NEW.repository_id;"
+            " END IF;"
+            " RETURN NULL;"
+            " END $$ LANGUAGE plpgsql"
+        ))
+        op.execute(sa.text(
+            "CREATE TRIGGER issues_count_insert_delete AFTER INSERT OR DELETE ON issues"
+            " FOR EACH ROW EXECUTE FUNCTION issues_count()"
+        ))
+        op.execute(sa.text(
+            "CREATE TRIGGER issues_count_update AFTER UPDATE OF state, repository_id ON issues FOR EACH ROW"
+            " WHEN (OLD.state IS DISTINCT FROM NEW.state OR OLD.repository_id IS DISTINCT FROM NEW.repository_id)"
+            " EXECUTE FUNCTION issues_count()"
+        ))
+    else:
+        op.execute(sa.text(
+            "CREATE TRIGGER IF NOT EXISTS issues_count_insert AFTER INSERT ON issues BEGIN"
+            " UPDATE repositories SET issues_count = issues_count + 1,"
+            " open_issues_count = open_issues_count + new.state WHERE id = new.repository_id;"
+            " END"
+        ))
+        op.execute(sa.text(
+            "CREATE TRIGGER IF NOT EXISTS issues_count_delete AFTER DELETE ON issues BEGIN"
+            " UPDATE repositories SET issues_count = issues_count - 1,"
+            " open_issues_count = open_issues_count - old.state WHERE id = old.repository_id;"
+            " END"
+        ))
+        op.execute(sa.text(
+            "CREATE TRIGGER IF NOT EXISTS issues_count_update AFTER UPDATE OF state, repository_id ON issues"
+            " WHEN old.state IS NOT new.state OR old.repository_id IS NOT new.repository_id BEGIN"
+            " UPDATE repositories SET issues_count = issues_count - 1,"
+            " open_issues_count = open_issues_count - old.state WHERE id = old.repository_id;"
+            " UPDATE repositories SET issues_count = issues_count + 1,"
+            " open_issues_count = open_issues_count + new.state WHERE id = new.repository_id;"
+            " END"
+        ))
+
+    # Count them once, the triggers keep the counts from here on.
+    op.execute(sa.text(
+        "UPDATE repositories SET"
+        " issues_count = (SELECT COUNT(*) FROM issues WHERE issues.repository_id = repositories.id),"
+        " open_issues_count = (SELECT COUNT(*) FROM issues"
+        " WHERE issues.repository_id = repositories.id AND issues.state)"
+    ))
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute(sa.text("DROP TRIGGER IF EXISTS issues_count_update ON issues"))
+        op.execute(sa.text("DROP TRIGGER IF EXISTS issues_count_insert_delete ON issues"))
+        op.execute(sa.text("DROP FUNCTION IF EXISTS issues_count()"))
+    else:
+        op.execute(sa.text("DROP TRIGGER IF EXISTS issues_count_update"))
+        op.execute(sa.text("DROP TRIGGER IF EXISTS issues_count_delete"))
+        op.execute(sa.text("DROP TRIGGER IF EXISTS issues_count_insert"))
@@ -0,0 +1,57 @@
+"""add issues full text search
+
+Revision ID: f7c3a9e5d148
+Revises: e2b8d4a6c915
+Create Date: 2026-10-18 19:58:12.640385
+
+The FTS5 table and its triggers are SQLite only and left out of autogenerate, see
+`include_name` in env.py. A batch migration recreating `issues` drops the triggers,
+it must create them again.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f7c3a9e5d148'
+down_revision = 'e2b8d4a6c915'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    op.execute(sa.text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS issues_fts USING fts5("
+        "title, repository_name, content='issues', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+    ))
+    op.execute(sa.text(
+        "CREATE TRIGGER IF NOT EXISTS issues_fts_insert AFTER INSERT ON issues BEGIN"
+        " INSERT INTO issues_fts(rowid, title, repository_name) VALUES (new.id, new.title, new.repository_name);"
+        " END"
+    ))
+    op.execute(sa.text(
+        "CREATE TRIGGER IF NOT EXISTS issues_fts_delete AFTER DELETE ON issues BEGIN"
+        " INSERT INTO issues_fts(issues_fts, rowid, title, repository_name)"
+        " VALUES ('delete', old.id, old.title, old.repository_name);"
+        " END"
+    ))
+    op.execute(sa.text(
+        "CREATE TRIGGER IF NOT EXISTS issues_fts_update AFTER UPDATE OF title, repository_name ON issues BEGIN"
+        " INSERT INTO issues_fts(issues_fts, rowid, title, repository_name)"
+        " VALUES ('delete', old.id, old.title, old.repository_name);"
+        " INSERT INTO issues_fts(rowid, title, repository_name) VALUES (new.id, new.title, new.repository_name);"
+        " END"
+    ))
+    # Index the existing issues
+    op.execute(sa.text("INSERT INTO issues_fts(issues_fts) VALUES ('rebuild')"))
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    op.execute(sa.text("DROP TRIGGER IF EXISTS issues_fts_update"))
+    op.execute(sa.text("DROP TRIGGER IF EXISTS issues_fts_delete"))
+    op.execute(sa.text("DROP TRIGGER IF EXISTS issues_fts_insert"))
+    op.execute(sa.text("DROP TABLE IF EXISTS issues_fts"))
@@ -0,0 +1,145 @@
+"""Cached allowlist of the IP ranges GitHub sends webhooks from.
+
+The ranges come from the GitHub meta API. They are kept in memory for a TTL,
+refreshed in the background once stale and persisted to disk so a cold start
+doesn't depend on the API being reachable.
+"""
+import asyncio
+import json
+import os
+import time
+from os import getenv
+from pathlib import Path
+
+from httpx import AsyncClient, HTTPError
+
+from app import metrics
+from app.cidr import CidrSet
+from app.log import get_logger
+
+log = get_logger(__name__)
+
+GITHUB_META_URL = getenv("GITHUB_META_URL", "https://api.github.com/meta")
+GITHUB_META_TTL = int(getenv("GITHUB_META_TTL", "3600"))
+GITHUB_META_RETRY = int(getenv("GITHUB_META_RETRY", "60"))
+GITHUB_META_SNAPSHOT = getenv("GITHUB_META_SNAPSHOT", "data/github_meta.json")
+
+
+class GithubHooksAllowlist:
+    """
+    Stale-while-revalidate cache of the `hooks` ranges of the GitHub meta API.
+
+    Args:
+        url (str): The GitHub meta API URL.
+        ttl (int): Seconds after which the ranges are refreshed in the background.
+        snapshot_path (str | None): Where the last known good ranges are persisted.
+            Nothing is persisted if empty.
+    """
+
+    def __init__(
+        self,
+        url: str = GITHUB_META_URL,
+        ttl: int = GITHUB_META_TTL,
+        snapshot_path: str | None = GITHUB_META_SNAPSHOT,
+    ):
+        self.url = url
+        self.ttl = ttl
+        self.snapshot_path = Path(snapshot_path) if snapshot_path else None
+        self.networks = CidrSet()
+        self.fetched_at: float | None = None
+        self._last_attempt = 0.0
+        self._refresh_task: asyncio.Task | None = None
+        self._lock = asyncio.Lock()
+
+    async def get_networks(self) -> CidrSet:
+        """
+        Return the allowed networks, fetching them only on a cold miss.
+
+        After a failed fetch, cold misses fail right away until `GITHUB_META_RETRY`
+        seconds have passed, instead of each waiting for the GitHub meta API.
+
+        Raises:
+            ValueError: If there is neither a cached nor a persisted
+            allowlist and the GitHub meta API can't be fetched.
+        """
+        if self.fetched_at is None:
+            self.load_snapshot()
+
+        if self.fetched_at is None:
+            metrics.inc("github_meta.miss")
+            async with self._lock:
+                if self.fetched_at is None:
+                    if time.time() - self._last_attempt < GITHUB_META_RETRY:
+                        raise ValueError("Could not fetch GitHub hook ranges, retrying later")
+                    await self.refresh()
+        elif time.time() - self.fetched_at < self.ttl:
+            metrics.inc("github_meta.hit")
+        else:
+            metrics.inc("github_meta.stale")
+            self.schedule_refresh()
+
+        return self.networks
+
+    def schedule_refresh(self) -> None:
+        """Refresh the allowlist in the background unless a refresh is running or failed recently."""
+        if self._refresh_task and not self._refresh_task.done():
+            return
+        if time.time() - self._last_attempt < GITHUB_META_RETRY:
+            return
+        self._refresh_task = asyncio.create_task(self._background_refresh())
+
+    async def _background_refresh(self) -> None:
+        try:
+            await self.refresh()
+        except ValueError as exc:
+            log.warning("Keeping stale GitHub hook ranges, refresh failed: %s", exc)
+
+    async def refresh(self) -> None:
+        """Fetch the hook ranges from the GitHub meta API and persist them."""
+        self._last_attempt = time.time()
+        try:
+            async with AsyncClient() as client:
+                response = await client.get(self.url, timeout=10)
+            if response.status_code != 200:
+                raise ValueError(f"GitHub meta API responded with {response.status_code}")
+            hooks = response.json()["hooks"]
+            self.set_hooks(hooks, time.time())
+        except (HTTPError, ValueError, KeyError) as exc:
+            metrics.inc("github_meta.refresh_failure")
+            raise ValueError(f"Could not fetch GitHub hook ranges: {exc}") from exc
+
+        metrics.inc("github_meta.refresh")
+        log.debug("Fetched %s GitHub hook ranges", len(hooks))
+        self.save_snapshot(hooks)
+
+    def set_hooks(self, hooks: list[str], fetched_at: float) -> None:
+        """Compile `hooks` once and make them the current allowlist."""
+        self.networks = CidrSet(hooks)
+        self.fetched_at = fetched_at
+
+    def load_snapshot(self) -> None:
+        """Load the last known good allowlist from disk, if there is one."""
+        if not self.snapshot_path or not self.snapshot_path.exists():
+            return
+        try:
+            snapshot = json.loads(self.snapshot_path.read_text(encoding="utf-8"))
+            self.set_hooks(snapshot["hooks"], snapshot["fetched_at"])
+        except (OSError, ValueError, KeyError) as exc:
+            log.warning("Ignoring unreadable GitHub hook ranges snapshot: %s", exc)
+            return
+        metrics.inc("github_meta.snapshot_load")
+
+    def save_snapshot(self, hooks: list[str]) -> None:
+        """Atomically persist `hooks` as the last known good allowlist."""
+        if not self.snapshot_path:
+            return
+        try:
+            self.snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.snapshot_path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps({"fetched_at": self.fetched_at, "hooks": hooks}), encoding="utf-8")
+            os.replace(tmp_path, self.snapshot_path)
+        except OSError as exc:
+            log.warning("Could not persist GitHub hook ranges: %s", exc)
+
+
+github_hooks_allowlist = GithubHooksAllowlist()
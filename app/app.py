@@ -1,11 +1,17 @@
 """The app."""
 
+from contextlib import asynccontextmanager
+
 from dotenv import load_dotenv
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.routers import users, auth, repositories, index, webhooks
+from app import metrics, outbox, page_cache
+from app.coalescer import issue_coalescer
+from app.hashing import password_hasher
+from app.reconcile import reconciler
+from app.routers import users, auth, repositories, issues, index, webhooks, export
 from app.log import get_logger
 
 log = get_logger(__name__)
@@ -13,16 +19,32 @@ log = get_logger(__name__)
 load_dotenv()
 
 
+@asynccontextmanager
+async def lifespan(fapp: FastAPI):
+    """Warm up the page cache and run the background workers and reconciliation for as long as the app is up."""
+    if outbox.is_enabled():
+        await outbox.worker_pool.start()
+    await page_cache.warmup(fapp)
+    reconciler.start()
+    yield
+    await reconciler.stop()
+    await outbox.worker_pool.stop()
+    await issue_coalescer.flush_all()
+    password_hasher.shutdown()
+
+
 def create_app() -> FastAPI:
-    fapp = FastAPI(title="elementary Bounties")
+    fapp = FastAPI(title="elementary Bounties", lifespan=lifespan)
 
     log.info("✨ Starting elementary Bounties!")
 
     fapp.include_router(users.router)
     fapp.include_router(auth.router)
     fapp.include_router(repositories.router)
+    fapp.include_router(issues.router)
     fapp.include_router(index.router)
     fapp.include_router(webhooks.router)
+    fapp.include_router(export.router)
 
     # For local development
     origins = [
@@ -42,6 +64,10 @@ def create_app() -> FastAPI:
     async def health() -> str:
         return "ok"
 
+    @fapp.get("/metrics")
+    async def get_metrics() -> dict:
+        return metrics.snapshot()
+
     return fapp
 
 
@@ -0,0 +1,55 @@
+"""Matching of IP addresses against a set of networks."""
+import bisect
+import ipaddress
+from typing import Iterable
+
+Address = ipaddress.IPv4Address | ipaddress.IPv6Address
+Network = ipaddress.IPv4Network | ipaddress.IPv6Network
+
+
+class CidrSet:
+    """
+    Immutable set of IPv4 and IPv6 networks with logarithmic membership tests.
+
+    The networks are converted to integer ranges which are sorted and merged once,
+    so a lookup is a single bisect over the ranges of the address family.
+
+    Args:
+        networks (Iterable[str | Network]): The networks in CIDR notation.
+    """
+
+    def __init__(self, networks: Iterable[str | Network] = ()):
+        ranges: dict[int, list[tuple[int, int]]] = {4: [], 6: []}
+        for network in networks:
+            network = ipaddress.ip_network(network, strict=False)
+            ranges[network.version].append(
+                (int(network.network_address), int(network.broadcast_address))
+            )
+
+        self._starts: dict[int, list[int]] = {}
+        self._ends: dict[int, list[int]] = {}
+        for version, version_ranges in ranges.items():
+            starts: list[int] = []
+            ends: list[int] = []
+            for start, end in sorted(version_ranges):
+                if ends and start <= ends[-1] + 1:
+                    ends[-1] = max(ends[-1], end)
+                else:
+                    starts.append(start)
+                    ends.append(end)
+            self._starts[version] = starts
+            self._ends[version] = ends
+
+    def __contains__(self, address: str | Address) -> bool:
+        if isinstance(address, str):
+            address = ipaddress.ip_address(address)
+        if isinstance(address, ipaddress.IPv6Address) and address.ipv4_mapped:
+            address = address.ipv4_mapped
+
+        value = int(address)
+        index = bisect.bisect_right(self._starts[address.version], value) - 1
+        return index >= 0 and value <= self._ends[address.version][index]
+
+    def __len__(self) -> int:
+        """Number of disjoint ranges left after merging."""
+        return len(self._starts[4]) + len(self._starts[6])
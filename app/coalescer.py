@@ -0,0 +1,108 @@
+"""Coalescing of bursts of GitHub events for the same issue.
+
+A label or edit session on GitHub fires many `issues` events for one issue within
+seconds. With a coalescing window, events are held per (repository, number) and
+only the latest one is written once the window is over.
+
+The deliveries of the held events are recorded in the transaction of that write, so
+a delivery whose write failed, or was lost in a crash, is not skipped when GitHub
+redelivers it.
+"""
+import asyncio
+from os import getenv
+from typing import Any, AsyncGenerator, Callable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import events, metrics
+import app.crud.deliveries as crud_deliveries
+from app.db import sessions
+from app.log import get_logger
+
+log = get_logger(__name__)
+
+GITHUB_COALESCE_WINDOW = float(getenv("GITHUB_COALESCE_WINDOW", "0"))
+
+
+class IssueEventCoalescer:
+    """
+    Merge GitHub issue events arriving within `window` seconds into one write.
+
+    Args:
+        window (float): The coalescing window in seconds, 0 disables coalescing.
+        session_factory: Async generator yielding a database session.
+    """
+
+    def __init__(
+        self,
+        window: float = GITHUB_COALESCE_WINDOW,
+        session_factory: Callable[[], AsyncGenerator[AsyncSession, Any]] = sessions.get_async_session,
+    ):
+        self.window = window
+        self.session_factory = session_factory
+        self._pending: dict[tuple[str, int], dict] = {}
+        # The ids of the deliveries merged into each pending event
+        self._deliveries: dict[tuple[str, int], set[str]] = {}
+        self._timers: dict[tuple[str, int], asyncio.Task] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    def submit(self, payload: dict, delivery_id: str | None = None) -> None:
+        """
+        Hold `payload` until the window of its issue is over, replacing older events.
+
+        Args:
+            payload (dict): The GitHub webhook payload.
+            delivery_id (str | None): The `X-GitHub-Delivery` header, recorded with the write.
+        """
+        issue = payload["issue"]
+        key = (issue["repository_url"], issue["number"])
+        if delivery_id:
+            self._deliveries.setdefault(key, set()).add(delivery_id)
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            metrics.inc("coalescer.writes_saved")
+            # Deliveries may arrive out of order, keep the most recent state of the issue.
+            if pending["issue"].get("updated_at", "") > issue.get("updated_at", ""):
+                return
+        self._pending[key] = payload
+
+        if key not in self._timers:
+            self._timers[key] = asyncio.create_task(self._flush_later(key))
+
+    async def _flush_later(self, key: tuple[str, int]) -> None:
+        await asyncio.sleep(self.window)
+        self._timers.pop(key, None)
+        await self.flush(key)
+
+    async def flush(self, key: tuple[str, int]) -> None:
+        """Write the pending event of `key` and record its deliveries in a single transaction."""
+        payload = self._pending.pop(key, None)
+        delivery_ids = self._deliveries.pop(key, set())
+        if payload is None:
+            return
+        try:
+            async with sessions.session_scope(self.session_factory) as db:
+                await events.process_github_issue(payload, db, delivery_ids)
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            # The deliveries aren't recorded either, so a redelivery is processed
+            log.error("Could not write coalesced event for %s#%s: %s", *key, exc)
+            metrics.inc("coalescer.failures")
+            return
+        crud_deliveries.remember_deliveries(delivery_ids)
+        metrics.inc("coalescer.writes")
+
+    async def flush_all(self) -> None:
+        """Write every pending event right away, e.g. on shutdown."""
+        for timer in self._timers.values():
+            timer.cancel()
+        await asyncio.gather(*self._timers.values(), return_exceptions=True)
+        self._timers.clear()
+        for key in list(self._pending):
+            await self.flush(key)
+
+
+issue_coalescer = IssueEventCoalescer()
@@ -0,0 +1,181 @@
+"""CRUD operations on the bounty contributions ledger.
+
+Every credited bounty is a row of `bounty_contributions`. The totals and counts
+stored on issues and repositories are maintained incrementally in the transaction
+writing the ledger, and can be recomputed from it in chunks by `verify_aggregates`.
+"""
+import asyncio
+from datetime import datetime, UTC
+from os import getenv
+from typing import Any, AsyncGenerator, Callable, Iterable
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import metrics, page_cache
+from app.db import sessions
+from app.db.models import BountyContributions, Issues, Repositories
+from app.leaderboard import hot_issues
+from app.log import get_logger
+
+log = get_logger(__name__)
+
+BOUNTY_VERIFY_CHUNK = int(getenv("BOUNTY_VERIFY_CHUNK", "500"))
+
+
+async def record_contribution(
+    db: AsyncSession,
+    issue_id: int,
+    repository_id: int,
+    amount: int,
+    stripe_event_id: str | None = None,
+) -> None:
+    """
+    Append a contribution to the ledger and add it to the aggregates of its repository.
+
+    The aggregates of the issue are updated by the caller, together with its
+    cumulative bounty. The caller commits.
+
+    Args:
+        db (AsyncSession): The asynchronous database session.
+        issue_id (int): The id of the credited issue.
+        repository_id (int): The id of the repository of the issue.
+        amount (int): The credited amount.
+        stripe_event_id (str | None): The id of the Stripe event crediting it.
+    """
+    await db.execute(
+        insert(BountyContributions).values(
+            issue_id=issue_id,
+            repository_id=repository_id,
+            amount=amount,
+            stripe_event_id=stripe_event_id,
+            created_at=datetime.now(UTC).replace(tzinfo=None),
+        )
+    )
+    await db.execute(
+        update(Repositories)
+        .where(Repositories.id == repository_id)
+        .values(
+            total_bounty=Repositories.total_bounty + amount,
+            contributions_count=Repositories.contributions_count + 1,
+        )
+    )
+
+
+async def _verify_chunk(db: AsyncSession, model, ledger_key, total_column, after_id: int, chunk_size: int):
+    """
+    Recompute the aggregates of up to `chunk_size` rows of `model` with an id above `after_id`.
+
+    Returns:
+        tuple: The last id of the chunk, None once every row was verified, and the
+            number of rows whose aggregates were fixed.
+    """
+    ledger = (
+        select(
+            ledger_key.label("owner_id"),
+            func.sum(BountyContributions.amount).label("total"),
+            func.count().label("count"),
+        )
+        .group_by(ledger_key)
+        .subquery()
+    )
+    rows = (
+        await db.execute(
+            select(
+                model.id,
+                total_column,
+                model.contributions_count,
+                func.coalesce(ledger.c.total, 0),
+                func.coalesce(ledger.c.count, 0),
+            )
+            .outerjoin(ledger, ledger.c.owner_id == model.id)
+            .where(model.id > after_id)
+            .order_by(model.id)
+            .limit(chunk_size)
+        )
+    ).all()
+    if not rows:
+        return None, 0
+
+    mismatched = [row[0] for row in rows if (row[1], row[2]) != (row[3], row[4])]
+    if mismatched:
+        log.warning("Fixing the bounty aggregates of %s %s", model.__tablename__, mismatched)
+        await _recompute(db, model, ledger_key, total_column, mismatched)
+    await db.commit()
+    return rows[-1][0], len(mismatched)
+
+
+async def _recompute(db: AsyncSession, model, ledger_key, total_column, ids: Iterable[int]) -> None:
+    # Recompute from the ledger in the UPDATE itself, so that a contribution
+    # credited since the ids were selected is not lost.
+    await db.execute(
+        update(model)
+        .where(model.id.in_(ids))
+        .values(
+            {
+                total_column: select(func.coalesce(func.sum(BountyContributions.amount), 0))
+                .where(ledger_key == model.id)
+                .scalar_subquery(),
+                model.contributions_count: select(func.count()).where(ledger_key == model.id).scalar_subquery(),
+            }
+        )
+    )
+    page_cache.bump_data_version_on_commit(db)
+
+
+async def recompute_aggregates(db: AsyncSession, issue_ids: Iterable[int], repository_ids: Iterable[int]) -> None:
+    """
+    Recompute the bounty aggregates of issues and repositories from the ledger, the caller commits.
+
+    Args:
+        db (AsyncSession): The asynchronous database session.
+        issue_ids: The ids of the issues, missing ones are skipped.
+        repository_ids: The ids of the repositories, missing ones are skipped.
+    """
+    issue_ids, repository_ids = set(issue_ids), set(repository_ids)
+    if issue_ids:
+        await _recompute(db, Issues, BountyContributions.issue_id, Issues.cumulative_bounty, issue_ids)
+    if repository_ids:
+        await _recompute(
+            db, Repositories, BountyContributions.repository_id, Repositories.total_bounty, repository_ids
+        )
+
+
+async def verify_aggregates(
+    session_factory: Callable[[], AsyncGenerator[AsyncSession, Any]] = sessions.get_async_session,
+    chunk_size: int = BOUNTY_VERIFY_CHUNK,
+) -> int:
+    """
+    Recompute the bounty aggregates of every issue and repository from the ledger.
+
+    Rows are verified `chunk_size` at a time, each chunk in its own short transaction,
+    and aggregates that drifted from the ledger are fixed.
+
+    Args:
+        session_factory: Async generator yielding a database session.
+        chunk_size (int): The number of rows verified per transaction.
+
+    Returns:
+        int: The number of issues and repositories whose aggregates were fixed.
+    """
+    fixed = 0
+    targets = [
+        (Issues, BountyContributions.issue_id, Issues.cumulative_bounty),
+        (Repositories, BountyContributions.repository_id, Repositories.total_bounty),
+    ]
+    for model, ledger_key, total_column in targets:
+        after_id = 0
+        while after_id is not None:
+            async with sessions.session_scope(session_factory) as db:
+                after_id, chunk_fixed = await _verify_chunk(
+                    db, model, ledger_key, total_column, after_id, chunk_size
+                )
+            fixed += chunk_fixed
+            # Let webhooks in between chunks.
+            await asyncio.sleep(0)
+
+    if fixed:
+        hot_issues.invalidate()
+    metrics.inc("bounties.aggregates_fixed", fixed)
+    log.info("Verified the bounty aggregates, %s fixed", fixed)
+    return fixed
@@ -0,0 +1,123 @@
+"""CRUD operations on webhook deliveries.
+
+GitHub redelivers webhooks, so handled delivery ids are kept in a bounded
+in-memory LRU in front of the `webhook_deliveries` table.
+"""
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, UTC
+from os import getenv
+
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import metrics
+from app.db import upsert
+from app.db.models import WebhookDeliveries
+from app.log import get_logger
+
+log = get_logger(__name__)
+
+DELIVERY_CACHE_SIZE = int(getenv("DELIVERY_CACHE_SIZE", "4096"))
+DELIVERY_RETENTION_DAYS = int(getenv("DELIVERY_RETENTION_DAYS", "14"))
+DELIVERY_PRUNE_INTERVAL = int(getenv("DELIVERY_PRUNE_INTERVAL", "3600"))
+
+_seen_deliveries: OrderedDict[str, None] = OrderedDict()
+_last_prune = float("-inf")
+
+
+def _remember(delivery_id: str) -> None:
+    _seen_deliveries[delivery_id] = None
+    _seen_deliveries.move_to_end(delivery_id)
+    if len(_seen_deliveries) > DELIVERY_CACHE_SIZE:
+        _seen_deliveries.popitem(last=False)
+
+
+def clear_delivery_cache() -> None:
+    """Forget the in-memory delivery ids."""
+    _seen_deliveries.clear()
+
+
+async def is_duplicate_delivery(delivery_id: str, db: AsyncSession) -> bool:
+    """
+    Check if a delivery was already handled.
+
+    Args:
+        delivery_id (str): The `X-GitHub-Delivery` header.
+        db (AsyncSession): The asynchronous database session.
+
+    Returns:
+        bool: True if the delivery is known.
+    """
+    if delivery_id in _seen_deliveries:
+        _seen_deliveries.move_to_end(delivery_id)
+        metrics.inc("deliveries.duplicate")
+        return True
+
+    if await db.get(WebhookDeliveries, delivery_id) is not None:
+        _remember(delivery_id)
+        metrics.inc("deliveries.duplicate")
+        return True
+    return False
+
+
+async def record_delivery(delivery_id: str, db: AsyncSession) -> None:
+    """
+    Persist a handled delivery and prune expired ones from time to time.
+
+    Args:
+        delivery_id (str): The `X-GitHub-Delivery` header.
+        db (AsyncSession): The asynchronous database session.
+    """
+    now = datetime.now(UTC).replace(tzinfo=None)
+    db.add(WebhookDeliveries(delivery_id=delivery_id, received_at=now))
+    try:
+        await db.commit()
+    except IntegrityError:
+        # A concurrent request for the same delivery recorded it first.
+        await db.rollback()
+    _remember(delivery_id)
+    await prune_deliveries(db, now)
+
+
+async def add_deliveries(delivery_ids: set[str], db: AsyncSession) -> None:
+    """
+    Record handled deliveries in the current transaction, the caller commits.
+
+    Deliveries already recorded are skipped. Call `remember_deliveries` once committed.
+
+    Args:
+        delivery_ids (set[str]): The `X-GitHub-Delivery` headers.
+        db (AsyncSession): The asynchronous database session.
+    """
+    if not delivery_ids:
+        return
+    now = datetime.now(UTC).replace(tzinfo=None)
+    await db.execute(
+        upsert.insert(db, WebhookDeliveries)
+        .values([{"delivery_id": delivery_id, "received_at": now} for delivery_id in delivery_ids])
+        .on_conflict_do_nothing(index_elements=[WebhookDeliveries.delivery_id])
+    )
+
+
+def remember_deliveries(delivery_ids: set[str]) -> None:
+    """Remember deliveries recorded by `add_deliveries` once their transaction is committed."""
+    for delivery_id in delivery_ids:
+        _remember(delivery_id)
+
+
+async def prune_deliveries(db: AsyncSession, now: datetime) -> None:
+    """Delete deliveries older than the retention, at most once per prune interval."""
+    global _last_prune  # pylint: disable=global-statement
+    if time.monotonic() - _last_prune < DELIVERY_PRUNE_INTERVAL:
+        return
+    _last_prune = time.monotonic()
+
+    result = await db.execute(
+        delete(WebhookDeliveries).where(
+            WebhookDeliveries.received_at < now - timedelta(days=DELIVERY_RETENTION_DAYS)
+        )
+    )
+    await db.commit()
+    log.debug("Pruned %s webhook deliveries", result.rowcount)
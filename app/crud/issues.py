@@ -1,75 +1,157 @@
 """CRUD operations on issues."""
+import functools
+import re
+from datetime import datetime, UTC
+from os import getenv
+from typing import Sequence
+
+from sqlalchemy.engine import RowMapping
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import Select, and_, bindparam, column, func, literal_column, select, table, update
 
-from app.db.models import Repositories, Issues
+from app import page_cache
+from app.db import upsert
+from app.db.models import Issues, StripeEvents
+import app.crud.contributions as crud_contributions
 import app.crud.repositories as crud_repos
+from app.leaderboard import HOT_ISSUE_COLUMNS, hot_issues
 from app.log import get_logger
 
 log = get_logger(__name__)
 
+# Comma separated labels an issue must all have to be eligible for bounty. The GitHub
+# sync and reconciliation fetch the issues with these labels, so that they see every
+# issue the webhooks store.
+BOUNTY_LABELS = getenv("BOUNTY_LABELS", "confirmed")
+
+# The columns of an issue in search results
+SEARCH_COLUMNS = (
+    Issues.id,
+    Issues.title,
+    Issues.state,
+    Issues.url,
+    Issues.repository_name,
+    Issues.number,
+    Issues.cumulative_bounty,
+)
+# Weights of the title and repository name in the bm25 rank
+SEARCH_WEIGHTS = (10.0, 2.0)
+# The length from which the last word of a search matches as a prefix
+SEARCH_MIN_PREFIX = 3
+# The number of most recent matches which are ranked, bm25 scores every ranked match
+SEARCH_MAX_CANDIDATES = int(getenv("SEARCH_MAX_CANDIDATES", "1000"))
 
-async def check_issue_exists(issue, repo_db: Repositories, db: AsyncSession) -> Issues:
+
+async def upsert_issue(issue, db: AsyncSession) -> int:
     """
-    Asynchronously checks if an issue exists in the database.
+    Insert an issue or update its title, state and url in a single statement.
+
+    The statement is an `INSERT ... ON CONFLICT (repository_id, number) DO UPDATE`,
+    the issue counts of the repository are maintained by triggers. The caller commits.
 
     Args:
         issue (dict): A dictionary object from the Github API.
         db (AsyncSession): The asynchronous database session.
 
     Returns:
-        Issues: The issue object if it exists, otherwise None.
+        int: The id of the issue.
     """
-    result_issues = await db.execute(
-        select(Issues)
-        .where(Issues.repository_id == repo_db.id)
-        .where(Issues.number == issue["number"])
+    repo_name = crud_repos.repository_name_from_issue(issue)
+    repo_id = await crud_repos.get_repository_id(repo_name, db, create=True)
+    stmt = upsert.insert(db, Issues).values(
+        title=issue["title"],
+        state=issue_state_to_bool(issue["state"]),
+        number=issue["number"],
+        repository_id=repo_id,
+        repository_name=repo_name,
+        url=issue["html_url"],
+        cumulative_bounty=0,
     )
-    return result_issues.scalars().first()
-
-
-async def get_issue(issue, db: AsyncSession):
-    repo_db = await crud_repos.get_repository_by_issue(issue, db)
-    issue_db = await check_issue_exists(issue, repo_db, db)
-    if not issue_db:
-        log.warning("Issue does not exist in the database")
-        log.debug("Trying to add a new issue '%s' in %s", issue["title"], repo_db.id)
-        issue_db = Issues(
-            title=issue["title"],
-            repository_id=repo_db.id,
-            number=issue["number"],
-            url=issue["html_url"],
-        )
-        db.add(issue_db)
-        await db.commit()
-        log.debug("Issue %s '%s' add to the database", issue["number"], issue["title"])
-    return issue_db
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Issues.repository_id, Issues.number],
+        set_={
+            "title": stmt.excluded.title,
+            "state": stmt.excluded.state,
+            "url": stmt.excluded.url,
+            "repository_name": stmt.excluded.repository_name,
+        },
+    ).returning(Issues.id)
+    issue_id = await db.scalar(stmt)
+    page_cache.bump_data_version_on_commit(db)
+    log.debug("Issue %s '%s' upserted in %s", issue["number"], issue["title"], repo_name)
+    return issue_id
 
 
 def is_eligible_for_bounty(issue) -> bool:
-    """An issue is eligible if it has the right label attached to it."""
-    label_whitelist = ["confirmed"]
+    """An issue is eligible if it has every one of the `BOUNTY_LABELS` attached to it."""
+    required = {label.strip() for label in BOUNTY_LABELS.split(",") if label.strip()}
+    label_names = {label["name"] for label in issue["labels"]}
 
-    labels = issue["labels"]
-    label_names = list(map(lambda label: label["name"], labels))
+    return required <= label_names
 
-    return any(i in label_whitelist for i in label_names)
 
+async def bump_bounty_issue(
+    db: AsyncSession, repository_name: str, number: int, bounty_amount: int, event_id: str | None = None
+) -> int | None:
+    """
+    Atomically add `bounty_amount` to the cumulative bounty of an issue and commit.
 
-async def bump_bounty_issue(db, repository_name: str, number: int, bounty_amount: int):
-    print(repository_name, number, bounty_amount)
-    repository = await crud_repos.get_repository_by_name(repository_name, db)
+    The increment is a single `UPDATE ... SET cumulative_bounty = cumulative_bounty + :amount`,
+    so concurrent checkouts can't overwrite each other. With an `event_id`, the Stripe
+    event is recorded in the same transaction and an event that was already credited
+    is skipped. The contribution is also appended to the ledger and added to the
+    aggregates of the repository, and the hot issues leaderboard is updated.
 
-    result_issues = await db.execute(
-        select(Issues)
-        .where(Issues.repository_id == repository.id)
-        .where(Issues.number == number)
-    )
+    Args:
+        db (AsyncSession): The asynchronous database session.
+        repository_name (str): The name of the repository of the issue.
+        number (int): The number of the issue.
+        bounty_amount (int): The amount to add.
+        event_id (str | None): The id of the Stripe event crediting the bounty.
+
+    Returns:
+        int or None: The new cumulative bounty, None if the event was already credited.
+
+    Raises:
+        LookupError: If the issue doesn't exist.
+    """
+    # Before writing anything, a concurrent lookup of the repository may need the
+    # single SQLite writer connection.
+    repository_id = await crud_repos.get_repository_id(repository_name, db)
+    if event_id is not None:
+        recorded = await db.scalar(
+            upsert.insert(db, StripeEvents)
+            .values(event_id=event_id, credited_at=datetime.now(UTC).replace(tzinfo=None))
+            .on_conflict_do_nothing(index_elements=[StripeEvents.event_id])
+            .returning(StripeEvents.event_id)
+        )
+        if recorded is None:
+            await db.rollback()
+            log.info("Stripe event %s was already credited", event_id)
+            return None
 
-    issue = result_issues.scalars().first()
+    credited = (
+        await db.execute(
+            update(Issues)
+            .where(Issues.repository_id == repository_id)
+            .where(Issues.number == number)
+            .values(
+                cumulative_bounty=Issues.cumulative_bounty + bounty_amount,
+                contributions_count=Issues.contributions_count + 1,
+            )
+            .returning(*HOT_ISSUE_COLUMNS)
+        )
+    ).mappings().first()
+    if credited is None:
+        await db.rollback()
+        raise LookupError(f"Issue {repository_name}#{number} does not exist")
 
-    issue.cumulative_bounty = issue.cumulative_bounty + bounty_amount
+    await crud_contributions.record_contribution(db, credited["id"], repository_id, bounty_amount, event_id)
+    page_cache.bump_data_version_on_commit(db)
     await db.commit()
+    hot_issues.credit(credited)
+    log.debug("Credited %s to %s#%s", bounty_amount, repository_name, number)
+    return credited["cumulative_bounty"]
 
 
 def issue_state_to_str(state: bool) -> str:
@@ -84,3 +166,139 @@ def issue_state_to_bool(state: str) -> bool:
     if state == "open":
         return True
     return False
+
+
+def fts_query(text: str) -> str | None:
+    """
+    Turn user input into an FTS5 query matching every word, the last one as a prefix.
+
+    Words are quoted, so FTS5 operators and syntax in the input are searched literally.
+    A last word shorter than `SEARCH_MIN_PREFIX` is matched whole, a prefix that short
+    matches so many issues that ranking them dominates the query.
+
+    Returns:
+        str or None: The query, None if there are no words to search.
+    """
+    words = re.findall(r"\w+", text)
+    if not words:
+        return None
+    query = " ".join(f'"{word}"' for word in words)
+    return query + "*" if len(words[-1]) >= SEARCH_MIN_PREFIX else query
+
+
+@functools.cache
+def _fts_search_statement(min_bounty: bool, max_bounty: bool, include_closed: bool) -> Select:
+    """
+    The SQLite search for a combination of filters, with bound parameters.
+
+    Built once per combination, building it takes longer than running it.
+    """
+    issues_fts = table("issues_fts", column("rowid"))
+    # FTS5 functions and MATCH take the table itself, not one of its columns
+    fts_table = literal_column("issues_fts")
+    candidates = (
+        select(*SEARCH_COLUMNS, func.bm25(fts_table, *SEARCH_WEIGHTS).label("rank"))
+        .select_from(issues_fts)
+        .join(Issues, Issues.id == issues_fts.c.rowid)
+        .where(fts_table.op("MATCH")(bindparam("match")))
+    )
+    # The filters select the candidates, so that older matches aren't left out of them
+    if min_bounty:
+        candidates = candidates.where(Issues.cumulative_bounty >= bindparam("min_bounty"))
+    if max_bounty:
+        candidates = candidates.where(Issues.cumulative_bounty <= bindparam("max_bounty"))
+    if not include_closed:
+        candidates = candidates.where(Issues.state.is_(True))
+    candidates = candidates.order_by(issues_fts.c.rowid.desc()).limit(bindparam("candidates")).subquery()
+    return (
+        select(*(candidates.c[search_column.key] for search_column in SEARCH_COLUMNS))
+        .order_by(candidates.c.rank, candidates.c.id)
+        .limit(bindparam("limit"))
+        .offset(bindparam("offset"))
+    )
+
+
+def search_statement(
+    dialect_name: str,
+    query: str,
+    min_bounty: int | None = None,
+    max_bounty: int | None = None,
+    include_closed: bool = False,
+    limit: int = 20,
+    offset: int = 0,
+) -> tuple[Select, dict] | None:
+    """
+    The SELECT of `search_issues` for a database dialect and its parameters.
+
+    On SQLite, the `issues_fts` full-text index is matched and the most recent
+    `SEARCH_MAX_CANDIDATES` issues matching the query and the filters are ranked by
+    bm25, a match in the title weighing more than one in the repository name. Scoring
+    every match of a word found in most titles would take tens of milliseconds. Other
+    databases fall back to a case insensitive substring match ranked by bounty.
+
+    Returns:
+        tuple or None: The statement and its parameters, None if `query` has no words.
+    """
+    match = fts_query(query)
+    if match is None:
+        return None
+    params = {"limit": limit + 1, "offset": offset, "min_bounty": min_bounty, "max_bounty": max_bounty}
+
+    if dialect_name == "sqlite":
+        stmt = _fts_search_statement(min_bounty is not None, max_bounty is not None, include_closed)
+        return stmt, {**params, "match": match, "candidates": SEARCH_MAX_CANDIDATES}
+
+    words = re.findall(r"\w+", query)
+    stmt = (
+        select(*SEARCH_COLUMNS)
+        .where(
+            and_(
+                *(Issues.title.ilike(f"%{word}%") | Issues.repository_name.ilike(f"%{word}%") for word in words)
+            )
+        )
+        .order_by(Issues.cumulative_bounty.desc(), Issues.id)
+        .limit(bindparam("limit"))
+        .offset(bindparam("offset"))
+    )
+    if min_bounty is not None:
+        stmt = stmt.where(Issues.cumulative_bounty >= bindparam("min_bounty"))
+    if max_bounty is not None:
+        stmt = stmt.where(Issues.cumulative_bounty <= bindparam("max_bounty"))
+    if not include_closed:
+        stmt = stmt.where(Issues.state.is_(True))
+    return stmt, params
+
+
+async def search_issues(
+    db: AsyncSession,
+    query: str,
+    min_bounty: int | None = None,
+    max_bounty: int | None = None,
+    include_closed: bool = False,
+    limit: int = 20,
+    offset: int = 0,
+) -> Sequence[RowMapping]:
+    """
+    Search issues by title and repository name, best matches first.
+
+    See `search_statement` for the matching and the ranking.
+
+    Args:
+        db (AsyncSession): The asynchronous database session.
+        query (str): The words to search, the last one may be incomplete.
+        min_bounty (int | None): Only issues with at least this cumulative bounty.
+        max_bounty (int | None): Only issues with at most this cumulative bounty.
+        include_closed (bool): Whether to include closed issues.
+        limit (int): Select at most `limit` + 1 issues, to know whether there are more.
+        offset (int): The number of best matches to skip.
+
+    Returns:
+        Sequence[RowMapping]: The `SEARCH_COLUMNS` of the matching issues.
+    """
+    search = search_statement(
+        db.get_bind().dialect.name, query, min_bounty, max_bounty, include_closed, limit, offset
+    )
+    if search is None:
+        return []
+    result = await db.execute(*search)
+    return result.mappings().all()
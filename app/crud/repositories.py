@@ -1,11 +1,49 @@
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+"""CRUD operations on repositories.
+
+Repository ids are looked up by name on every webhook, so the name to id mapping
+is cached in process. Concurrent lookups of the same missing repository are
+coalesced so that only one of them inserts it.
+"""
+import asyncio
 import logging
 
-from app.db.models import Repositories
+from typing import Sequence
+
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.engine import RowMapping
+from sqlalchemy.orm import object_session, raiseload, selectinload
+
+from app import metrics, page_cache, pagination
+from app.db import upsert
+from app.db.models import Issues, Repositories
 
 logger = logging.getLogger("uvicorn.error")
 
+_repository_ids: dict[str, int] = {}
+_pending_repositories: dict[str, asyncio.Future] = {}
+
+
+def invalidate_repository_cache(repo_name: str | None = None) -> None:
+    """Forget the cached id of `repo_name`, or of every repository."""
+    if repo_name is None:
+        _repository_ids.clear()
+    else:
+        _repository_ids.pop(repo_name, None)
+
+
+@event.listens_for(Repositories, "after_delete")
+def _evict_deleted_repository(_mapper, _connection, target: Repositories) -> None:
+    invalidate_repository_cache(target.name)
+    page_cache.bump_data_version_on_commit(object_session(target))
+
+
+@event.listens_for(Repositories, "after_update")
+def _evict_renamed_repository(_mapper, _connection, target: Repositories) -> None:
+    for repo_name in inspect(target).attrs.name.history.deleted:
+        invalidate_repository_cache(repo_name)
+    page_cache.bump_data_version_on_commit(object_session(target))
+
 
 async def check_repository_exists(
     repo_name: str, db: AsyncSession
@@ -19,33 +57,108 @@ async def check_repository_exists(
 
     Returns:
         Repositories or None: The repository object if it exists, otherwise None.
+            Its issues are not loaded.
     """
     result = await db.execute(
-        select(Repositories).where(Repositories.name == repo_name)
+        select(Repositories)
+        .where(Repositories.name == repo_name)
+        .options(raiseload(Repositories.issues))
     )
     return result.scalars().first()
 
 
-async def get_repository_by_issue(issue, db: AsyncSession) -> Repositories:
+def repository_name_from_issue(issue) -> str:
+    """Get the repository name from the `repository_url` of a Github API issue."""
+    return issue["repository_url"].split("/")[-1]
+
+
+async def get_repository_id(repo_name: str, db: AsyncSession, create: bool = False) -> int | None:
     """
-    Get or create a repository by issue.
+    Get the id of a repository by its name, from the cache if possible.
+
+    With `create`, a missing repository is inserted and committed. Concurrent calls
+    for the same missing repository wait for the first one instead of inserting it again,
+    unless their session already holds a connection, which the first one may need.
 
     Args:
-        issue (dict): The issue containing the repository URL.
+        repo_name (str): The name of the repository.
         db (AsyncSession): The database session to use for the query.
+        create (bool): Whether to insert the repository if it doesn't exist.
 
     Returns:
-        Repositories: The repository object.
+        int or None: The id of the repository, None if it doesn't exist and isn't created.
     """
-    repo_name = issue["repository_url"].split("/")[-1]
-    repo_db = await check_repository_exists(repo_name, db)
-    if not repo_db:
-        print("Repository does not exist.")
-        repo_db = Repositories(name=repo_name)
-        db.add(repo_db)
-        await db.commit()
-        print("Issue created.")
-    return repo_db
+    repo_id = _repository_ids.get(repo_name)
+    if repo_id is not None:
+        metrics.inc("repositories.cache_hit")
+        return repo_id
+    metrics.inc("repositories.cache_miss")
+
+    pending = _pending_repositories.get(repo_name)
+    if pending is not None and db.in_transaction():
+        # This session holds a connection, the pending lookup may be queued for it
+        # behind a single writer connection: look the repository up on it instead.
+        return await _lookup_repository(repo_name, db, create)
+    if pending is not None:
+        repo_id = await asyncio.shield(pending)
+        if repo_id is not None or not create:
+            return repo_id
+        # The pending lookup didn't create the repository
+        return await get_repository_id(repo_name, db, create)
+
+    future = asyncio.get_running_loop().create_future()
+    _pending_repositories[repo_name] = future
+    try:
+        repo_id = await _lookup_repository(repo_name, db, create)
+    except BaseException as exc:
+        future.set_exception(exc)
+        future.exception()  # Nobody may be waiting, don't warn about it
+        raise
+    finally:
+        del _pending_repositories[repo_name]
+
+    future.set_result(repo_id)
+    return repo_id
+
+
+async def _lookup_repository(repo_name: str, db: AsyncSession, create: bool) -> int | None:
+    repo_id = await db.scalar(select(Repositories.id).where(Repositories.name == repo_name))
+    if repo_id is None and create:
+        repo_id = await _insert_repository(repo_name, db)
+    if repo_id is not None:
+        _repository_ids[repo_name] = repo_id
+    return repo_id
+
+
+async def _insert_repository(repo_name: str, db: AsyncSession) -> int:
+    logger.info("Repository %s does not exist, adding it.", repo_name)
+    repo_id = await db.scalar(
+        upsert.insert(db, Repositories)
+        .values(name=repo_name, is_visible=True, issues_count=0, open_issues_count=0)
+        .on_conflict_do_nothing(index_elements=[Repositories.name])
+        .returning(Repositories.id)
+    )
+    if repo_id is None:
+        # Another process inserted it first
+        repo_id = await db.scalar(select(Repositories.id).where(Repositories.name == repo_name))
+    else:
+        page_cache.bump_data_version_on_commit(db)
+    # Commit right away, the other waiters reference it from their own sessions
+    await db.commit()
+    return repo_id
+
+
+def issue_counts() -> dict:
+    """The `issues_count` and `open_issues_count` of a repository, counted from its issues."""
+    return {
+        Repositories.issues_count: select(func.count())
+        .where(Issues.repository_id == Repositories.id)
+        .scalar_subquery(),
+        Repositories.open_issues_count: select(func.count())
+        .where(Issues.repository_id == Repositories.id)
+        .where(Issues.state.is_(True))
+        .scalar_subquery(),
+    }
 
 
 async def get_repository_by_name(repo_name: str, db: AsyncSession) -> Repositories:
@@ -54,3 +167,58 @@ async def get_repository_by_name(repo_name: str, db: AsyncSession) -> Repositori
         select(Repositories).where(Repositories.name == repo_name)
     )
     return result_repository.scalars().first()
+
+
+async def get_repository_summaries(
+    db: AsyncSession, visible_only: bool = True, limit: int | None = None, after: int | None = None
+) -> Sequence[RowMapping]:
+    """
+    List repositories with their number of issues and total bounty, without loading the issues.
+
+    The counts and total are maintained on the repository rows, only those are read.
+
+    Args:
+        db (AsyncSession): The database session to use for the query.
+        visible_only (bool): Whether to skip repositories which are not visible.
+        limit (int | None): Select at most `limit` + 1 repositories, see `pagination.keyset`.
+        after (int | None): Only select repositories with an id above `after`.
+
+    Returns:
+        Sequence[RowMapping]: The columns of each repository with its `issues_count`,
+            `open_issues_count` and `total_bounty`, ordered by id.
+    """
+    stmt = select(
+        Repositories.id,
+        Repositories.name,
+        Repositories.description,
+        Repositories.is_visible,
+        Repositories.issues_count,
+        Repositories.open_issues_count,
+        Repositories.total_bounty,
+    )
+    if visible_only:
+        stmt = stmt.where(Repositories.is_visible.is_(True))
+    result = await db.execute(pagination.keyset(stmt, Repositories.id, limit, after))
+    return result.mappings().all()
+
+
+async def get_repositories_with_issues(
+    db: AsyncSession, visible_only: bool = True, limit: int | None = None, after: int | None = None
+) -> Sequence[Repositories]:
+    """
+    List repositories along with all of their issues, in two queries.
+
+    Args:
+        db (AsyncSession): The database session to use for the query.
+        visible_only (bool): Whether to skip repositories which are not visible.
+        limit (int | None): Select at most `limit` + 1 repositories, see `pagination.keyset`.
+        after (int | None): Only select repositories with an id above `after`.
+
+    Returns:
+        Sequence[Repositories]: The repositories with their issues loaded, ordered by id.
+    """
+    stmt = select(Repositories).options(selectinload(Repositories.issues))
+    if visible_only:
+        stmt = stmt.where(Repositories.is_visible.is_(True))
+    result = await db.execute(pagination.keyset(stmt, Repositories.id, limit, after))
+    return result.scalars().all()
@@ -0,0 +1,103 @@
+"""CRUD operations on refresh tokens.
+
+Every issued refresh token is a row keyed by its JWT id (`jti`). A refresh token is
+single use: refreshing revokes it and issues a new one. A revoked token presented
+again was likely stolen, so every refresh token of its user is revoked.
+"""
+import time
+import uuid
+from datetime import datetime, timedelta, UTC
+from os import getenv
+
+from sqlalchemy import delete, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import metrics
+from app.db.models import RefreshTokens
+from app.log import get_logger
+from app.utils import REFRESH_TOKEN_EXPIRE_MINUTES, create_refresh_token
+
+log = get_logger(__name__)
+
+REFRESH_TOKEN_PRUNE_INTERVAL = int(getenv("REFRESH_TOKEN_PRUNE_INTERVAL", "3600"))
+
+_last_prune = float("-inf")
+
+
+def utcnow() -> datetime:
+    """Naive UTC now, as stored in the refresh tokens table."""
+    return datetime.now(UTC).replace(tzinfo=None)
+
+
+async def issue_refresh_token(db: AsyncSession, user_id: int, email: str) -> str:
+    """
+    Create a refresh token for a user and record it, the caller commits.
+
+    Args:
+        db (AsyncSession): The asynchronous database session.
+        user_id (int): The id of the user the token is for.
+        email (str): The email of the user, the subject of the token.
+
+    Returns:
+        str: The encoded refresh token.
+    """
+    jti = uuid.uuid4().hex
+    expires_delta = timedelta(minutes=REFRESH_TOKEN_EXPIRE_MINUTES)
+    db.add(RefreshTokens(jti=jti, user_id=user_id, expires_at=utcnow() + expires_delta))
+    return create_refresh_token({"sub": email, "jti": jti, "type": "refresh"}, expires_delta)
+
+
+async def consume_refresh_token(db: AsyncSession, jti: str) -> int | None:
+    """
+    Revoke a refresh token so that it can't be used again, the caller commits.
+
+    The token is looked up and revoked by its primary key in a single statement,
+    so two concurrent refreshes with the same token can't both succeed.
+
+    Args:
+        db (AsyncSession): The asynchronous database session.
+        jti (str): The JWT id of the refresh token.
+
+    Returns:
+        int or None: The id of the user of the token, None if the token is unknown,
+            expired or was already used.
+    """
+    now = utcnow()
+    user_id = await db.scalar(
+        update(RefreshTokens)
+        .where(RefreshTokens.jti == jti)
+        .where(RefreshTokens.revoked_at.is_(None))
+        .where(RefreshTokens.expires_at > now)
+        .values(revoked_at=now)
+        .returning(RefreshTokens.user_id)
+    )
+    if user_id is not None:
+        return user_id
+
+    token = await db.get(RefreshTokens, jti)
+    if token is not None and token.revoked_at is not None:
+        log.warning("Refresh token %s of user %s was reused, revoking all of them", jti, token.user_id)
+        metrics.inc("refresh_tokens.reused")
+        await revoke_user_tokens(db, token.user_id)
+    return None
+
+
+async def revoke_user_tokens(db: AsyncSession, user_id: int) -> None:
+    """Revoke every refresh token of a user, the caller commits."""
+    await db.execute(
+        update(RefreshTokens)
+        .where(RefreshTokens.user_id == user_id)
+        .where(RefreshTokens.revoked_at.is_(None))
+        .values(revoked_at=utcnow())
+    )
+
+
+async def prune_refresh_tokens(db: AsyncSession) -> None:
+    """Delete expired refresh tokens, at most once per prune interval. The caller commits."""
+    global _last_prune  # pylint: disable=global-statement
+    if time.monotonic() - _last_prune < REFRESH_TOKEN_PRUNE_INTERVAL:
+        return
+    _last_prune = time.monotonic()
+
+    result = await db.execute(delete(RefreshTokens).where(RefreshTokens.expires_at < utcnow()))
+    log.debug("Pruned %s refresh tokens", result.rowcount)
@@ -21,13 +21,18 @@ class Repositories(Base):
     __tablename__ = "repositories"
 
     id = sa.Column(sa.Integer, primary_key=True, index=True)
-    name = sa.Column(sa.Text, nullable=False)
+    name = sa.Column(sa.Text, nullable=False, unique=True, index=True)
     description = sa.Column(sa.Text, nullable=True)
     is_visible = sa.Column(sa.Boolean, nullable=False, default=True)
+    # Maintained by triggers on its issues, and with the writes of its contributions
     issues_count = sa.Column(sa.Integer, nullable=False, default=0)
+    open_issues_count = sa.Column(sa.Integer, nullable=False, default=0)
+    total_bounty = sa.Column(sa.Integer, nullable=False, default=0)
+    contributions_count = sa.Column(sa.Integer, nullable=False, default=0)
 
+    # Issues are only loaded on request, e.g. with `selectinload`
     issues = relationship(
-        "Issues", back_populates="repository", lazy="selectin", cascade="all, delete"
+        "Issues", back_populates="repository", lazy="raise", cascade="all, delete"
     )
 
 
@@ -38,7 +43,176 @@ class Issues(Base):
     title = sa.Column(sa.Text, nullable=False)
     state = sa.Column(sa.Boolean, nullable=False, default=False)
     cumulative_bounty = sa.Column(sa.Integer, nullable=False, default=0)
-    repository = relationship("Repositories", back_populates="issues", lazy="selectin")
+    contributions_count = sa.Column(sa.Integer, nullable=False, default=0)
+    repository = relationship("Repositories", back_populates="issues", lazy="raise")
     repository_id = sa.Column(sa.Integer, ForeignKey("repositories.id"), nullable=False, index=True)
     repository_name = sa.Column(sa.Text, nullable=True)
     url = sa.Column(sa.Text, nullable=False)
+
+    __table_args__ = (
+        sa.UniqueConstraint("repository_id", "number", name="uq_issues_repository_id_number"),
+        # Only issues with a bounty are ranked on the hot page
+        sa.Index(
+            "ix_issues_cumulative_bounty_hot",
+            "cumulative_bounty",
+            postgresql_where=sa.text("cumulative_bounty > 0"),
+            sqlite_where=sa.text("cumulative_bounty > 0"),
+        ),
+    )
+
+
+# Full-text index of the issue titles and repository names, on SQLite only. It is an
+# external content FTS5 table over `issues`, kept in sync by triggers. The update
+# trigger only fires for the indexed columns, so crediting bounties doesn't reindex.
+ISSUES_FTS_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS issues_fts USING fts5("
+    "title, repository_name, content='issues', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS issues_fts_insert AFTER INSERT ON issues BEGIN"
+    " INSERT INTO issues_fts(rowid, title, repository_name) VALUES (new.id, new.title, new.repository_name);"
+    " END",
+    "CREATE TRIGGER IF NOT EXISTS issues_fts_delete AFTER DELETE ON issues BEGIN"
+    " INSERT INTO issues_fts(issues_fts, rowid, title, repository_name)"
+    " VALUES ('delete', old.id, old.title, old.repository_name);"
+    " END",
+    "CREATE TRIGGER IF NOT EXISTS issues_fts_update AFTER UPDATE OF title, repository_name ON issues BEGIN"
+    " INSERT INTO issues_fts(issues_fts, rowid, title, repository_name)"
+    " VALUES ('delete', old.id, old.title, old.repository_name);"
+    " INSERT INTO issues_fts(rowid, title, repository_name) VALUES (new.id, new.title, new.repository_name);"
+    " END",
+)
+
+for _statement in ISSUES_FTS_DDL:
+    sa.event.listen(Issues.__table__, "after_create", sa.DDL(_statement).execute_if(dialect="sqlite"))
+sa.event.listen(
+    Issues.__table__, "before_drop", sa.DDL("DROP TABLE IF EXISTS issues_fts").execute_if(dialect="sqlite")
+)
+
+# The `issues_count` and `open_issues_count` of the repositories, maintained by triggers
+# so that every write of issues counts them, including upserts and bulk writes, without
+# reading an issue before writing it. The update triggers only fire when the state or
+# the repository of an issue changes.
+ISSUE_COUNTS_DDL = {
+    "sqlite": (
+        "CREATE TRIGGER IF NOT EXISTS issues_count_insert AFTER INSERT ON issues BEGIN"
+        " UPDATE repositories SET issues_count = issues_count + 1,"
+        " open_issues_count = open_issues_count + new.state WHERE id = new.repository_id;"
+        " END",
+        "CREATE TRIGGER IF NOT EXISTS issues_count_delete AFTER DELETE ON issues BEGIN"
+        " UPDATE repositories SET issues_count = issues_count - 1,"
+        " open_issues_count = open_issues_count - old.state WHERE id = old.repository_id;"
+        " END",
+        "CREATE TRIGGER IF NOT EXISTS issues_count_update AFTER UPDATE OF state, repository_id ON issues"
+        " WHEN old.state IS NOT new.state OR old.repository_id IS NOT new.repository_id BEGIN"
+        " UPDATE repositories SET issues_count = issues_count - 1,"
+        " open_issues_count = open_issues_count - old.state WHERE id = old.repository_id;"
+        " UPDATE repositories SET issues_count = issues_count + 1,"
+        " open_issues_count = open_issues_count + new.state WHERE id = new.repository_id;"
+        " END",
+    ),
+    "postgresql": (
+        "CREATE OR REPLACE FUNCTION issues_count() RETURNS trigger AS $$ BEGIN"
+        " IF TG_OP IN ('UPDATE', 'DELETE') THEN"
+        " UPDATE repositories SET issues_count = issues_count - 1,"
+        " open_issues_count = open_issues_count - OLD.state::int WHERE id = OLD.repository_id;"
+        " END IF;"
+        " IF TG_OP IN ('INSERT', 'UPDATE') THEN"
+        " UPDATE repositories SET issues_count = issues_count + 1,"
+        " open_issues_count = open_issues_count + NEW.state::int WHERE id = NEW.repository_id;"
+        " END IF;"
+        " RETURN NULL;"
+        " END $$ LANGUAGE plpgsql",
+        "CREATE TRIGGER issues_count_insert_delete AFTER INSERT OR DELETE ON issues"
+        " FOR EACH ROW EXECUTE FUNCTION issues_count()",
+        "CREATE TRIGGER issues_count_update AFTER UPDATE OF state, repository_id ON issues FOR EACH ROW"
+        " WHEN (OLD.state IS DISTINCT FROM NEW.state OR OLD.repository_id IS DISTINCT FROM NEW.repository_id)"
+        " EXECUTE FUNCTION issues_count()",
+    ),
+}
+
+for _dialect, _statements in ISSUE_COUNTS_DDL.items():
+    for _statement in _statements:
+        sa.event.listen(Issues.__table__, "after_create", sa.DDL(_statement).execute_if(dialect=_dialect))
+sa.event.listen(
+    Issues.__table__,
+    "after_drop",
+    sa.DDL("DROP FUNCTION IF EXISTS issues_count()").execute_if(dialect="postgresql"),
+)
+
+
+class WebhookOutbox(Base):
+    """Verified webhook payloads waiting to be processed."""
+    __tablename__ = "webhook_outbox"
+
+    id = sa.Column(sa.Integer, primary_key=True, index=True)
+    source = sa.Column(sa.Text, nullable=False)
+    event = sa.Column(sa.Text, nullable=True)
+    payload = sa.Column(sa.Text, nullable=False)
+    attempts = sa.Column(sa.Integer, nullable=False, default=0)
+    last_error = sa.Column(sa.Text, nullable=True)
+    created_at = sa.Column(sa.DateTime, nullable=False)
+    next_attempt_at = sa.Column(sa.DateTime, nullable=False, index=True)
+
+
+class WebhookDeadLetters(Base):
+    """Webhook payloads which kept failing and were given up on."""
+    __tablename__ = "webhook_dead_letters"
+
+    id = sa.Column(sa.Integer, primary_key=True, index=True)
+    source = sa.Column(sa.Text, nullable=False)
+    event = sa.Column(sa.Text, nullable=True)
+    payload = sa.Column(sa.Text, nullable=False)
+    attempts = sa.Column(sa.Integer, nullable=False)
+    last_error = sa.Column(sa.Text, nullable=True)
+    created_at = sa.Column(sa.DateTime, nullable=False)
+    failed_at = sa.Column(sa.DateTime, nullable=False)
+
+
+class WebhookDeliveries(Base):
+    """GitHub webhook deliveries which were already handled."""
+    __tablename__ = "webhook_deliveries"
+
+    delivery_id = sa.Column(sa.Text, primary_key=True)
+    received_at = sa.Column(sa.DateTime, nullable=False, index=True)
+
+
+class StripeEvents(Base):
+    """Stripe events whose bounty was already credited."""
+    __tablename__ = "stripe_events"
+
+    event_id = sa.Column(sa.Text, primary_key=True)
+    credited_at = sa.Column(sa.DateTime, nullable=False, index=True)
+
+
+class BountyContributions(Base):
+    """Ledger of the bounties credited to issues."""
+    __tablename__ = "bounty_contributions"
+
+    id = sa.Column(sa.Integer, primary_key=True, index=True)
+    issue_id = sa.Column(sa.Integer, ForeignKey("issues.id"), nullable=False, index=True)
+    repository_id = sa.Column(sa.Integer, ForeignKey("repositories.id"), nullable=False, index=True)
+    amount = sa.Column(sa.Integer, nullable=False)
+    stripe_event_id = sa.Column(sa.Text, nullable=True)
+    created_at = sa.Column(sa.DateTime, nullable=False, index=True)
+
+
+class RefreshTokens(Base):
+    """Issued refresh tokens by their JWT id, a token is revoked once rotated."""
+    __tablename__ = "refresh_tokens"
+
+    jti = sa.Column(sa.Text, primary_key=True)
+    user_id = sa.Column(sa.Integer, ForeignKey("users.id"), nullable=False, index=True)
+    expires_at = sa.Column(sa.DateTime, nullable=False, index=True)
+    revoked_at = sa.Column(sa.DateTime, nullable=True)
+
+
+class SyncCheckpoints(Base):
+    """Where the GitHub sync of a listing stopped, and its validators for conditional requests."""
+    __tablename__ = "sync_checkpoints"
+
+    resource = sa.Column(sa.Text, primary_key=True)
+    etag = sa.Column(sa.Text, nullable=True)
+    last_modified = sa.Column(sa.Text, nullable=True)
+    since = sa.Column(sa.DateTime, nullable=True)
+    synced_at = sa.Column(sa.DateTime, nullable=True)
+    # Digest of the listing when it was last fetched, for reconciliation
+    digest = sa.Column(sa.Text, nullable=True)
@@ -13,3 +13,7 @@ class TokenData(BaseModel):
 class TokenPayload(BaseModel):
     sub: str | None = None
     exp: float | None = None
+
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
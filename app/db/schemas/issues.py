@@ -16,3 +16,16 @@ class Issues(BaseModel):
 
 class IssuesCreate(Issues):
     title: str = Field(max=200)
+
+
+class IssueSearchResult(BaseModel):
+    id: int
+    title: str
+    state: bool
+    number: int
+    cumulative_bounty: int
+    repository_name: str
+    url: str
+
+    class Config:
+        from_attributes = True
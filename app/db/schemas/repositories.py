@@ -9,12 +9,27 @@ class Repositories(BaseModel):
     id: int
     is_visible: bool
     issues_count: int
+    open_issues_count: int = 0
+    total_bounty: int = 0
     issues: list[Issues] = []
 
     class Config:
         from_attributes = True
 
 
+class RepositorySummary(BaseModel):
+    name: str
+    description: str | None
+    id: int
+    is_visible: bool
+    issues_count: int
+    open_issues_count: int
+    total_bounty: int
+
+    class Config:
+        from_attributes = True
+
+
 class RepositoriesCreate(Repositories):
     name: str = Field(max_length=50)
     description: str | None = Field(max_length=250)
@@ -1,45 +1,129 @@
+"""Database engines and sessions.
+
+Requests that only read use `get_read_session`, requests that write use
+`get_async_session`. On SQLite, connections are set up for concurrent reads while
+writing (WAL journal), reads go through a pool of read-only connections and every
+write goes through a single writer connection, so writers queue in the pool instead
+of failing on the database lock. Other databases use the same engine for both.
+"""
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
 from sqlalchemy.ext.asyncio import (
     create_async_engine,
+    AsyncEngine,
     AsyncSession,
-    async_scoped_session,
     async_sessionmaker,
 )
 
 from os import getenv
-from typing import Any, AsyncGenerator
-from asyncio import current_task
+from typing import Any, AsyncGenerator, Callable
+from contextlib import asynccontextmanager
 
 
 SQLALCHEMY_DATABASE_URL = getenv("DATABASE_URL", "sqlite+aiosqlite:///data/sql_app.db")
+DB_POOL_SIZE = int(getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(getenv("DB_POOL_TIMEOUT", "30"))
+# Seconds after which a connection is replaced, -1 to keep connections forever
+DB_POOL_RECYCLE = int(getenv("DB_POOL_RECYCLE", "3600"))
+DB_POOL_PRE_PING = getenv("DB_POOL_PRE_PING", "True").lower() in ["true", "1"]
+
+SQLITE_BUSY_TIMEOUT = int(getenv("SQLITE_BUSY_TIMEOUT", "5000"))  # milliseconds
+SQLITE_MMAP_SIZE = int(getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))  # bytes
+SQLITE_CACHE_SIZE = int(getenv("SQLITE_CACHE_SIZE", "-65536"))  # pages, or KiB if negative
+
+IS_SQLITE = make_url(SQLALCHEMY_DATABASE_URL).get_backend_name() == "sqlite"
+
+
+def pool_options(pool_size: int = DB_POOL_SIZE, max_overflow: int = DB_MAX_OVERFLOW) -> dict[str, Any]:
+    """The connection pool arguments of an engine, a pool size of 0 opens a connection per session."""
+    if pool_size == 0:
+        return {"poolclass": NullPool}
+    return {
+        "poolclass": AsyncAdaptedQueuePool,
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": DB_POOL_TIMEOUT,
+    }
+
+
+def set_sqlite_pragmas(engine: AsyncEngine, read_only: bool = False) -> None:
+    """Configure every new SQLite connection of `engine`, e.g. for WAL mode."""
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def on_connect(dbapi_connection, _connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        # Durable across application crashes, only a power loss may lose the last commits
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
 
 async_engine = create_async_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING,
+    # SQLite allows a single writer at a time
+    **(pool_options(pool_size=1, max_overflow=0) if IS_SQLITE else pool_options()),
 )
 
-
-async def create_async_session() -> async_scoped_session[AsyncSession]:
-    async_session = async_scoped_session(
-        async_sessionmaker(
-            autocommit=False,
-            autoflush=False,
-            class_=AsyncSession,
-            bind=async_engine,
-            expire_on_commit=False,
-        ),
-        scopefunc=current_task,
+if IS_SQLITE:
+    set_sqlite_pragmas(async_engine)
+    async_read_engine = create_async_engine(
+        SQLALCHEMY_DATABASE_URL,
+        connect_args={"check_same_thread": False},
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        **pool_options(),
     )
+    set_sqlite_pragmas(async_read_engine, read_only=True)
+else:
+    async_read_engine = async_engine
 
-    return async_session
+# Created once, every request gets its own session from them
+async_session_factory = async_sessionmaker(
+    autoflush=False,
+    class_=AsyncSession,
+    bind=async_engine,
+    expire_on_commit=False,
+)
+async_read_session_factory = async_sessionmaker(
+    autoflush=False,
+    class_=AsyncSession,
+    bind=async_read_engine,
+    expire_on_commit=False,
+)
 
 
 async def get_async_session() -> AsyncGenerator[AsyncSession, Any]:
-    Session = await create_async_session()
-    async with Session() as session:
-        try:
-            yield session
-        finally:
-            await session.close()
+    async with async_session_factory() as session:
+        yield session
+
+
+async def get_read_session() -> AsyncGenerator[AsyncSession, Any]:
+    """A session for requests which only read, it can't write on SQLite."""
+    async with async_read_session_factory() as session:
+        yield session
+
+
+@asynccontextmanager
+async def session_scope(
+    session_factory: Callable[[], AsyncGenerator[AsyncSession, Any]] = get_async_session,
+) -> AsyncGenerator[AsyncSession, Any]:
+    """Open a session outside of a request, e.g. in background workers."""
+    session_generator = session_factory()
+    try:
+        yield await anext(session_generator)
+    finally:
+        await session_generator.aclose()
 
 
 Base: Any = declarative_base()
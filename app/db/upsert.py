@@ -0,0 +1,23 @@
+"""Dialect specific INSERT statements.
+
+SQLite and PostgreSQL both support `INSERT ... ON CONFLICT` and `RETURNING`,
+but SQLAlchemy exposes them through the dialect's own `insert` construct.
+"""
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def insert(db: AsyncSession, table):
+    """
+    Return an INSERT for `table` with `on_conflict_do_*` for the dialect of `db`.
+
+    Args:
+        db (AsyncSession): The asynchronous database session.
+        table: The model or table to insert into.
+
+    Returns:
+        Insert: A PostgreSQL or SQLite insert statement.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(table)
+    return sqlite.insert(table)
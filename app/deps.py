@@ -1,4 +1,7 @@
+import time
+from collections import OrderedDict
 from datetime import datetime
+from os import getenv
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from .utils import ALGORITHM, JWT_SECRET_KEY
@@ -7,6 +10,7 @@ from jose import jwt
 from jose.exceptions import JWTError
 from pydantic import ValidationError
 from sqlalchemy import select
+from app import metrics
 from app.db.models import Users
 from app.db.schemas import users as user_schemas
 from app.db.schemas import auth as auth_schemas
@@ -17,13 +21,65 @@ from sqlalchemy.ext.asyncio import (
 
 reuseable_oauth = OAuth2PasswordBearer(tokenUrl="/auth/login", scheme_name="JWT")
 
+USER_CACHE_SIZE = int(getenv("USER_CACHE_SIZE", "1024"))
+USER_CACHE_TTL = float(getenv("USER_CACHE_TTL", "60"))
+
+# token -> (expiry timestamp, user)
+_user_cache: OrderedDict[str, tuple[float, user_schemas.Users]] = OrderedDict()
+
+
+def clear_user_cache() -> None:
+    """Forget every cached user."""
+    _user_cache.clear()
+
+
+def invalidate_user(email: str) -> None:
+    """Forget the cached tokens of a user, e.g. once it is deleted."""
+    for token in [token for token, (_, user) in _user_cache.items() if user.email == email]:
+        del _user_cache[token]
+
+
+def _cached_user(token: str) -> user_schemas.Users | None:
+    cached = _user_cache.get(token)
+    if cached is None:
+        return None
+    expires_at, user = cached
+    if expires_at <= time.time():
+        del _user_cache[token]
+        return None
+    _user_cache.move_to_end(token)
+    return user
+
+
+def _cache_user(token: str, user: user_schemas.Users, token_exp: float) -> None:
+    # Never serve a token from the cache after it expired
+    _user_cache[token] = (min(time.time() + USER_CACHE_TTL, token_exp), user)
+    _user_cache.move_to_end(token)
+    if len(_user_cache) > USER_CACHE_SIZE:
+        _user_cache.popitem(last=False)
+
 
 async def get_current_user(
     token: str = Depends(reuseable_oauth),
-    db: AsyncSession = Depends(sessions.get_async_session),
+    db: AsyncSession = Depends(sessions.get_read_session),
 ) -> user_schemas.Users:
+    """
+    Get the user of a bearer token.
+
+    Verified tokens are cached with a snapshot of their user for `USER_CACHE_TTL`
+    seconds, so that repeated requests skip the JWT verification and the database.
+    """
+    user = _cached_user(token)
+    if user is not None:
+        metrics.inc("users.cache_hit")
+        return user
+    metrics.inc("users.cache_miss")
+
     try:
         payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[ALGORITHM])
+        if payload.get("type") == "refresh":
+            # Only valid at /auth/refresh, even if both tokens share a secret
+            raise JWTError("Refresh tokens can't authenticate requests")
         token_data = auth_schemas.TokenPayload(**payload)
 
         if (
@@ -51,4 +107,6 @@ async def get_current_user(
             detail="Could not find user",
         )
 
+    user = user_schemas.Users.model_validate(user)
+    _cache_user(token, user, token_data.exp)
     return user
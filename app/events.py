@@ -0,0 +1,65 @@
+"""Processing of verified webhook payloads.
+
+Used by the webhook routes directly and by the outbox workers.
+"""
+from typing import Iterable
+
+import stripe
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import app.crud.deliveries as crud_deliveries
+import app.crud.issues as crud_issues
+from app.leaderboard import hot_issues
+from app.log import get_logger
+
+log = get_logger(__name__)
+
+
+async def process_github_issue(payload: dict, db: AsyncSession, delivery_ids: Iterable[str] = ()) -> dict:
+    """
+    Update the issue of a GitHub issue event if it is eligible for bounty.
+
+    The issue, its state and its title are written with a single upsert.
+
+    Args:
+        payload (dict): The GitHub webhook payload.
+        db (AsyncSession): The asynchronous database session.
+        delivery_ids (Iterable[str]): The deliveries of the event, recorded in the
+            transaction of the upsert.
+
+    Returns:
+        dict: A message describing what was done.
+    """
+    issue = payload["issue"]
+
+    if crud_issues.is_eligible_for_bounty(issue):
+        issue_id = await crud_issues.upsert_issue(issue, db)
+        # After the upsert, which commits a new repository as soon as it is inserted
+        await crud_deliveries.add_deliveries(set(delivery_ids), db)
+        await db.commit()
+        hot_issues.update_issue(issue_id, title=issue["title"])
+        return {"message": f"An event for issue #{issue["number"]} received."}
+    return {"message": "Received an event for a non-eligible for bounty issue."}
+
+
+async def process_stripe_event(payload: dict, db: AsyncSession) -> None:
+    """
+    Credit the bounty of a completed Stripe checkout to its issue, once per event.
+
+    Args:
+        payload (dict): The Stripe event.
+        db (AsyncSession): The asynchronous database session.
+    """
+    event = stripe.Event.construct_from(payload, stripe.api_key)
+
+    if event.type == "checkout.session.completed":
+        metadata = event.data.object["metadata"]
+        log.debug("Checkout completed for %s", metadata)
+        bounty_amount = event.data.object["amount_total"]
+        await crud_issues.bump_bounty_issue(
+            db,
+            metadata["repository_name"],
+            int(metadata["issue_number"]),
+            bounty_amount // 100,
+            event_id=payload.get("id"),
+        )
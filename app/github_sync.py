@@ -0,0 +1,484 @@
+"""Synchronization of the repositories and confirmed issues of the GitHub organization.
+
+Repositories and issue pages are fetched concurrently over a shared `httpx.AsyncClient`.
+Every request goes through a scheduler which bounds the number of requests in flight
+and pauses all of them while the GitHub rate limit is exhausted, as announced by the
+`X-RateLimit-Remaining`/`X-RateLimit-Reset` and `Retry-After` headers. Rows are written
+with multi-row upserts, one transaction per batch.
+
+Syncs are incremental: every listing has a checkpoint with the ETag and Last-Modified
+of its first page, requested conditionally so that an unchanged listing costs a
+`304 Not Modified`, and the issues of a repository are only fetched since its last
+sync.
+
+Run with `python -m app.github_sync`.
+"""
+import asyncio
+import time
+from datetime import datetime, UTC
+from itertools import batched
+from os import getenv
+from typing import Any, AsyncGenerator, Callable
+
+import httpx
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import metrics, page_cache
+from app.crud.issues import BOUNTY_LABELS, issue_state_to_bool
+from app.db import sessions, upsert
+from app.db.models import Issues, Repositories, SyncCheckpoints
+from app.leaderboard import hot_issues
+from app.log import get_logger
+
+log = get_logger(__name__)
+
+GITHUB_API_URL = getenv("GITHUB_API_URL", "https://api.github.com")
+GITHUB_TOKEN = getenv("GITHUB_TOKEN", "")
+GITHUB_ORG = getenv("GITHUB_ORG", "elementary")
+GITHUB_SYNC_CONCURRENCY = int(getenv("GITHUB_SYNC_CONCURRENCY", "8"))
+GITHUB_SYNC_BATCH_SIZE = int(getenv("GITHUB_SYNC_BATCH_SIZE", "500"))
+GITHUB_SYNC_MAX_RETRIES = int(getenv("GITHUB_SYNC_MAX_RETRIES", "5"))
+GITHUB_SYNC_PER_PAGE = int(getenv("GITHUB_SYNC_PER_PAGE", "100"))
+# Upper bound of a rate limit pause, in case of a bogus reset time
+GITHUB_SYNC_MAX_PAUSE = float(getenv("GITHUB_SYNC_MAX_PAUSE", "3600"))
+
+# Checkpoint resources, the listing of repositories and that of the issues of each
+REPOSITORIES_RESOURCE = "repositories"
+ISSUES_RESOURCE_PREFIX = "issues:"
+
+
+class GithubSyncError(Exception):
+    """Raised when GitHub keeps rate limiting a request, or a sync is incomplete."""
+
+
+def create_client(base_url: str = GITHUB_API_URL, token: str = GITHUB_TOKEN) -> httpx.AsyncClient:
+    """A client for the GitHub REST API, authenticated if there is a token."""
+    headers = {"Accept": "application/vnd.github+json", "X-GitHub-Api-Version": "2022-11-28"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    return httpx.AsyncClient(base_url=base_url, headers=headers, timeout=30)
+
+
+class GithubSync:
+    """
+    Fetch the repositories and issues of an organization and upsert them.
+
+    Args:
+        client (httpx.AsyncClient): The client of the GitHub API, with its base url.
+        session_factory: Async generator yielding a database session.
+        org (str): The GitHub organization.
+        labels (str): The comma separated labels an issue must have, those of the webhooks by default.
+        concurrency (int): The maximum number of requests in flight.
+        batch_size (int): The number of rows written per statement and transaction.
+        max_retries (int): How many times a rate limited request is retried.
+        per_page (int): The number of items per page of a listing.
+    """
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        session_factory: Callable[[], AsyncGenerator[AsyncSession, Any]] = sessions.get_async_session,
+        org: str = GITHUB_ORG,
+        labels: str = BOUNTY_LABELS,
+        concurrency: int = GITHUB_SYNC_CONCURRENCY,
+        batch_size: int = GITHUB_SYNC_BATCH_SIZE,
+        max_retries: int = GITHUB_SYNC_MAX_RETRIES,
+        per_page: int = GITHUB_SYNC_PER_PAGE,
+    ):
+        self.client = client
+        self.session_factory = session_factory
+        self.org = org
+        self.labels = labels
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.per_page = per_page
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._resume_at = 0.0
+
+    async def _wait_for_rate_limit(self) -> None:
+        while (delay := self._resume_at - time.time()) > 0:
+            await asyncio.sleep(delay)
+
+    def _pause(self, seconds: float) -> None:
+        """Hold every request for `seconds`."""
+        seconds = min(max(seconds, 0.0), GITHUB_SYNC_MAX_PAUSE)
+        self._resume_at = max(self._resume_at, time.time() + seconds)
+
+    def _observe_rate_limit(self, response: httpx.Response) -> bool:
+        """
+        Schedule a pause if the rate limit is exhausted.
+
+        Returns:
+            bool: Whether `response` was rate limited and the request must be retried.
+        """
+        headers = response.headers
+        exhausted = headers.get("x-ratelimit-remaining") == "0"
+        limited = response.status_code == 429 or (
+            response.status_code == 403 and (exhausted or "retry-after" in headers)
+        )
+        if "retry-after" in headers and limited:
+            self._pause(float(headers["retry-after"]))
+        elif exhausted and "x-ratelimit-reset" in headers:
+            self._pause(float(headers["x-ratelimit-reset"]) - time.time())
+        elif limited:
+            # Secondary rate limit without a hint, GitHub asks to wait at least a minute
+            self._pause(60)
+        return limited
+
+    async def get(self, url: str, params: dict | None = None, headers: dict | None = None) -> httpx.Response:
+        """
+        GET `url` when the scheduler allows it, retrying while it is rate limited.
+
+        Returns:
+            httpx.Response: A successful or `304 Not Modified` response.
+
+        Raises:
+            GithubSyncError: If the request is still rate limited after the retries.
+            httpx.HTTPStatusError: If GitHub responds with another error.
+        """
+        for _ in range(self.max_retries + 1):
+            async with self._semaphore:
+                await self._wait_for_rate_limit()
+                response = await self.client.get(url, params=params, headers=headers)
+            metrics.inc("github_sync.requests")
+            if not self._observe_rate_limit(response):
+                if response.status_code == 304:
+                    metrics.inc("github_sync.not_modified")
+                    return response
+                response.raise_for_status()
+                return response
+            metrics.inc("github_sync.rate_limited")
+            log.warning("GitHub rate limited %s, pausing until %s", url, time.ctime(self._resume_at))
+        raise GithubSyncError(f"GitHub kept rate limiting {url}")
+
+    async def get_all(
+        self, url: str, params: dict | None = None, checkpoint: dict | None = None
+    ) -> tuple[list[dict] | None, httpx.Response]:
+        """
+        Fetch every page of a listing.
+
+        The first page announces the last one in its `Link` header, the others are
+        then fetched concurrently. Listings without a last page are followed page by page.
+        With a checkpoint, the first page is requested conditionally.
+
+        Returns:
+            tuple: The items, None if the first page wasn't modified, and the response
+                of the first page.
+        """
+        params = {**(params or {}), "per_page": self.per_page}
+        first = await self.get(url, params={**params, "page": 1}, headers=conditional_headers(checkpoint))
+        if first.status_code == 304:
+            return None, first
+        items = list(first.json())
+
+        last_url = first.links.get("last", {}).get("url")
+        if last_url is not None:
+            last_page = int(httpx.URL(last_url).params.get("page", "1"))
+            pages = await asyncio.gather(
+                *(self.get(url, params={**params, "page": page}) for page in range(2, last_page + 1))
+            )
+            for response in pages:
+                items.extend(response.json())
+            return items, first
+
+        next_url = first.links.get("next", {}).get("url")
+        while next_url is not None:
+            response = await self.get(next_url)
+            items.extend(response.json())
+            next_url = response.links.get("next", {}).get("url")
+        return items, first
+
+    async def fetch_repositories(self, checkpoint: dict | None = None) -> tuple[list[dict] | None, httpx.Response]:
+        """
+        The repositories of the organization which are not archived, None if not modified.
+
+        Newest first, so that a new repository changes the first page.
+        """
+        repos, response = await self.get_all(
+            f"/orgs/{self.org}/repos", {"sort": "created", "direction": "desc"}, checkpoint
+        )
+        if repos is None:
+            return None, response
+        return [repo for repo in repos if not repo.get("archived")], response
+
+    async def fetch_issues(
+        self, repo_name: str, checkpoint: dict | None = None
+    ) -> tuple[list[dict] | None, httpx.Response]:
+        """
+        The issues of a repository with the sync labels, without pull requests.
+
+        Without a `since` checkpoint, the open issues are fetched. With one, the issues
+        updated since then whatever their state, so that closed issues are updated.
+        They are ordered by update, most recent first, so that any update changes the
+        first page and its ETag.
+
+        Returns:
+            tuple: The issues, None if not modified, and the response of the first page.
+        """
+        params = {"labels": self.labels, "sort": "updated", "direction": "desc"}
+        if checkpoint and checkpoint["since"] is not None:
+            params |= {"state": "all", "since": checkpoint["since"].strftime("%Y-%m-%dT%H:%M:%SZ")}
+        issues, response = await self.get_all(f"/repos/{self.org}/{repo_name}/issues", params, checkpoint)
+        if issues is None:
+            return None, response
+        return [issue for issue in issues if "pull_request" not in issue], response
+
+    async def load_checkpoints(self, db: AsyncSession) -> dict[str, dict]:
+        """Every checkpoint by resource."""
+        result = await db.execute(select(SyncCheckpoints))
+        return {
+            checkpoint.resource: {
+                "resource": checkpoint.resource,
+                "etag": checkpoint.etag,
+                "last_modified": checkpoint.last_modified,
+                "since": checkpoint.since,
+                "digest": checkpoint.digest,
+            }
+            for checkpoint in result.scalars()
+        }
+
+    async def write_checkpoints(self, db: AsyncSession, checkpoints: list[dict]) -> None:
+        """Upsert checkpoints, which all have the same keys, the caller commits."""
+        now = utcnow()
+        for batch in batched(checkpoints, self.batch_size):
+            stmt = upsert.insert(db, SyncCheckpoints).values([{**checkpoint, "synced_at": now} for checkpoint in batch])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[SyncCheckpoints.resource],
+                set_={key: stmt.excluded[key] for key in batch[0] if key != "resource"}
+                | {"synced_at": stmt.excluded.synced_at},
+            )
+            await db.execute(stmt)
+
+    async def write_repositories(self, db: AsyncSession, repos: list[dict]) -> dict[str, int]:
+        """
+        Upsert repositories by name, committing each batch.
+
+        A repository seen for the first time gets an empty checkpoint, so that a run
+        interrupted before syncing its issues syncs them on the next run.
+
+        Returns:
+            dict[str, int]: The id of every repository by name.
+        """
+        repository_ids = {}
+        for batch in batched(repos, self.batch_size):
+            stmt = upsert.insert(db, Repositories).values(
+                [
+                    {
+                        "name": repo["name"],
+                        "description": repo.get("description"),
+                        "is_visible": True,
+                        "issues_count": 0,
+                        "open_issues_count": 0,
+                    }
+                    for repo in batch
+                ]
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[Repositories.name],
+                set_={"description": stmt.excluded.description},
+            ).returning(Repositories.name, Repositories.id)
+            repository_ids.update((await db.execute(stmt)).tuples().all())
+            await db.execute(
+                upsert.insert(db, SyncCheckpoints)
+                .values([{"resource": issues_resource(repo["name"])} for repo in batch])
+                .on_conflict_do_nothing(index_elements=[SyncCheckpoints.resource])
+            )
+            page_cache.bump_data_version_on_commit(db)
+            await db.commit()
+        return repository_ids
+
+    async def write_issues(self, db: AsyncSession, rows: list[dict]) -> None:
+        """Upsert issue rows by repository and number in a single statement, the caller commits."""
+        stmt = upsert.insert(db, Issues).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Issues.repository_id, Issues.number],
+            set_={
+                "title": stmt.excluded.title,
+                "state": stmt.excluded.state,
+                "url": stmt.excluded.url,
+                "repository_name": stmt.excluded.repository_name,
+            },
+        )
+        await db.execute(stmt)
+        page_cache.bump_data_version_on_commit(db)
+
+    async def flush(self, db: AsyncSession, rows: list[dict], checkpoints: list[dict]) -> None:
+        """
+        Write issue rows a batch per transaction, and the checkpoints of their
+        repositories along with the last batch.
+        """
+        batches = list(batched(rows, self.batch_size)) or [()]
+        for index, batch in enumerate(batches):
+            if batch:
+                await self.write_issues(db, list(batch))
+            if index == len(batches) - 1 and checkpoints:
+                await self.write_checkpoints(db, checkpoints)
+            await db.commit()
+
+    async def sync(self, incremental: bool = True) -> dict[str, int]:
+        """
+        Synchronize the repositories and their issues.
+
+        The issues of every repository are fetched concurrently and written in
+        batches as they arrive. Writes are made from this task only, so a single
+        database connection is used.
+
+        Incrementally, listings are requested conditionally with the validators of
+        their checkpoint, and only the issues updated since the last sync of their
+        repository are fetched. A repository's checkpoint is committed along with its
+        issues, so an interrupted run resumes with the repositories it didn't finish.
+
+        Args:
+            incremental (bool): Whether to start from the checkpoints, otherwise
+                everything is fetched again.
+
+        Returns:
+            dict[str, int]: The number of repositories and issues synchronized, and
+                the number of listings which weren't modified.
+
+        Raises:
+            GithubSyncError: If the issues of some repositories couldn't be fetched,
+                after the others are written.
+        """
+        started = time.perf_counter()
+        counts = {"repositories": 0, "issues": 0, "not_modified": 0}
+
+        async with sessions.session_scope(self.session_factory) as db:
+            checkpoints = await self.load_checkpoints(db) if incremental else {}
+            await db.commit()  # Don't hold on to the connection while fetching
+
+            repos, response = await self.fetch_repositories(checkpoints.get(REPOSITORIES_RESOURCE))
+            if repos is None:
+                counts["not_modified"] += 1
+                repo_names = [
+                    resource.removeprefix(ISSUES_RESOURCE_PREFIX)
+                    for resource in checkpoints
+                    if resource.startswith(ISSUES_RESOURCE_PREFIX)
+                ]
+                result = await db.execute(
+                    select(Repositories.name, Repositories.id).where(Repositories.name.in_(repo_names))
+                )
+                repository_ids = dict(result.tuples().all())
+                await db.commit()
+            else:
+                repository_ids = await self.write_repositories(db, repos)
+                await self.write_checkpoints(db, [checkpoint_of(REPOSITORIES_RESOURCE, response)])
+                await db.commit()
+            counts["repositories"] = len(repository_ids)
+
+            async def fetch(repo_name: str):
+                checkpoint = checkpoints.get(issues_resource(repo_name))
+                fetched_at = utcnow()
+                issues, response = await self.fetch_issues(repo_name, checkpoint)
+                return repo_name, checkpoint, fetched_at, issues, response
+
+            # Keyed by repository and number, an issue moving between pages while they
+            # are fetched must not be upserted twice in one statement
+            pending: dict[tuple[int, int], dict] = {}
+            pending_checkpoints: list[dict] = []
+            failures: list[Exception] = []
+            try:
+                for fetched in asyncio.as_completed([fetch(repo_name) for repo_name in repository_ids]):
+                    try:
+                        repo_name, checkpoint, fetched_at, issues, response = await fetched
+                    except (httpx.HTTPError, GithubSyncError) as exc:
+                        # The other repositories are still synced, this one is resumed next time
+                        log.warning("Could not fetch issues: %s", exc)
+                        failures.append(exc)
+                        continue
+                    resource = issues_resource(repo_name)
+                    if issues is None:
+                        counts["not_modified"] += 1
+                        continue
+                    since = checkpoint["since"] if checkpoint else None
+                    if issues or since is None:
+                        # Requested with a new `since`, the validators of this response won't match
+                        pending_checkpoints.append({**checkpoint_of(resource), "since": fetched_at})
+                    else:
+                        # Nothing changed, the same request is made next time
+                        pending_checkpoints.append({**checkpoint_of(resource, response), "since": since})
+
+                    for issue in issues:
+                        pending[repository_ids[repo_name], issue["number"]] = issue_row(
+                            repo_name, repository_ids[repo_name], issue
+                        )
+                    if len(pending) >= self.batch_size:
+                        await self.flush(db, list(pending.values()), pending_checkpoints)
+                        counts["issues"] += len(pending)
+                        pending.clear()
+                        pending_checkpoints.clear()
+            finally:
+                # Keep the repositories which were fetched when the run is interrupted
+                if pending or pending_checkpoints:
+                    await self.flush(db, list(pending.values()), pending_checkpoints)
+                    counts["issues"] += len(pending)
+
+        if failures:
+            raise GithubSyncError(f"Could not fetch the issues of {len(failures)} repositories") from failures[0]
+
+        # Titles of ranked issues may have changed
+        hot_issues.invalidate()
+        metrics.observe("github_sync.seconds", time.perf_counter() - started)
+        log.info(
+            "Synchronized %s repositories and %s issues, %s listings not modified",
+            counts["repositories"],
+            counts["issues"],
+            counts["not_modified"],
+        )
+        return counts
+
+
+def utcnow() -> datetime:
+    """Naive UTC now, as stored in the checkpoints."""
+    return datetime.now(UTC).replace(tzinfo=None)
+
+
+def issue_row(repo_name: str, repository_id: int, issue: dict) -> dict:
+    """The values of the `issues` row of a GitHub API issue."""
+    return {
+        "title": issue["title"],
+        "state": issue_state_to_bool(issue["state"]),
+        "number": issue["number"],
+        "repository_id": repository_id,
+        "repository_name": repo_name,
+        "url": issue["html_url"],
+        "cumulative_bounty": 0,
+        "contributions_count": 0,
+    }
+
+
+def issues_resource(repo_name: str) -> str:
+    """The checkpoint resource of the issues of a repository."""
+    return f"{ISSUES_RESOURCE_PREFIX}{repo_name}"
+
+
+def conditional_headers(checkpoint: dict | None) -> dict:
+    """The `If-None-Match` and `If-Modified-Since` headers for the validators of a checkpoint."""
+    headers = {}
+    if checkpoint and checkpoint["etag"]:
+        headers["If-None-Match"] = checkpoint["etag"]
+    if checkpoint and checkpoint["last_modified"]:
+        headers["If-Modified-Since"] = checkpoint["last_modified"]
+    return headers
+
+
+def checkpoint_of(resource: str, response: httpx.Response | None = None) -> dict:
+    """A checkpoint of `resource` with the validators of `response`, without `since`."""
+    headers = response.headers if response is not None else {}
+    return {
+        "resource": resource,
+        "etag": headers.get("etag"),
+        "last_modified": headers.get("last-modified"),
+        "since": None,
+    }
+
+
+async def run(incremental: bool = True) -> dict[str, int]:
+    """Synchronize the organization with the configured GitHub API."""
+    async with create_client() as client:
+        return await GithubSync(client).sync(incremental)
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -0,0 +1,106 @@
+"""Password hashing off the event loop.
+
+A bcrypt round takes tens of milliseconds of CPU, which would stall every other
+request if run in a handler. Hashes are computed in a pool of worker processes,
+with a bound on the number of pending hashes so that a burst of logins is turned
+away instead of queueing without end.
+"""
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from os import getenv
+from typing import Any, Callable
+
+from app import metrics
+from app.log import get_logger
+from app.utils import get_password_hash, verify_password
+
+log = get_logger(__name__)
+
+PASSWORD_HASH_WORKERS = int(getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_PENDING = int(getenv("PASSWORD_HASH_MAX_PENDING", str(PASSWORD_HASH_WORKERS * 8)))
+# "process" or "thread", bcrypt releases the GIL but processes isolate it from the app
+PASSWORD_HASH_EXECUTOR = getenv("PASSWORD_HASH_EXECUTOR", "process").lower()
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when too many hashes are pending."""
+
+
+def _timed(function: Callable[..., Any], *args) -> tuple[Any, float]:
+    """Run `function` in a worker and return its result with its duration."""
+    started = time.perf_counter()
+    return function(*args), time.perf_counter() - started
+
+
+class PasswordHasher:
+    """
+    Hash and verify passwords in a bounded pool of workers.
+
+    Args:
+        workers (int): The number of worker processes or threads.
+        max_pending (int): The number of hashes running or queued above which
+            new ones are rejected with `PasswordHasherBusy`.
+        executor (str): "process" or "thread".
+    """
+
+    def __init__(
+        self,
+        workers: int = PASSWORD_HASH_WORKERS,
+        max_pending: int = PASSWORD_HASH_MAX_PENDING,
+        executor: str = PASSWORD_HASH_EXECUTOR,
+    ):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.executor_type = executor
+        self._executor: Executor | None = None
+        self._pending = 0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_type == "process":
+                # Forking would copy the event loop and database threads of the app
+                self._executor = ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            else:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="password-hash")
+        return self._executor
+
+    async def _run(self, function: Callable[..., Any], *args) -> Any:
+        if self._pending >= self.max_pending:
+            metrics.inc("passwords.rejected")
+            raise PasswordHasherBusy(f"{self._pending} password hashes pending")
+
+        self._pending += 1
+        metrics.set_gauge("passwords.pending", self._pending)
+        submitted = time.perf_counter()
+        try:
+            result, hash_seconds = await asyncio.get_running_loop().run_in_executor(
+                self._get_executor(), _timed, function, *args
+            )
+        finally:
+            self._pending -= 1
+            metrics.set_gauge("passwords.pending", self._pending)
+        metrics.observe("passwords.hash_seconds", hash_seconds)
+        metrics.observe("passwords.queue_seconds", time.perf_counter() - submitted - hash_seconds)
+        return result
+
+    async def hash(self, password: str) -> str:
+        """Hash a password for storage."""
+        return await self._run(get_password_hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        """Check a password against its stored hash."""
+        return await self._run(verify_password, password, hashed_password)
+
+    def shutdown(self) -> None:
+        """Stop the workers, pending hashes are cancelled."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher()
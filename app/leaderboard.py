@@ -0,0 +1,158 @@
+"""In-memory leaderboard of the issues with the highest bounties.
+
+The `/hot` page is served from this top-N list. It is loaded from the database once,
+using the partial index on `issues.cumulative_bounty`, and then updated by the Stripe
+crediting path. It is reloaded in the background every `HOT_ISSUES_TTL` seconds to
+pick up credits made by other processes.
+"""
+import asyncio
+import time
+from os import getenv
+from typing import Any, AsyncGenerator, Callable
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import metrics
+from app.db import sessions
+from app.db.models import Issues
+from app.log import get_logger
+
+log = get_logger(__name__)
+
+HOT_ISSUES_SIZE = int(getenv("HOT_ISSUES_SIZE", "25"))
+HOT_ISSUES_TTL = float(getenv("HOT_ISSUES_TTL", "300"))
+
+# The columns of an issue shown on the leaderboard
+HOT_ISSUE_COLUMNS = (
+    Issues.id,
+    Issues.title,
+    Issues.url,
+    Issues.repository_name,
+    Issues.number,
+    Issues.cumulative_bounty,
+)
+
+
+def _rank_key(issue: dict) -> tuple[int, int]:
+    return -issue["cumulative_bounty"], issue["id"]
+
+
+class HotIssues:
+    """
+    The `size` issues with the highest cumulative bounty, highest first.
+
+    Args:
+        size (int): The number of issues on the leaderboard.
+        ttl (float): Seconds after which the leaderboard is reloaded in the background.
+        session_factory: Async generator yielding a database session.
+    """
+
+    def __init__(
+        self,
+        size: int = HOT_ISSUES_SIZE,
+        ttl: float = HOT_ISSUES_TTL,
+        session_factory: Callable[[], AsyncGenerator[AsyncSession, Any]] = sessions.get_read_session,
+    ):
+        self.size = size
+        self.ttl = ttl
+        self.session_factory = session_factory
+        self._issues: dict[int, dict] = {}
+        self._ranking: list[dict] = []
+        self._loaded_at: float | None = None
+        self._lock = asyncio.Lock()
+        self._reload_task: asyncio.Task | None = None
+        # Credits made while a load is running, applied on top of what it read
+        self._credits_during_load: list[dict] | None = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded_at is not None
+
+    async def get(self) -> list[dict]:
+        """Return the leaderboard, only querying the database if it was never loaded."""
+        if not self.loaded:
+            async with self._lock:
+                if not self.loaded:
+                    await self.load()
+        elif time.monotonic() - self._loaded_at > self.ttl:
+            self.schedule_reload()
+        metrics.inc("hot_issues.reads")
+        return self._ranking
+
+    def schedule_reload(self) -> None:
+        """Reload the leaderboard in the background unless a reload is running."""
+        if self._reload_task and not self._reload_task.done():
+            return
+        self._reload_task = asyncio.create_task(self._background_reload())
+
+    async def _background_reload(self) -> None:
+        try:
+            async with self._lock:
+                await self.load()
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            log.warning("Keeping the stale hot issues, reload failed: %s", exc)
+            # Don't retry on every read
+            self._loaded_at = time.monotonic()
+
+    async def load(self) -> None:
+        """Read the top issues from the database."""
+        self._credits_during_load = []
+        try:
+            async with sessions.session_scope(self.session_factory) as db:
+                result = await db.execute(
+                    select(*HOT_ISSUE_COLUMNS)
+                    .where(Issues.cumulative_bounty > 0)
+                    .order_by(Issues.cumulative_bounty.desc(), Issues.id)
+                    .limit(self.size)
+                )
+                self._issues = {row["id"]: dict(row) for row in result.mappings()}
+        finally:
+            credits, self._credits_during_load = self._credits_during_load, None
+        self._rank()
+        self._loaded_at = time.monotonic()
+        for issue in credits:
+            self.credit(issue)
+        metrics.inc("hot_issues.loads")
+
+    def invalidate(self) -> None:
+        """Forget the leaderboard, the next read loads it again."""
+        self._issues = {}
+        self._ranking = []
+        self._loaded_at = None
+
+    def credit(self, issue: dict) -> None:
+        """
+        Update the leaderboard after the bounty of an issue was raised and committed.
+
+        Args:
+            issue (dict): The `HOT_ISSUE_COLUMNS` of the issue, with its new bounty.
+        """
+        if self._credits_during_load is not None:
+            self._credits_during_load.append(issue)
+        if not self.loaded:
+            return
+
+        current = self._issues.get(issue["id"])
+        if current is not None:
+            # Credits may be applied out of order, a bounty never decreases.
+            issue = {**issue, "cumulative_bounty": max(issue["cumulative_bounty"], current["cumulative_bounty"])}
+        elif len(self._issues) >= self.size:
+            lowest = self._ranking[-1]
+            if _rank_key(issue) >= _rank_key(lowest):
+                return
+            del self._issues[lowest["id"]]
+        self._issues[issue["id"]] = dict(issue)
+        self._rank()
+
+    def update_issue(self, issue_id: int, **fields) -> None:
+        """Update the columns of an issue, e.g. its title, if it is on the leaderboard."""
+        current = self._issues.get(issue_id)
+        if current is not None:
+            current.update(fields)
+
+    def _rank(self) -> None:
+        self._ranking = sorted(self._issues.values(), key=_rank_key)
+
+
+hot_issues = HotIssues()
@@ -0,0 +1,261 @@
+"""Maintenance commands.
+
+Every command is a set-based `UPDATE` or `DELETE` run over the rows of a table in
+chunks of consecutive ids, each chunk in its own short transaction, so the write lock
+is released between chunks and webhooks keep being served during a run.
+
+Run with `python -m app.maintenance <command>`, see `--help`.
+"""
+import argparse
+import asyncio
+import sys
+from os import getenv
+from typing import Any, AsyncGenerator, Awaitable, Callable
+
+from sqlalchemy import Result, and_, delete, exists, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import ColumnElement, Executable
+
+from app import github_sync, metrics, page_cache
+from app.reconcile import reconciler
+from app.crud import contributions as crud_contributions
+from app.crud import repositories as crud_repos
+from app.db import sessions
+from app.db.models import BountyContributions, Issues, RefreshTokens, Repositories, Users
+from app.leaderboard import hot_issues
+from app.log import get_logger
+
+log = get_logger(__name__)
+
+MAINTENANCE_CHUNK = int(getenv("MAINTENANCE_CHUNK", "1000"))
+
+SessionFactory = Callable[[], AsyncGenerator[AsyncSession, Any]]
+# Called after every chunk with the command, the rows scanned, their total and the rows changed
+Progress = Callable[[str, int, int, int], None]
+# Called with the session and the result of the statement of a chunk, before it is
+# committed, returns the number of rows changed
+AfterChunk = Callable[[AsyncSession, Result], Awaitable[int]]
+
+
+def log_progress(command: str, done: int, total: int, changed: int) -> None:
+    """Log the progress of a command."""
+    log.info("%s: %s/%s rows, %s changed", command, done, total, changed)
+
+
+async def run_chunked(
+    command: str,
+    model,
+    statement: Callable[[ColumnElement[bool]], Executable],
+    session_factory: SessionFactory = sessions.get_async_session,
+    chunk_size: int = MAINTENANCE_CHUNK,
+    progress: Progress = log_progress,
+    after_chunk: AfterChunk | None = None,
+) -> int:
+    """
+    Run a statement over every row of `model`, a chunk of consecutive ids at a time.
+
+    Args:
+        command (str): The name of the command, for the progress.
+        model: The model whose ids are chunked.
+        statement: Builds the `UPDATE` or `DELETE` of a chunk from the condition
+            selecting the ids of the chunk.
+        session_factory: Async generator yielding a database session.
+        chunk_size (int): The number of rows per chunk and transaction.
+        progress: Called after every chunk.
+        after_chunk: Run in the transaction of every chunk, after the statement.
+
+    Returns:
+        int: The number of rows changed.
+    """
+    async with sessions.session_scope(session_factory) as db:
+        total = await db.scalar(select(func.count()).select_from(model))
+        await db.commit()
+
+    after_id, done, changed = 0, 0, 0
+    while True:
+        async with sessions.session_scope(session_factory) as db:
+            # The last id of the chunk, None for the last chunk
+            upper_id = await db.scalar(
+                select(model.id).where(model.id > after_id).order_by(model.id).offset(chunk_size - 1).limit(1)
+            )
+            in_chunk = model.id > after_id
+            if upper_id is not None:
+                in_chunk = and_(in_chunk, model.id <= upper_id)
+            result = await db.execute(statement(in_chunk))
+            chunk_changed = await after_chunk(db, result) if after_chunk else max(result.rowcount, 0)
+            if chunk_changed:
+                page_cache.bump_data_version_on_commit(db)
+            await db.commit()
+
+        changed += chunk_changed
+        done = min(done + chunk_size, total) if upper_id is not None else total
+        progress(command, done, total, changed)
+        if upper_id is None:
+            break
+        after_id = upper_id
+        # Let webhooks in between chunks
+        await asyncio.sleep(0)
+
+    metrics.inc(f"maintenance.{command}", changed)
+    return changed
+
+
+async def backfill_repository_names(
+    session_factory: SessionFactory = sessions.get_async_session,
+    chunk_size: int = MAINTENANCE_CHUNK,
+    progress: Progress = log_progress,
+) -> int:
+    """
+    Copy the name of their repository to the issues where it differs.
+
+    Returns:
+        int: The number of issues updated.
+    """
+    changed = await run_chunked(
+        "backfill-repository-names",
+        Issues,
+        lambda in_chunk: update(Issues)
+        .where(in_chunk)
+        .where(Issues.repository_id == Repositories.id)
+        .where(Issues.repository_name.is_distinct_from(Repositories.name))
+        .values(repository_name=Repositories.name),
+        session_factory,
+        chunk_size,
+        progress,
+    )
+    if changed:
+        hot_issues.invalidate()
+    return changed
+
+
+async def recount_issues(
+    session_factory: SessionFactory = sessions.get_async_session,
+    chunk_size: int = MAINTENANCE_CHUNK,
+    progress: Progress = log_progress,
+) -> int:
+    """
+    Recompute the `issues_count` and `open_issues_count` of the repositories where they differ.
+
+    Returns:
+        int: The number of repositories updated.
+    """
+    counts = crud_repos.issue_counts()
+    return await run_chunked(
+        "recount-issues",
+        Repositories,
+        lambda in_chunk: update(Repositories)
+        .where(in_chunk)
+        .where(or_(*(column != count for column, count in counts.items())))
+        .values(counts),
+        session_factory,
+        chunk_size,
+        progress,
+    )
+
+
+async def delete_orphans(
+    session_factory: SessionFactory = sessions.get_async_session,
+    chunk_size: int = MAINTENANCE_CHUNK,
+    progress: Progress = log_progress,
+) -> int:
+    """
+    Delete the issues of missing repositories, then the contributions of missing
+    issues or repositories and the refresh tokens of missing users.
+
+    The bounty aggregates of the issues and repositories which lost contributions
+    are recomputed in the transaction deleting them.
+
+    Returns:
+        int: The number of rows deleted.
+    """
+    deleted_issues = await run_chunked(
+        "delete-orphan-issues",
+        Issues,
+        lambda in_chunk: delete(Issues)
+        .where(in_chunk)
+        .where(~exists().where(Repositories.id == Issues.repository_id)),
+        session_factory,
+        chunk_size,
+        progress,
+    )
+    deleted_contributions = await run_chunked(
+        "delete-orphan-contributions",
+        BountyContributions,
+        lambda in_chunk: delete(BountyContributions)
+        .where(in_chunk)
+        .where(
+            ~exists().where(Issues.id == BountyContributions.issue_id)
+            | ~exists().where(Repositories.id == BountyContributions.repository_id)
+        )
+        .returning(BountyContributions.issue_id, BountyContributions.repository_id),
+        session_factory,
+        chunk_size,
+        progress,
+        after_chunk=recompute_contribution_aggregates,
+    )
+    if deleted_issues or deleted_contributions:
+        hot_issues.invalidate()
+    deleted = deleted_issues + deleted_contributions
+    # Refresh tokens are keyed by JWT id, they are deleted in a single statement
+    async with sessions.session_scope(session_factory) as db:
+        result = await db.execute(delete(RefreshTokens).where(~exists().where(Users.id == RefreshTokens.user_id)))
+        await db.commit()
+    log.info("delete-orphan-refresh-tokens: %s deleted", result.rowcount)
+    return deleted + result.rowcount
+
+
+async def recompute_contribution_aggregates(db: AsyncSession, result: Result) -> int:
+    """
+    Recompute the aggregates of the issues and repositories which lost contributions.
+
+    A contribution is orphaned when its issue or its repository is missing, the
+    other one may still exist and count it.
+
+    Returns:
+        int: The number of contributions deleted.
+    """
+    rows = result.all()
+    await crud_contributions.recompute_aggregates(
+        db, (row.issue_id for row in rows), (row.repository_id for row in rows)
+    )
+    return len(rows)
+
+
+def print_progress(command: str, done: int, total: int, changed: int) -> None:
+    """Print the progress of a command on stderr."""
+    print(f"{command}: {done}/{total} rows, {changed} changed", file=sys.stderr)
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m app.maintenance", description=__doc__.splitlines()[0])
+    parser.add_argument("--chunk-size", type=int, default=MAINTENANCE_CHUNK, help="Rows per transaction")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("backfill-repository-names", help="Copy repository names to their issues")
+    commands.add_parser("recount-issues", help="Recompute the issue counts of repositories")
+    commands.add_parser("delete-orphans", help="Delete rows whose parent row is missing")
+    commands.add_parser("verify-bounties", help="Recompute the bounty aggregates from the ledger")
+    commands.add_parser("reconcile", help="Rewrite the issues which drifted from GitHub")
+    sync = commands.add_parser("sync", help="Sync repositories and issues from GitHub")
+    sync.add_argument("--full", action="store_true", help="Ignore the checkpoints and fetch everything")
+    return parser.parse_args(argv)
+
+
+async def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    if args.command == "backfill-repository-names":
+        await backfill_repository_names(chunk_size=args.chunk_size, progress=print_progress)
+    elif args.command == "recount-issues":
+        await recount_issues(chunk_size=args.chunk_size, progress=print_progress)
+    elif args.command == "delete-orphans":
+        await delete_orphans(chunk_size=args.chunk_size, progress=print_progress)
+    elif args.command == "verify-bounties":
+        fixed = await crud_contributions.verify_aggregates(chunk_size=args.chunk_size)
+        print(f"verify-bounties: {fixed} fixed", file=sys.stderr)
+    elif args.command == "reconcile":
+        print(await reconciler.reconcile(), file=sys.stderr)
+    elif args.command == "sync":
+        print(await github_sync.run(incremental=not args.full), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
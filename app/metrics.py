@@ -0,0 +1,45 @@
+"""In-process metrics.
+
+Counters, gauges and summaries are plain dictionaries exposed by the ``/metrics`` route.
+"""
+from collections import defaultdict
+from typing import Any
+
+
+_counters: dict[str, float] = defaultdict(float)
+_gauges: dict[str, float] = {}
+_summaries: dict[str, dict[str, float]] = {}
+
+
+def inc(name: str, value: float = 1) -> None:
+    """Increment the counter `name` by `value`."""
+    _counters[name] += value
+
+
+def set_gauge(name: str, value: float) -> None:
+    """Set the gauge `name` to `value`."""
+    _gauges[name] = value
+
+
+def observe(name: str, value: float) -> None:
+    """Record `value` in the count, sum and max of the summary `name`."""
+    summary = _summaries.setdefault(name, {"count": 0, "sum": 0.0, "max": 0.0})
+    summary["count"] += 1
+    summary["sum"] += value
+    summary["max"] = max(summary["max"], value)
+
+
+def snapshot() -> dict[str, Any]:
+    """Return a copy of every counter, gauge and summary."""
+    return {
+        "counters": dict(_counters),
+        "gauges": dict(_gauges),
+        "summaries": {name: dict(summary) for name, summary in _summaries.items()},
+    }
+
+
+def reset() -> None:
+    """Drop every recorded value."""
+    _counters.clear()
+    _gauges.clear()
+    _summaries.clear()
@@ -0,0 +1,249 @@
+"""Durable queue of webhook payloads.
+
+In `queue` ingestion mode the webhook routes only append the verified payload to
+the `webhook_outbox` table and respond. A pool of asyncio workers started with the
+app drains the table, retrying failed payloads with exponential back-off and moving
+them to `webhook_dead_letters` once they ran out of attempts.
+"""
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta, UTC
+from os import getenv
+from typing import Any, AsyncGenerator, Awaitable, Callable
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import events, metrics
+import app.crud.deliveries as crud_deliveries
+from app.db import sessions
+from app.db.models import WebhookDeadLetters, WebhookOutbox
+from app.log import get_logger
+
+log = get_logger(__name__)
+
+WEBHOOK_INGEST_MODE = getenv("WEBHOOK_INGEST_MODE", "inline").lower()
+OUTBOX_WORKERS = int(getenv("OUTBOX_WORKERS", "4"))
+OUTBOX_MAX_ATTEMPTS = int(getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_BACKOFF = float(getenv("OUTBOX_BACKOFF", "2"))
+OUTBOX_POLL_INTERVAL = float(getenv("OUTBOX_POLL_INTERVAL", "5"))
+OUTBOX_DRAIN_TIMEOUT = float(getenv("OUTBOX_DRAIN_TIMEOUT", "10"))
+
+HANDLERS: dict[str, Callable[[dict, AsyncSession], Awaitable[Any]]] = {
+    "github": events.process_github_issue,
+    "stripe": events.process_stripe_event,
+}
+
+
+def utcnow() -> datetime:
+    """Naive UTC now, as stored in the outbox tables."""
+    return datetime.now(UTC).replace(tzinfo=None)
+
+
+def is_enabled() -> bool:
+    """Whether webhooks are acknowledged before being processed."""
+    return WEBHOOK_INGEST_MODE == "queue"
+
+
+async def enqueue(
+    db: AsyncSession, source: str, event: str | None, payload: bytes, delivery_id: str | None = None
+) -> None:
+    """
+    Durably store a verified webhook payload and wake up the workers.
+
+    Args:
+        db (AsyncSession): The asynchronous database session.
+        source (str): The handler of the payload, one of `HANDLERS`.
+        event (str | None): The event type, for inspection only.
+        payload (bytes): The raw JSON payload.
+        delivery_id (str | None): The `X-GitHub-Delivery` header, recorded in the same
+            transaction so that a redelivery isn't queued twice.
+    """
+    now = utcnow()
+    db.add(
+        WebhookOutbox(
+            source=source,
+            event=event,
+            payload=payload.decode("utf-8"),
+            attempts=0,
+            created_at=now,
+            next_attempt_at=now,
+        )
+    )
+    delivery_ids = {delivery_id} if delivery_id else set()
+    await crud_deliveries.add_deliveries(delivery_ids, db)
+    await db.commit()
+    crud_deliveries.remember_deliveries(delivery_ids)
+    metrics.inc("outbox.enqueued")
+    worker_pool.notify()
+
+
+class OutboxWorkerPool:
+    """
+    Dispatcher plus a fixed number of workers draining the outbox.
+
+    The dispatcher polls for due entries and hands their ids to the workers through
+    a bounded queue. Each entry is processed in its own session and only deleted once
+    its handler succeeded, so processing is at least once.
+
+    Args:
+        workers (int): The number of concurrent workers.
+        session_factory: Async generator yielding a database session.
+    """
+
+    def __init__(
+        self,
+        workers: int = OUTBOX_WORKERS,
+        session_factory: Callable[[], AsyncGenerator[AsyncSession, Any]] = sessions.get_async_session,
+    ):
+        self.workers = workers
+        self.session_factory = session_factory
+        self.max_attempts = OUTBOX_MAX_ATTEMPTS
+        self.backoff = OUTBOX_BACKOFF
+        self._queue: asyncio.Queue[int] = asyncio.Queue(maxsize=workers * 2)
+        self._wakeup = asyncio.Event()
+        self._in_flight: set[int] = set()
+        self._dispatcher: asyncio.Task | None = None
+        self._tasks: list[asyncio.Task] = []
+
+    @property
+    def running(self) -> bool:
+        return self._dispatcher is not None
+
+    async def start(self) -> None:
+        """Start the dispatcher and the workers."""
+        if self.running:
+            return
+        log.info("Starting %s outbox workers", self.workers)
+        self._dispatcher = asyncio.create_task(self._dispatch())
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = OUTBOX_DRAIN_TIMEOUT) -> None:
+        """
+        Stop dispatching and wait up to `timeout` seconds for dispatched entries.
+
+        Entries that were not dispatched yet stay in the outbox for the next start.
+        """
+        if not self.running:
+            return
+        self._dispatcher.cancel()
+        await asyncio.gather(self._dispatcher, return_exceptions=True)
+        self._dispatcher = None
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except TimeoutError:
+            log.warning("Outbox drain timed out, %s entries left in flight", len(self._in_flight))
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._in_flight.clear()
+        log.info("Outbox workers stopped")
+
+    def notify(self) -> None:
+        """Wake up the dispatcher, e.g. after a new entry was enqueued."""
+        self._wakeup.set()
+
+    async def _dispatch(self) -> None:
+        while True:
+            self._wakeup.clear()
+            try:
+                due = await self._due_entries()
+            except Exception as exc:  # pylint: disable=broad-exception-caught
+                log.error("Could not poll the outbox: %s", exc)
+                due = []
+            queued = 0
+            for entry_id in due:
+                if entry_id not in self._in_flight:
+                    self._in_flight.add(entry_id)
+                    await self._queue.put(entry_id)
+                    queued += 1
+            if queued and len(due) == self.workers * 4:
+                # There may be more due entries than one batch.
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), OUTBOX_POLL_INTERVAL)
+            except TimeoutError:
+                pass
+
+    async def _due_entries(self) -> list[int]:
+        async with sessions.session_scope(self.session_factory) as db:
+            depth = await db.scalar(select(func.count()).select_from(WebhookOutbox))
+            metrics.set_gauge("outbox.depth", depth)
+            result = await db.scalars(
+                select(WebhookOutbox.id)
+                .where(WebhookOutbox.next_attempt_at <= utcnow())
+                .where(WebhookOutbox.id.not_in(self._in_flight))
+                .order_by(WebhookOutbox.id)
+                .limit(self.workers * 4)
+            )
+            return list(result.all())
+
+    async def _work(self) -> None:
+        while True:
+            entry_id = await self._queue.get()
+            try:
+                await self.process(entry_id)
+            except Exception as exc:  # pylint: disable=broad-exception-caught
+                log.error("Outbox entry %s could not be processed: %s", entry_id, exc)
+            finally:
+                self._in_flight.discard(entry_id)
+                self._queue.task_done()
+
+    async def process(self, entry_id: int) -> None:
+        """Run the handler of an outbox entry and delete it, or schedule a retry."""
+        async with sessions.session_scope(self.session_factory) as db:
+            entry = await db.get(WebhookOutbox, entry_id)
+            if entry is None:
+                return
+            started = time.perf_counter()
+            created_at = entry.created_at
+            try:
+                handler = HANDLERS[entry.source]
+                await handler(json.loads(entry.payload), db)
+                await db.execute(delete(WebhookOutbox).where(WebhookOutbox.id == entry_id))
+                await db.commit()
+            except Exception as exc:  # pylint: disable=broad-exception-caught
+                await db.rollback()
+                await self._retry(db, entry_id, exc)
+                return
+
+            metrics.inc("outbox.processed")
+            metrics.observe("outbox.processing_seconds", time.perf_counter() - started)
+            metrics.observe("outbox.lag_seconds", (utcnow() - created_at).total_seconds())
+
+    async def _retry(self, db: AsyncSession, entry_id: int, exc: Exception) -> None:
+        entry = await db.get(WebhookOutbox, entry_id)
+        if entry is None:
+            return
+        entry.attempts += 1
+        entry.last_error = repr(exc)
+
+        if entry.attempts >= self.max_attempts:
+            log.error("Giving up on outbox entry %s after %s attempts: %r", entry_id, entry.attempts, exc)
+            db.add(
+                WebhookDeadLetters(
+                    source=entry.source,
+                    event=entry.event,
+                    payload=entry.payload,
+                    attempts=entry.attempts,
+                    last_error=entry.last_error,
+                    created_at=entry.created_at,
+                    failed_at=utcnow(),
+                )
+            )
+            await db.delete(entry)
+            await db.commit()
+            metrics.inc("outbox.dead_lettered")
+            return
+
+        delay = self.backoff * 2 ** (entry.attempts - 1)
+        log.warning("Outbox entry %s failed, retrying in %ss: %r", entry_id, delay, exc)
+        entry.next_attempt_at = utcnow() + timedelta(seconds=delay)
+        await db.commit()
+        metrics.inc("outbox.retried")
+        # Don't wait for the next poll if the back-off is shorter.
+        asyncio.get_running_loop().call_later(delay, self.notify)
+
+worker_pool = OutboxWorkerPool()
@@ -0,0 +1,135 @@
+"""Cache of the rendered public HTML pages.
+
+Pages only change when a webhook or a payment writes to the database, so rendered
+pages are kept per path and query string along with the data version they were
+rendered at. The CRUD functions bump the data version once their writes are
+committed, which invalidates every cached page at once. Pages also expire after
+`PAGE_CACHE_TTL` seconds, for writes made by other processes.
+
+Responses carry a strong ETag of their body, so revalidating browsers get a 304.
+"""
+import hashlib
+import time
+from collections import OrderedDict
+from os import getenv
+from typing import Awaitable, Callable
+
+from fastapi import FastAPI, Request, Response, status
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app import metrics
+from app.log import get_logger
+
+log = get_logger(__name__)
+
+PAGE_CACHE_SIZE = int(getenv("PAGE_CACHE_SIZE", "256"))
+PAGE_CACHE_TTL = float(getenv("PAGE_CACHE_TTL", "60"))
+# Pages rendered at startup
+WARMUP_PATHS = ("/", "/hot")
+
+_data_version = 0
+# (path, query) -> (data version, rendered at, body, media type, etag)
+_pages: OrderedDict[tuple[str, str], tuple[int, float, bytes, str, str]] = OrderedDict()
+
+
+def data_version() -> int:
+    """The version of the data the pages are rendered from."""
+    return _data_version
+
+
+def bump_data_version() -> None:
+    """Invalidate every cached page, after the data they show changed."""
+    global _data_version  # pylint: disable=global-statement
+    _data_version += 1
+
+
+def bump_data_version_on_commit(db: AsyncSession | Session) -> None:
+    """
+    Bump the data version once the current transaction of `db` is committed.
+
+    Bumping before the commit would let a concurrent request cache a page rendered
+    from the old data under the new version.
+    """
+    session = getattr(db, "sync_session", db)
+    if session.info.get("bump_data_version"):
+        return
+    session.info["bump_data_version"] = True
+
+    def on_commit(committed: Session) -> None:
+        committed.info.pop("bump_data_version", None)
+        bump_data_version()
+
+    event.listen(session, "after_commit", on_commit, once=True)
+
+
+def clear() -> None:
+    """Drop every cached page."""
+    _pages.clear()
+
+
+def make_etag(body: bytes) -> str:
+    """A strong ETag of a response body."""
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Whether an `If-None-Match` header matches `etag`, using the weak comparison."""
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+async def cached_page(request: Request, render: Callable[[], Awaitable[Response]]) -> Response:
+    """
+    Serve a page from the cache, or render and cache it.
+
+    Args:
+        request (Request): The request of the page, its path and query are the cache key.
+        render: Renders the page, e.g. returns a `TemplateResponse`.
+
+    Returns:
+        Response: The page with its ETag, or a 304 if the client has it already.
+    """
+    key = (request.url.path, request.url.query)
+    version = _data_version
+    cached = _pages.get(key)
+
+    if cached is not None and cached[0] == version and time.monotonic() - cached[1] < PAGE_CACHE_TTL:
+        _pages.move_to_end(key)
+        metrics.inc("page_cache.hit")
+        _, _, body, media_type, etag = cached
+    else:
+        metrics.inc("page_cache.miss")
+        response = await render()
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        body, media_type = response.body, response.media_type
+        etag = make_etag(body)
+        # Stored under the version from before rendering, so a write committed
+        # meanwhile makes the next request render again.
+        _pages[key] = (version, time.monotonic(), body, media_type, etag)
+        _pages.move_to_end(key)
+        if len(_pages) > PAGE_CACHE_SIZE:
+            _pages.popitem(last=False)
+
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        metrics.inc("page_cache.not_modified")
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type=media_type, headers=headers)
+
+
+async def warmup(app: FastAPI) -> None:
+    """Render the `WARMUP_PATHS` pages so that the first visitors get them from the cache."""
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://localhost") as client:
+        for path in WARMUP_PATHS:
+            try:
+                response = await client.get(path)
+            except Exception as exc:  # pylint: disable=broad-exception-caught
+                log.warning("Could not warm up %s: %s", path, exc)
+                continue
+            log.debug("Warmed up %s: %s", path, response.status_code)
@@ -0,0 +1,123 @@
+"""Keyset pagination of the JSON listings.
+
+Pages are ordered by id and a page starts after the last id of the previous one, so
+every page is an index range scan whatever its position. The next page is announced
+with a `Link: <...>; rel="next"` header.
+
+Ranked listings, like search results, have no stable key to start after and are
+paginated by offset instead, up to `MAX_OFFSET` rows deep.
+"""
+from os import getenv
+from typing import Any, Callable, Sequence
+
+from fastapi import Query, Request, Response
+from sqlalchemy import Select
+
+PAGE_SIZE = int(getenv("PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = int(getenv("MAX_PAGE_SIZE", "1000"))
+MAX_OFFSET = int(getenv("MAX_OFFSET", "1000"))
+
+
+class PageParams:
+    """
+    The `limit` and `after` query parameters of a paginated listing.
+
+    Args:
+        limit (int): The maximum number of rows in the page.
+        after (int | None): The id after which the page starts, from the `Link` header.
+    """
+
+    def __init__(
+        self,
+        limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        after: int | None = Query(None, ge=0),
+    ):
+        self.limit = limit
+        self.after = after
+
+
+class OffsetParams:
+    """
+    The `limit` and `offset` query parameters of a ranked listing.
+
+    Args:
+        limit (int): The maximum number of rows in the page.
+        offset (int): The number of rows before the page, from the `Link` header.
+    """
+
+    def __init__(
+        self,
+        limit: int = Query(20, ge=1, le=100),
+        offset: int = Query(0, ge=0, le=MAX_OFFSET),
+    ):
+        self.limit = limit
+        self.offset = offset
+
+
+def keyset(stmt: Select, id_column, limit: int | None, after: int | None) -> Select:
+    """
+    Restrict `stmt` to a page of rows ordered by `id_column`.
+
+    One more row than `limit` is selected to know whether there is a next page,
+    `paginate` drops it.
+    """
+    if after is not None:
+        stmt = stmt.where(id_column > after)
+    stmt = stmt.order_by(id_column)
+    if limit is not None:
+        stmt = stmt.limit(limit + 1)
+    return stmt
+
+
+def paginate(
+    rows: Sequence[Any],
+    page: PageParams,
+    request: Request,
+    response: Response,
+    id_of: Callable[[Any], int] = lambda row: row.id,
+) -> Sequence[Any]:
+    """
+    Cut the extra row selected by `keyset` and link to the next page if there is one.
+
+    Args:
+        rows: The rows selected with `keyset`.
+        page (PageParams): The pagination parameters of the request.
+        request (Request): The request, its url is the base of the next page url.
+        response (Response): The response to set the `Link` header on.
+        id_of: Returns the id of a row.
+
+    Returns:
+        Sequence: The rows of the page.
+    """
+    if len(rows) <= page.limit:
+        return rows
+    rows = rows[: page.limit]
+    next_url = request.url.include_query_params(limit=page.limit, after=id_of(rows[-1]))
+    response.headers["Link"] = f'<{next_url}>; rel="next"'
+    return rows
+
+
+def paginate_offset(
+    rows: Sequence[Any], page: OffsetParams, request: Request, response: Response
+) -> Sequence[Any]:
+    """
+    Cut the extra row selected past `limit` and link to the next page if there is one.
+
+    There is no next page past `MAX_OFFSET`.
+
+    Args:
+        rows: The `limit` + 1 rows selected from `offset`.
+        page (OffsetParams): The pagination parameters of the request.
+        request (Request): The request, its url is the base of the next page url.
+        response (Response): The response to set the `Link` header on.
+
+    Returns:
+        Sequence: The rows of the page.
+    """
+    if len(rows) <= page.limit:
+        return rows
+    rows = rows[: page.limit]
+    if page.offset + page.limit <= MAX_OFFSET:
+        next_url = request.url.include_query_params(limit=page.limit, offset=page.offset + page.limit)
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+    return rows
@@ -0,0 +1,204 @@
+"""Periodic reconciliation of the issues with GitHub.
+
+A dropped webhook leaves an issue out of date until the next full sync. Every
+`RECONCILE_INTERVAL` seconds, the open confirmed issues of every repository are
+compared with GitHub by a digest of their numbers and titles. The listing of each
+repository is requested conditionally, so a repository unchanged on both sides costs
+a `304 Not Modified` and no writes. Only the repositories whose digests differ are
+rewritten: their issues are upserted and the ones no longer listed are closed.
+"""
+import asyncio
+import hashlib
+import time
+from collections import defaultdict
+from itertools import batched
+from os import getenv
+from typing import Any, AsyncGenerator, Callable, Iterable
+
+import httpx
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import github_sync, metrics, page_cache
+from app.db import sessions
+from app.db.models import Issues, Repositories
+from app.github_sync import GithubSync, GithubSyncError
+from app.leaderboard import hot_issues
+from app.log import get_logger
+
+log = get_logger(__name__)
+
+# Seconds between reconciliations, 0 disables them
+RECONCILE_INTERVAL = float(getenv("RECONCILE_INTERVAL", "0"))
+RECONCILE_CONCURRENCY = int(getenv("RECONCILE_CONCURRENCY", "4"))
+
+RECONCILE_RESOURCE_PREFIX = "reconcile:"
+
+
+def issues_digest(issues: Iterable[tuple[int, str]]) -> str:
+    """The digest of the numbers and titles of issues, in any order."""
+    digest = hashlib.sha256()
+    for number, title in sorted(issues):
+        digest.update(f"{number}\t{title}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class Reconciler:
+    """
+    Reconcile the open issues of every repository with GitHub, on a schedule.
+
+    Args:
+        client_factory: Returns a client of the GitHub API, one is opened per run.
+        session_factory: Async generator yielding a database session.
+        interval (float): Seconds between runs once started, 0 to never run.
+        concurrency (int): The maximum number of GitHub requests in flight.
+        **sync_options: Options of the `GithubSync` fetching the issues.
+    """
+
+    def __init__(
+        self,
+        client_factory: Callable[[], httpx.AsyncClient] = github_sync.create_client,
+        session_factory: Callable[[], AsyncGenerator[AsyncSession, Any]] = sessions.get_async_session,
+        interval: float = RECONCILE_INTERVAL,
+        concurrency: int = RECONCILE_CONCURRENCY,
+        **sync_options,
+    ):
+        self.client_factory = client_factory
+        self.session_factory = session_factory
+        self.interval = interval
+        self.concurrency = concurrency
+        self.sync_options = sync_options
+        self._task: asyncio.Task | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def start(self) -> None:
+        """Reconcile every `interval` seconds in the background, unless disabled."""
+        if self.running or self.interval <= 0:
+            return
+        log.info("Reconciling with GitHub every %s seconds", self.interval)
+        self._task = asyncio.create_task(self._run_forever())
+
+    async def stop(self) -> None:
+        """Stop reconciling, a run in progress is cancelled."""
+        if not self.running:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _run_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.reconcile()
+            except Exception as exc:  # pylint: disable=broad-exception-caught
+                metrics.inc("reconcile.failure")
+                log.exception("Reconciliation with GitHub failed: %s", exc)
+
+    async def _local_digests(self, db: AsyncSession) -> tuple[dict[str, int], dict[int, str]]:
+        """The id of every repository by name, and the digest of its open issues by id."""
+        repository_ids = dict((await db.execute(select(Repositories.name, Repositories.id))).tuples().all())
+        open_issues = defaultdict(list)
+        result = await db.execute(
+            select(Issues.repository_id, Issues.number, Issues.title).where(Issues.state.is_(True))
+        )
+        for repository_id, number, title in result.tuples():
+            open_issues[repository_id].append((number, title))
+        return repository_ids, {
+            repository_id: issues_digest(open_issues.get(repository_id, ()))
+            for repository_id in repository_ids.values()
+        }
+
+    async def rewrite(
+        self, sync: GithubSync, db: AsyncSession, repo_name: str, repository_id: int, issues: list[dict]
+    ) -> None:
+        """Upsert the open issues of a repository and close the ones not listed, the caller commits."""
+        rows = [github_sync.issue_row(repo_name, repository_id, issue) for issue in issues]
+        for batch in batched(rows, sync.batch_size):
+            await sync.write_issues(db, list(batch))
+        await db.execute(
+            update(Issues)
+            .where(Issues.repository_id == repository_id)
+            .where(Issues.state.is_(True))
+            .where(Issues.number.not_in([issue["number"] for issue in issues]))
+            .values(state=False)
+        )
+        page_cache.bump_data_version_on_commit(db)
+
+    async def reconcile(self) -> dict[str, int]:
+        """
+        Compare every repository with GitHub and rewrite the ones which differ.
+
+        Returns:
+            dict[str, int]: The number of repositories compared, rewritten, and whose
+                listing wasn't modified.
+
+        Raises:
+            GithubSyncError: If some repositories couldn't be compared, after the
+                others are reconciled.
+        """
+        started = time.perf_counter()
+        counts = {"repositories": 0, "rewritten": 0, "not_modified": 0}
+
+        async with self.client_factory() as client, sessions.session_scope(self.session_factory) as db:
+            sync = GithubSync(client, self.session_factory, concurrency=self.concurrency, **self.sync_options)
+            checkpoints = await sync.load_checkpoints(db)
+            repository_ids, local_digests = await self._local_digests(db)
+            await db.commit()  # Don't hold on to the connection while fetching
+            counts["repositories"] = len(repository_ids)
+
+            async def compare(repo_name: str):
+                resource = f"{RECONCILE_RESOURCE_PREFIX}{repo_name}"
+                checkpoint = checkpoints.get(resource)
+                local_digest = local_digests[repository_ids[repo_name]]
+                issues, response = await sync.fetch_issues(repo_name, checkpoint)
+                if issues is None:
+                    counts["not_modified"] += 1
+                    if checkpoint["digest"] == local_digest:
+                        return repo_name, None, None
+                    # Our rows changed since, the issues are needed to rewrite them
+                    issues, response = await sync.fetch_issues(repo_name)
+                remote_digest = issues_digest((issue["number"], issue["title"]) for issue in issues)
+                reconciled = {**github_sync.checkpoint_of(resource, response), "digest": remote_digest}
+                return repo_name, issues if remote_digest != local_digest else None, reconciled
+
+            reconciled_checkpoints = []
+            failures: list[Exception] = []
+            for compared in asyncio.as_completed([compare(repo_name) for repo_name in repository_ids]):
+                try:
+                    repo_name, issues, reconciled = await compared
+                except (httpx.HTTPError, GithubSyncError) as exc:
+                    log.warning("Could not reconcile a repository: %s", exc)
+                    failures.append(exc)
+                    continue
+                if issues is not None:
+                    log.info("Issues of %s drifted from GitHub, rewriting them", repo_name)
+                    await self.rewrite(sync, db, repo_name, repository_ids[repo_name], issues)
+                    await sync.write_checkpoints(db, [reconciled])
+                    await db.commit()
+                    counts["rewritten"] += 1
+                elif reconciled is not None:
+                    reconciled_checkpoints.append(reconciled)
+            if reconciled_checkpoints:
+                await sync.write_checkpoints(db, reconciled_checkpoints)
+                await db.commit()
+
+        if counts["rewritten"]:
+            hot_issues.invalidate()
+        metrics.inc("reconcile.rewritten", counts["rewritten"])
+        metrics.observe("reconcile.seconds", time.perf_counter() - started)
+        log.info(
+            "Reconciled %s repositories with GitHub, %s rewritten, %s not modified",
+            counts["repositories"],
+            counts["rewritten"],
+            counts["not_modified"],
+        )
+        if failures:
+            raise GithubSyncError(f"Could not reconcile {len(failures)} repositories") from failures[0]
+        return counts
+
+
+reconciler = Reconciler()
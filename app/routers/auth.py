@@ -1,15 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
+from jose import jwt
+from jose.exceptions import JWTError
 from sqlalchemy import select
+import app.crud.tokens as crud_tokens
 from app.db import sessions
 from app.db.models import Users
 from app.db.schemas import users as user_schemas
 from app.db.schemas import auth as auth_schemas
+from app.hashing import PasswordHasherBusy, password_hasher
 from app.utils import (
-    get_password_hash,
-    verify_password,
+    ALGORITHM,
+    JWT_REFRESH_SECRET_KEY,
     create_access_token,
-    create_refresh_token,
 )
 from sqlalchemy.ext.asyncio import (
     AsyncSession,
@@ -18,6 +21,15 @@ from sqlalchemy.ext.asyncio import (
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 
+def hashing_busy() -> HTTPException:
+    """The response when too many password hashes are pending."""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many logins in progress, try again",
+        headers={"Retry-After": "1"},
+    )
+
+
 @router.post("/register", summary="Register a new user")
 async def register_user(
     payload: user_schemas.UsersCreate,
@@ -32,13 +44,20 @@ async def register_user(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="User with this email already exist",
         )
+    # Don't hold on to the database connection while the password is hashed
+    await db.commit()
+
+    try:
+        hashed_password = await password_hasher.hash(payload.password)
+    except PasswordHasherBusy as exc:
+        raise hashing_busy() from exc
 
     user = Users(
         first_name=payload.first_name,
         last_name=payload.last_name,
         email=payload.email,
         is_admin=payload.is_admin,
-        hashed_password=get_password_hash(payload.password),
+        hashed_password=hashed_password,
     )
     db.add(user)
     await db.commit()
@@ -67,16 +86,66 @@ async def login(
             detail="Incorrect email or password",
         )
 
-    hashed_pass = user.hashed_password
-    if not verify_password(form_data.password, hashed_pass):
+    user_id, email, hashed_pass = user.id, user.email, user.hashed_password
+    # Don't hold on to the database connection while the password is verified
+    await db.commit()
+    try:
+        password_ok = await password_hasher.verify(form_data.password, hashed_pass)
+    except PasswordHasherBusy as exc:
+        raise hashing_busy() from exc
+    if not password_ok:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Incorrect email or password",
         )
 
-    jwt_data = {"sub": user.email}
+    jwt_data = {"sub": email}
+    refresh_token = await crud_tokens.issue_refresh_token(db, user_id, email)
+    await crud_tokens.prune_refresh_tokens(db)
+    await db.commit()
 
     return {
         "access_token": create_access_token(jwt_data),
-        "refresh_token": create_refresh_token(jwt_data),
+        "refresh_token": refresh_token,
+    }
+
+
+@router.post(
+    "/refresh",
+    summary="Exchange a refresh token for new access and refresh tokens",
+    response_model=auth_schemas.Token,
+)
+async def refresh(
+    payload: auth_schemas.RefreshRequest,
+    db: AsyncSession = Depends(sessions.get_async_session),
+):
+    """
+    Rotate a refresh token: it is revoked and a new one is issued along with the
+    access token. A refresh token can only be used once.
+    """
+    invalid_token = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    try:
+        claims = jwt.decode(payload.refresh_token, JWT_REFRESH_SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError as exc:
+        raise invalid_token from exc
+    if claims.get("type") != "refresh" or not claims.get("jti"):
+        raise invalid_token
+
+    user_id = await crud_tokens.consume_refresh_token(db, claims["jti"])
+    user = await db.get(Users, user_id) if user_id is not None else None
+    if user is None:
+        await db.commit()  # Keep the revocations of a reused token
+        raise invalid_token
+
+    email = user.email
+    refresh_token = await crud_tokens.issue_refresh_token(db, user.id, email)
+    await db.commit()
+
+    return {
+        "access_token": create_access_token({"sub": email}),
+        "refresh_token": refresh_token,
     }
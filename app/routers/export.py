@@ -0,0 +1,113 @@
+"""Streaming export of the whole dataset.
+
+Repositories, issues and bounty contributions are written as newline delimited JSON,
+one object per line with a `type` field, in that order. Rows are fetched from a
+server-side cursor and sent as they arrive, so memory use doesn't grow with the
+size of the tables.
+"""
+import json
+import zlib
+from os import getenv
+from typing import Annotated, Any, AsyncGenerator, AsyncIterator, Callable
+
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import sessions
+from app.db.models import BountyContributions, Issues, Repositories, Users
+from app.deps import get_current_user
+from app.log import get_logger
+
+log = get_logger(__name__)
+
+EXPORT_BATCH_SIZE = int(getenv("EXPORT_BATCH_SIZE", "1000"))
+
+# Exported record type -> selected columns, each table is exported in id order
+EXPORTS = {
+    "repository": (
+        Repositories.id,
+        Repositories.name,
+        Repositories.description,
+        Repositories.is_visible,
+        Repositories.total_bounty,
+        Repositories.contributions_count,
+    ),
+    "issue": (
+        Issues.id,
+        Issues.repository_id,
+        Issues.repository_name,
+        Issues.number,
+        Issues.title,
+        Issues.state,
+        Issues.url,
+        Issues.cumulative_bounty,
+        Issues.contributions_count,
+    ),
+    "contribution": (
+        BountyContributions.id,
+        BountyContributions.issue_id,
+        BountyContributions.repository_id,
+        BountyContributions.amount,
+        BountyContributions.created_at,
+    ),
+}
+
+router = APIRouter(prefix="/api/export", tags=["api", "export"])
+
+auth_user_dependency = Annotated[Users, Depends(get_current_user)]
+
+SessionFactory = Callable[[], AsyncGenerator[AsyncSession, Any]]
+
+
+def get_session_factory() -> SessionFactory:
+    """The factory of the session the export reads from, it outlives the request dependencies."""
+    return sessions.get_read_session
+
+
+async def export_lines(session_factory: SessionFactory) -> AsyncIterator[bytes]:
+    """
+    Yield every exported row as a line of JSON, a batch of rows at a time.
+
+    The response is streamed after the request dependencies are closed, so the
+    rows are read from a session of their own.
+    """
+    async with sessions.session_scope(session_factory) as db:
+        for record_type, columns in EXPORTS.items():
+            stmt = select(*columns).order_by(columns[0]).execution_options(yield_per=EXPORT_BATCH_SIZE)
+            result = await db.stream(stmt)
+            async for rows in result.mappings().partitions():
+                yield b"".join(
+                    json.dumps({"type": record_type, **row}, default=str).encode("utf-8") + b"\n"
+                    for row in rows
+                )
+
+
+async def gzip_lines(lines: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Compress a stream of lines into a gzip stream, flushing after each chunk."""
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    async for chunk in lines:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+@router.get("/ndjson")
+async def export_ndjson(
+    current_user: auth_user_dependency,
+    request: Request,
+    session_factory: SessionFactory = Depends(get_session_factory),
+) -> StreamingResponse:
+    """
+    Stream every repository, issue and bounty contribution as newline delimited JSON.
+
+    The stream is gzip encoded if the client accepts it.
+    """
+    log.info("Dataset export requested by user %s", current_user.id)
+    lines = export_lines(session_factory)
+    headers = {"Content-Disposition": 'attachment; filename="bounties.ndjson"', "Vary": "Accept-Encoding"}
+
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        lines = gzip_lines(lines)
+    return StreamingResponse(lines, media_type="application/x-ndjson", headers=headers)
@@ -1,15 +1,22 @@
-"""Contains routes for HTML pages ans some more."""
+"""Contains routes for HTML pages ans some more.
+
+The rendered pages are cached by `app.page_cache`.
+"""
 import os
 from typing import Annotated
-from fastapi import APIRouter, Depends, status, Request, Form
+from fastapi import APIRouter, Depends, Query, status, Request, Form
 from fastapi.responses import RedirectResponse
 from fastapi.templating import Jinja2Templates
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 import stripe
 
+from app import page_cache
+import app.crud.issues as crud_issues
+import app.crud.repositories as crud_repos
 from app.db import sessions
 from app.db.models import Repositories, Issues
+from app.leaderboard import hot_issues
 
 # This test secret API key is a placeholder. Don't include personal details in requests with this key.
 # To see your test secret API key embedded in code samples, sign in to your Stripe account.
@@ -21,50 +28,77 @@ templates = Jinja2Templates(directory="app/templates")
 
 
 @router.get("/")
-async def index(request: Request, db: AsyncSession = Depends(sessions.get_async_session)):
+async def index(request: Request, db: AsyncSession = Depends(sessions.get_read_session)):
     """Index."""
-    q = select(Repositories)
-    result = await db.execute(q)
-    repos = result.scalars().all()
-    return templates.TemplateResponse(name="index.html", request=request, context={"repositories": repos})
+    async def render():
+        repos = await crud_repos.get_repository_summaries(db)
+        return templates.TemplateResponse(name="index.html", request=request, context={"repositories": repos})
+
+    return await page_cache.cached_page(request, render)
 
 
 @router.get("/repository/{repository_name}")
 async def get_repository_html(
     request: Request,
     repository_name: str,
-    db: AsyncSession = Depends(sessions.get_async_session),
+    db: AsyncSession = Depends(sessions.get_read_session),
 ):
     """Repository HTML."""
-    result_repository = await db.execute(select(Repositories).where(Repositories.name == repository_name))
-    repository = result_repository.scalars().first()
+    async def render():
+        result_repository = await db.execute(select(Repositories).where(Repositories.name == repository_name))
+        repository = result_repository.scalars().first()
 
-    result_issues = await db.execute(select(Issues).where(Issues.repository_id == repository.id))
-    issues = result_issues.scalars().all()
+        result_issues = await db.execute(select(Issues).where(Issues.repository_id == repository.id))
+        issues = result_issues.scalars().all()
 
-    return templates.TemplateResponse(
-        name="repository.html",
-        request=request,
-        context={"repository": repository, "issues": issues},
-    )
+        return templates.TemplateResponse(
+            name="repository.html",
+            request=request,
+            context={"repository": repository, "issues": issues},
+        )
+
+    return await page_cache.cached_page(request, render)
 
 
 @router.get("/hot")
-async def get_hot_html(
+async def get_hot_html(request: Request):
+    """
+    Renders the issues with the highest cumulative bounties, highest first,
+    using the "hot.html" template.
+
+    The issues are served from the in-memory `hot_issues` leaderboard.
+    """
+    async def render():
+        issues = await hot_issues.get()
+
+        return templates.TemplateResponse(
+            name="hot.html",
+            request=request,
+            context={"issues": issues},
+        )
+
+    return await page_cache.cached_page(request, render)
+
+
+@router.get("/search")
+async def get_search_html(
     request: Request,
-    db: AsyncSession = Depends(sessions.get_async_session),
+    q: str = Query("", max_length=200),
+    page: int = Query(1, ge=1, le=50),
+    db: AsyncSession = Depends(sessions.get_read_session),
 ):
     """
-    Fetches and renders a list of issues with cumulative bounties greater than zero,
-    limits the results to 25, and renders them using the "hot.html" template.
-    """
-    result_issues = await db.execute(select(Issues).where(Issues.cumulative_bounty > 0).limit(25))
-    issues = result_issues.scalars().all()
+    Renders the open issues matching the words of `q`, best matches first,
+    using the "search.html" template.
 
+    Searches are not cached, every query would push the other pages out of the page cache.
+    """
+    per_page = 20
+    issues = await crud_issues.search_issues(db, q, limit=per_page, offset=(page - 1) * per_page)
     return templates.TemplateResponse(
-        name="hot.html",
+        name="search.html",
         request=request,
-        context={"issues": issues},
+        context={"q": q, "issues": issues[:per_page], "page": page, "has_next": len(issues) > per_page},
     )
 
 
@@ -0,0 +1,40 @@
+"""Issues API."""
+
+from typing import Sequence
+from fastapi import APIRouter, Depends, Query, Request, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+import app.crud.issues as crud_issues
+from app import pagination
+from app.db import sessions
+from app.db.schemas import issues as issues_schema
+
+router = APIRouter(prefix="/api/issues", tags=["api", "issues"])
+
+
+@router.get("/search", status_code=status.HTTP_200_OK)
+async def search_issues(
+    request: Request,
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    min_bounty: int | None = Query(None, ge=0),
+    max_bounty: int | None = Query(None, ge=0),
+    include_closed: bool = False,
+    page: pagination.OffsetParams = Depends(),
+    db: AsyncSession = Depends(sessions.get_read_session),
+) -> Sequence[issues_schema.IssueSearchResult]:
+    """
+    Search the open issues by the words of their title and repository name, best matches first.
+
+    The last word of `q` may be incomplete. The url of the next page is in the `Link` header.
+    """
+    issues = await crud_issues.search_issues(
+        db,
+        q,
+        min_bounty=min_bounty,
+        max_bounty=max_bounty,
+        include_closed=include_closed,
+        limit=page.limit,
+        offset=page.offset,
+    )
+    issues = pagination.paginate_offset(issues, page, request, response)
+    return [issues_schema.IssueSearchResult.model_validate(issue) for issue in issues]
@@ -1,11 +1,11 @@
 """Repositories API."""
 
 from typing import Sequence
-from fastapi import APIRouter, Depends, status
-from sqlalchemy import select
+from fastapi import APIRouter, Depends, Request, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
+import app.crud.repositories as crud_repos
+from app import pagination
 from app.db import sessions
-from app.db.models import Repositories
 from app.db.schemas import repositories as repos_schema
 
 router = APIRouter(prefix="/api/repositories", tags=["api", "repositories"])
@@ -13,10 +13,23 @@ router = APIRouter(prefix="/api/repositories", tags=["api", "repositories"])
 
 @router.get("/", status_code=status.HTTP_200_OK)
 async def get_repositories(
-    db: AsyncSession = Depends(sessions.get_async_session),
-) -> Sequence[repos_schema.Repositories]:
-    """Get all repositories."""
-    q = select(Repositories)
-    result = await db.execute(q)
-    repos = result.scalars().all()
-    return repos
+    request: Request,
+    response: Response,
+    include_issues: bool = False,
+    page: pagination.PageParams = Depends(),
+    db: AsyncSession = Depends(sessions.get_read_session),
+) -> Sequence[repos_schema.RepositorySummary] | Sequence[repos_schema.Repositories]:
+    """
+    Get the visible repositories, a page at a time.
+
+    By default, repositories are listed with their number of issues and total bounty.
+    Their issues are only listed with `include_issues`. The url of the next page is
+    in the `Link` header.
+    """
+    if include_issues:
+        repos = await crud_repos.get_repositories_with_issues(db, limit=page.limit, after=page.after)
+        repos = pagination.paginate(repos, page, request, response)
+        return [repos_schema.Repositories.model_validate(repo) for repo in repos]
+    summaries = await crud_repos.get_repository_summaries(db, limit=page.limit, after=page.after)
+    summaries = pagination.paginate(summaries, page, request, response, id_of=lambda row: row["id"])
+    return [repos_schema.RepositorySummary.model_validate(summary) for summary in summaries]
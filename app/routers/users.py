@@ -1,13 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy import select, delete
+from app import pagination
 from app.db import sessions
-from app.db.models import Users
+from app.db.models import RefreshTokens, Users
 from app.db.schemas import users as user_schemas
 from sqlalchemy.ext.asyncio import (
     AsyncSession,
 )
 from typing import Sequence, Annotated
-from app.deps import get_current_user
+from app.deps import get_current_user, invalidate_user
 
 
 router = APIRouter(prefix="/api/users", tags=["api", "users"])
@@ -18,11 +19,15 @@ auth_user_dependency = Annotated[Users, Depends(get_current_user)]
 @router.get("/get/users")
 async def get_users(
     current_user: auth_user_dependency,
-    db: AsyncSession = Depends(sessions.get_async_session),
+    request: Request,
+    response: Response,
+    page: pagination.PageParams = Depends(),
+    db: AsyncSession = Depends(sessions.get_read_session),
 ) -> Sequence[user_schemas.Users]:
-    q = select(Users)
+    """Get the users a page at a time, the url of the next page is in the `Link` header."""
+    q = pagination.keyset(select(Users), Users.id, page.limit, page.after)
     result = await db.execute(q)
-    users = result.scalars().all()
+    users = pagination.paginate(result.scalars().all(), page, request, response)
 
     if not users:
         raise HTTPException(status_code=404, detail="No users found")
@@ -33,7 +38,7 @@ async def get_users(
 async def get_user(
     current_user: auth_user_dependency,
     id: int,
-    db: AsyncSession = Depends(sessions.get_async_session),
+    db: AsyncSession = Depends(sessions.get_read_session),
 ) -> user_schemas.Users | dict:
     # Construct the query, in this case a scaler since we expect a single value
     # and don't need a tuple
@@ -70,7 +75,9 @@ async def delete_user(
             detail="You are not an admin",
         )
 
+    await db.execute(delete(RefreshTokens).filter(RefreshTokens.user_id == id))
     q = delete(Users).filter(Users.id == id)
     await db.execute(q)
     await db.commit()
+    invalidate_user(user.email)
     return "ok"
@@ -10,11 +10,14 @@ from fastapi import APIRouter, Depends, status, Request, HTTPException, Header
 from sqlalchemy.ext.asyncio import AsyncSession
 from urllib3 import HTTPResponse
 import stripe
-from httpx import AsyncClient
 
+from app.allowlist import github_hooks_allowlist
+from app.cidr import CidrSet
+from app.coalescer import issue_coalescer
+from app import events, outbox
 from app.db import sessions
-from app.db.models import Issues
 # from app.deps import get_current_user
+import app.crud.deliveries as crud_deliveries
 import app.crud.issues as crud_issues
 from app.log import get_logger
 
@@ -22,13 +25,41 @@ log = get_logger(__name__)
 
 GITHUB_WEBHOOK_SECRET = getenv("GITHUB_WEBHOOK_SECRET", "")
 GITHUB_IPS_ONLY = getenv("GITHUB_IPS_ONLY", "True").lower() in ["true", "1"]
+# Comma separated, e.g. the ranges of https://stripe.com/files/ips/ips_webhooks.json
+STRIPE_WEBHOOK_IPS = CidrSet(ip.strip() for ip in getenv("STRIPE_WEBHOOK_IPS", "").split(",") if ip.strip())
 
 # auth_user_dependency = Annotated[Users, Depends(get_current_user)]
 
 router = APIRouter(prefix="/webhook", tags=["webhook"])
 
 
-@router.post("/stripe/checkout")
+async def gate_by_stripe_ip(request: Request):
+    """
+    Allow requests only from the Stripe webhook IP addresses, if configured.
+
+    The check is skipped when `STRIPE_WEBHOOK_IPS` is empty.
+
+    Raises:
+        HTTPException: If the request's IP address is not in the allowlist
+        or cannot be determined.
+    """
+    if not STRIPE_WEBHOOK_IPS:
+        return
+    try:
+        src_ip = ipaddress.ip_address(request.client.host)
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Could not hook sender ip address",
+        ) from exc
+    if src_ip not in STRIPE_WEBHOOK_IPS:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not a Stripe webhooks ip address",
+        )
+
+
+@router.post("/stripe/checkout", dependencies=[Depends(gate_by_stripe_ip)])
 async def webhook_stripe_post_checkout(
     request: Request,
     db: AsyncSession = Depends(sessions.get_async_session),
@@ -39,7 +70,7 @@ async def webhook_stripe_post_checkout(
     This function processes the payload from a Stripe webhook event, specifically
     handling the "checkout.session.completed" event type. It extracts metadata and
     bounty amount from the event data and updates the corresponding issue's bounty
-    in the database.
+    in the database. In `queue` ingestion mode the event is only stored in the outbox.
 
     Args:
         request (Request): The incoming HTTP request containing the webhook payload.
@@ -52,22 +83,18 @@ async def webhook_stripe_post_checkout(
     event = None
 
     try:
-        event = stripe.Event.construct_from(json.loads(payload), stripe.api_key)
+        event_data = json.loads(payload)
+        event = stripe.Event.construct_from(event_data, stripe.api_key)
     except ValueError as e:
         print(e)
         return HTTPResponse(status=status.HTTP_400_BAD_REQUEST)
 
     # Handle the event
     if event.type == "checkout.session.completed":
-        print(event.data.object["metadata"])
-        metadata = event.data.object["metadata"]
-        bounty_amount = event.data.object["amount_total"]
-        await crud_issues.bump_bounty_issue(
-            db,
-            metadata["repository_name"],
-            metadata["issue_number"],
-            bounty_amount // 100,
-        )
+        if outbox.is_enabled():
+            await outbox.enqueue(db, "stripe", event.type, payload)
+        else:
+            await events.process_stripe_event(event_data, db)
 
     return {}
 
@@ -77,12 +104,16 @@ async def gate_by_github_ip(request: Request):
     """
     Middleware function to allow requests only from GitHub IP addresses.
 
+    The GitHub hooks ip addresses are served from `github_hooks_allowlist`,
+    so a request only waits for the GitHub meta API on a cold start.
+
     Args:
         request (Request): The incoming HTTP request.
 
     Raises:
         HTTPException: If the request's IP address is not a valid GitHub
-        IP address or if the IP address cannot be determined.
+        IP address, if the IP address cannot be determined or if the
+        allowlist is unavailable.
 
     Returns:
         None: If the request's IP address is a valid GitHub IP address,
@@ -99,12 +130,16 @@ async def gate_by_github_ip(request: Request):
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Could not hook sender ip address",
             ) from exc
-        async with AsyncClient() as client:
-            allowlist = await client.get("https://api.github.com/meta")
-        for valid_ip in allowlist.json()["hooks"]:
-            if src_ip in ipaddress.ip_network(valid_ip):
-                log.debug("IP validation: %s - OK", request.client.host)
-                return
+        try:
+            networks = await github_hooks_allowlist.get_networks()
+        except ValueError as exc:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="GitHub hooks ip addresses are unavailable",
+            ) from exc
+        if src_ip in networks:
+            log.debug("IP validation: %s - OK", request.client.host)
+            return
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not a GitHub hooks ip address",
@@ -146,7 +181,10 @@ async def webhook_github_issue(
 
     This function processes incoming GitHub webhook events related to issues.
     It verifies the signature of the payload, parses the payload, and updates
-    the issue in the database if necessary.
+    the issue in the database if necessary. In `queue` ingestion mode eligible
+    events are only stored in the outbox and processed in the background. With a
+    coalescing window, events of the same issue are merged into a single write.
+    Deliveries that were already handled, e.g. redeliveries, are skipped.
     """
     log.debug("Received Github Event: %s", x_github_event)
 
@@ -160,14 +198,25 @@ async def webhook_github_issue(
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Bad JSON.") from exc
 
     issue = payload["issue"]
-
-    if crud_issues.is_eligible_for_bounty(issue):
-        issue_db: Issues = await crud_issues.get_issue(issue, db)
-        if issue["state"] != crud_issues.issue_state_to_str(issue_db.state):
-            issue_db.state = crud_issues.issue_state_to_bool(issue["state"])
-            await db.commit()
-        if issue["title"] != issue_db.title:
-            issue_db.title = issue["title"]
-            await db.commit()
-        return {"message": f"An event for issue #{issue["number"]} received."}
-    return {"message": "Received an event for a non-eligible for bounty issue."}
+    if not crud_issues.is_eligible_for_bounty(issue):
+        return {"message": "Received an event for a non-eligible for bounty issue."}
+
+    # GitHub redelivers webhooks, handle every delivery only once
+    delivery_id = request.headers.get("x-github-delivery")
+    if delivery_id and await crud_deliveries.is_duplicate_delivery(delivery_id, db):
+        return {"message": f"Delivery {delivery_id} was already received."}
+
+    if outbox.is_enabled():
+        # The delivery is recorded in the transaction of the outbox entry
+        await outbox.enqueue(db, "github", x_github_event, payload_body, delivery_id)
+        await crud_deliveries.prune_deliveries(db, outbox.utcnow())
+        return {"message": f"An event for issue #{issue["number"]} queued."}
+    if issue_coalescer.enabled:
+        # The delivery is recorded when the coalesced event is written
+        issue_coalescer.submit(payload, delivery_id)
+        return {"message": f"An event for issue #{issue["number"]} queued."}
+
+    response = await events.process_github_issue(payload, db)
+    if delivery_id:
+        await crud_deliveries.record_delivery(delivery_id, db)
+    return response
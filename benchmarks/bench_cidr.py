@@ -0,0 +1,43 @@
+"""Microbenchmark of webhook source IP lookups.
+
+Compares `CidrSet` with a linear scan over `ipaddress.ip_network` objects for
+growing allowlists. Run with `python -m benchmarks.bench_cidr`.
+"""
+import ipaddress
+import random
+import timeit
+
+from app.cidr import CidrSet
+
+
+def random_networks(count: int) -> list[str]:
+    """Return `count` random IPv4 /24 and IPv6 /48 networks."""
+    networks = []
+    for _ in range(count // 2):
+        networks.append(str(ipaddress.IPv4Network((random.getrandbits(24) << 8, 24))))
+        networks.append(str(ipaddress.IPv6Network((random.getrandbits(48) << 80, 48))))
+    return networks
+
+
+def main() -> None:
+    random.seed(0)
+    addresses = [ipaddress.ip_address(random.getrandbits(32)) for _ in range(1000)]
+    print(f"{'networks':>8} {'linear scan':>14} {'CidrSet':>10}")
+    for count in (10, 100, 1_000, 10_000):
+        networks = random_networks(count)
+        parsed = [ipaddress.ip_network(network) for network in networks]
+        cidrs = CidrSet(networks)
+
+        number = max(1, 20_000 // count)
+        linear = timeit.timeit(
+            lambda parsed=parsed: [any(address in network for network in parsed) for address in addresses],
+            number=number,
+        ) / (number * len(addresses))
+        compiled = timeit.timeit(
+            lambda cidrs=cidrs: [address in cidrs for address in addresses], number=number
+        ) / (number * len(addresses))
+        print(f"{count:>8} {linear * 1e6:>11.2f} us {compiled * 1e6:>7.2f} us")
+
+
+if __name__ == "__main__":
+    main()
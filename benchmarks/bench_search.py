@@ -0,0 +1,148 @@
+"""Benchmark of the full-text search of issues.
+
+Builds a temporary SQLite database of `ISSUES` issues with titles of random words,
+then times searches of one and two words, the last one a prefix, through the
+`issues_fts` index and through the `LIKE` scan of the titles the index replaces.
+The search statements are timed on a plain SQLite connection, and `search_issues`
+through the asynchronous session the app uses, which adds the aiosqlite thread hop.
+
+Queries containing one of the `COMMON` most frequent words, which are found in most
+titles like stop words, are reported apart from the distinctive ones.
+Run with `python -m benchmarks.bench_search`.
+"""
+import asyncio
+import itertools
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.crud.issues import search_issues, search_statement
+from app.db.models import Base, Issues, Repositories
+
+ISSUES = 100_000
+REPOSITORIES = 100
+QUERIES = 500
+VOCABULARY = 20_000
+COMMON = 100
+
+
+def words() -> list[str]:
+    """Pronounceable words of 4 to 10 letters, the first ones the most common."""
+    random.seed(2)
+    syllables = [a + b for a in "bcdfghklmnprstvw" for b in "aeiou"]
+    vocabulary = set()
+    while len(vocabulary) < VOCABULARY:
+        vocabulary.add("".join(random.choices(syllables, k=random.randint(2, 5))))
+    return sorted(vocabulary, key=lambda word: random.random())
+
+
+WORDS = words()
+# Word frequencies follow Zipf's law, like in real titles
+CUM_WEIGHTS = list(itertools.accumulate(1 / rank for rank in range(1, VOCABULARY + 1)))
+
+
+def random_words(count: int) -> str:
+    return " ".join(random.choices(WORDS, cum_weights=CUM_WEIGHTS, k=count))
+
+
+def build(url: str) -> None:
+    random.seed(0)
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(
+            insert(Repositories), [{"id": i, "name": f"repository-{i}"} for i in range(1, REPOSITORIES + 1)]
+        )
+        rows = []
+        for i in range(1, ISSUES + 1):
+            repository_id = random.randint(1, REPOSITORIES)
+            rows.append(
+                {
+                    "id": i,
+                    "repository_id": repository_id,
+                    "repository_name": f"repository-{repository_id}",
+                    "number": i,
+                    "title": random_words(random.randint(3, 10)).capitalize(),
+                    "state": random.random() < 0.7,
+                    "cumulative_bounty": random.choice((0, 0, 0, 5, 10, 50, 100)),
+                    "url": "",
+                }
+            )
+        connection.execute(insert(Issues), rows)
+    engine.dispose()
+
+
+def queries() -> dict[str, list[str]]:
+    """
+    Searches of one or two words, the last one possibly cut short like while typing,
+    by whether they contain a common word.
+    """
+    random.seed(1)
+    common = set(WORDS[:COMMON])
+    classes = {"distinct": [], "common": []}
+    for _ in range(QUERIES):
+        query = random_words(random.randint(1, 2))
+        query_class = "common" if common & set(query.split()) else "distinct"
+        classes[query_class].append(query[: -random.randint(0, 2) or None])
+    return classes
+
+
+def report(name: str, query_class: str, timings: list[float]) -> None:
+    timings = sorted(timings)
+    mean, median = statistics.fmean(timings), statistics.median(timings)
+    p95 = timings[int(len(timings) * 0.95)]
+    print(f"{name:>12} {query_class:>9} {len(timings):>8} {mean:>9.1f} us {median:>9.1f} us {p95:>9.1f} us")
+
+
+def measure_sync(connection, dialect_name: str, searches: list[str]) -> list[float]:
+    """The time in microseconds of every search statement of `dialect_name`."""
+    timings = []
+    for query in searches:
+        started = time.perf_counter()
+        connection.execute(*search_statement(dialect_name, query)).all()
+        timings.append((time.perf_counter() - started) * 1e6)
+    return timings
+
+
+async def measure_async(session, searches: list[str]) -> list[float]:
+    """The time in microseconds of every search with `search_issues`."""
+    timings = []
+    for query in searches:
+        started = time.perf_counter()
+        await search_issues(session, query)
+        timings.append((time.perf_counter() - started) * 1e6)
+    return timings
+
+
+async def main() -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.db")
+        build(f"sqlite:///{path}")
+        classes = queries()
+        print(f"{ISSUES} issues, {QUERIES} queries")
+        print(f"{'search':>12} {'queries':>9} {'count':>8} {'mean':>12} {'median':>12} {'p95':>12}")
+
+        engine = create_engine(f"sqlite:///{path}")
+        with engine.connect() as connection:
+            measure_sync(connection, "sqlite", classes["distinct"])  # Warm up
+            for query_class, searches in classes.items():
+                report("fts5", query_class, measure_sync(connection, "sqlite", searches))
+            for query_class, searches in classes.items():
+                # The fallback of the other databases
+                report("like", query_class, measure_sync(connection, "like", searches))
+        engine.dispose()
+
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        async with async_sessionmaker(bind=async_engine)() as session:
+            for query_class, searches in classes.items():
+                report("fts5 async", query_class, await measure_async(session, searches))
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
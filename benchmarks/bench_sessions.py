@@ -0,0 +1,92 @@
+"""Microbenchmark of the per-request database session dependency.
+
+Compares building a new `async_sessionmaker` and `async_scoped_session` registry for
+every request, as `get_async_session` used to, with the module-level factory, both
+without a query and with a `SELECT 1`. The query runs on a fresh connection per
+request with `NullPool` and on a pooled one with `AsyncAdaptedQueuePool`.
+Run with `python -m benchmarks.bench_sessions`.
+"""
+import asyncio
+import os
+import tempfile
+import time
+from asyncio import current_task
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import (
+    AsyncSession,
+    async_scoped_session,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+
+REQUESTS = 2000
+
+
+def per_request_factory(engine):
+    """The dependency building its session factory on every request."""
+    async def get_async_session():
+        Session = async_scoped_session(
+            async_sessionmaker(
+                autocommit=False,
+                autoflush=False,
+                class_=AsyncSession,
+                bind=engine,
+                expire_on_commit=False,
+            ),
+            scopefunc=current_task,
+        )
+        async with Session() as session:
+            try:
+                yield session
+            finally:
+                await session.close()
+
+    return get_async_session
+
+
+def module_factory(engine):
+    """The dependency reusing a session factory created once."""
+    factory = async_sessionmaker(autoflush=False, class_=AsyncSession, bind=engine, expire_on_commit=False)
+
+    async def get_async_session():
+        async with factory() as session:
+            yield session
+
+    return get_async_session
+
+
+async def measure(dependency, query: bool) -> float:
+    """Return the mean time in microseconds of a request using `dependency`."""
+    started = time.perf_counter()
+    for _ in range(REQUESTS):
+        # Drive the dependency like FastAPI does
+        generator = dependency()
+        session = await anext(generator)
+        if query:
+            await session.execute(text("SELECT 1"))
+        await generator.aclose()
+    return (time.perf_counter() - started) / REQUESTS * 1e6
+
+
+async def main() -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        url = f"sqlite+aiosqlite:///{os.path.join(directory, 'bench.db')}"
+        engines = {
+            "NullPool": create_async_engine(url, poolclass=NullPool),
+            "QueuePool": create_async_engine(url, poolclass=AsyncAdaptedQueuePool, pool_pre_ping=True),
+        }
+        print(f"{'pool':>10} {'dependency':>12} {'no query':>12} {'SELECT 1':>12}")
+        for pool, engine in engines.items():
+            for name, make_dependency in (("per request", per_request_factory), ("module", module_factory)):
+                dependency = make_dependency(engine)
+                await measure(dependency, query=True)  # Warm up
+                bare = await measure(dependency, query=False)
+                queried = await measure(dependency, query=True)
+                print(f"{pool:>10} {name:>12} {bare:>9.1f} us {queried:>9.1f} us")
+            await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
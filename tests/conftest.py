@@ -1,4 +1,5 @@
 from typing import AsyncGenerator, Any
+from contextlib import contextmanager
 
 from sqlalchemy.ext.asyncio import (
     create_async_engine,
@@ -7,21 +8,28 @@ from sqlalchemy.ext.asyncio import (
     async_sessionmaker,
 )
 
+from sqlalchemy import event
 from asyncio import current_task
 from httpx import ASGITransport, AsyncClient
 import pytest_asyncio
 from os import getenv
 
+from app import deps, page_cache
 from app.app import create_app
-from app.db.sessions import Base, get_async_session
+from app.crud import deliveries as crud_deliveries
+from app.crud import repositories as crud_repos
+from app.db.sessions import Base, get_async_session, get_read_session
+from app.leaderboard import hot_issues
+from app.routers import export
 
 
 SQLALCHEMY_TEST_DATABASE_URL = getenv(
     "DATABASE_TEST_URL", "sqlite+aiosqlite:///async_test.db"
 )
 
+# Concurrency tests queue many writers on the SQLite lock, wait longer than the default 5s.
 async_engine = create_async_engine(
-    SQLALCHEMY_TEST_DATABASE_URL, connect_args={"check_same_thread": False}
+    SQLALCHEMY_TEST_DATABASE_URL, connect_args={"check_same_thread": False, "timeout": 60}
 )
 async_test_session_local = async_scoped_session(
     async_sessionmaker(
@@ -31,6 +39,26 @@ async_test_session_local = async_scoped_session(
 )
 
 
+@contextmanager
+def count_statements():
+    """Count the SQL statements and commits sent to the test database."""
+    counts = {"statements": [], "commits": 0}
+
+    def on_execute(_conn, _cursor, statement, *_args):
+        counts["statements"].append(statement)
+
+    def on_commit(_conn):
+        counts["commits"] += 1
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", on_execute)
+    event.listen(async_engine.sync_engine, "commit", on_commit)
+    try:
+        yield counts
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", on_execute)
+        event.remove(async_engine.sync_engine, "commit", on_commit)
+
+
 @pytest_asyncio.fixture
 def anyio_backend():
     return "asyncio"
@@ -42,6 +70,11 @@ async def async_session() -> AsyncGenerator[AsyncSession, Any]:
     async with async_engine.begin() as conn:
         await conn.run_sync(Base.metadata.drop_all)
         await conn.run_sync(Base.metadata.create_all)
+    crud_deliveries.clear_delivery_cache()
+    crud_repos.invalidate_repository_cache()
+    hot_issues.invalidate()
+    page_cache.clear()
+    deps.clear_user_cache()
 
     db = async_test_session_local()
     try:
@@ -61,5 +94,7 @@ async def async_client(async_session) -> AsyncGenerator[AsyncClient, Any]:
 
     app = create_app()
     app.dependency_overrides[get_async_session] = override_get_db
+    app.dependency_overrides[get_read_session] = override_get_db
+    app.dependency_overrides[export.get_session_factory] = lambda: override_get_db
     async with AsyncClient(transport=ASGITransport(app=app), base_url="http://testserver") as client:
         yield client
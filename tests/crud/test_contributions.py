@@ -0,0 +1,44 @@
+# pylint: disable=missing-docstring
+"""Test bounty contributions CRUD."""
+import pytest
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.crud import contributions as crud_contributions
+from app.crud import issues as crud_issues
+from app.db.models import Issues, Repositories
+from tests.conftest import async_engine
+
+
+@pytest.mark.anyio
+async def test_verify_aggregates(async_session) -> None:
+    repository = Repositories(name="files")
+    async_session.add(repository)
+    await async_session.flush()
+    async_session.add_all(
+        Issues(number=number, title="Crash", url="", repository_id=repository.id) for number in range(1, 6)
+    )
+    await async_session.commit()
+    for number in range(1, 6):
+        await crud_issues.bump_bounty_issue(async_session, "files", number, number * 10)
+
+    # Drift two issues and the repository away from the ledger
+    await async_session.execute(update(Issues).where(Issues.number.in_([2, 5])).values(cumulative_bounty=0))
+    await async_session.execute(update(Repositories).values(total_bounty=1, contributions_count=0))
+    await async_session.commit()
+
+    async def session_factory():
+        async with async_sessionmaker(bind=async_engine)() as db:
+            yield db
+
+    assert await crud_contributions.verify_aggregates(session_factory, chunk_size=2) == 3
+    assert await crud_contributions.verify_aggregates(session_factory, chunk_size=2) == 0
+
+    issues = (await async_session.scalars(
+        select(Issues).order_by(Issues.number).execution_options(populate_existing=True)
+    )).all()
+    assert [(issue.cumulative_bounty, issue.contributions_count) for issue in issues] == [
+        (number * 10, 1) for number in range(1, 6)
+    ]
+    repository = await async_session.scalar(select(Repositories).execution_options(populate_existing=True))
+    assert (repository.total_bounty, repository.contributions_count) == (150, 5)
@@ -0,0 +1,125 @@
+# pylint: disable=missing-docstring
+"""Test issues CRUD."""
+import asyncio
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app import events
+from app.crud import issues as crud_issues
+from app.db.models import BountyContributions, Issues, Repositories, StripeEvents
+from tests.conftest import async_engine, count_statements
+
+
+def github_issue(number: int, title: str, state: str = "open") -> dict:
+    return {
+        "number": number,
+        "title": title,
+        "state": state,
+        "labels": [{"name": "confirmed"}],
+        "repository_url": "https://api.github.com/repos/elementary/files",
+        "html_url": f"https://github.com/elementary/files/issues/{number}",
+    }
+
+
+async def repository_counts(db) -> tuple[int, int]:
+    result = await db.execute(
+        select(Repositories.issues_count, Repositories.open_issues_count).where(Repositories.name == "files")
+    )
+    return result.tuples().one()
+
+
+@pytest.mark.anyio
+async def test_upsert_issue_maintains_counts(async_session) -> None:
+    async_session.add(Repositories(name="files"))
+    await async_session.commit()
+
+    with count_statements() as counts:
+        await events.process_github_issue({"issue": github_issue(1, "Crash")}, async_session)
+    inserts = [statement for statement in counts["statements"] if statement.startswith("INSERT")]
+    assert len(inserts) == 1
+    assert "ON CONFLICT" in inserts[0]
+    assert len(counts["statements"]) <= 2  # The repository lookup and the upsert
+    assert counts["commits"] == 1
+    assert await repository_counts(async_session) == (1, 1)
+
+    with count_statements() as counts:
+        await events.process_github_issue({"issue": github_issue(1, "Crash on start", "closed")}, async_session)
+    assert len(counts["statements"]) == 1  # The repository id is cached
+    assert counts["commits"] == 1
+    assert await repository_counts(async_session) == (1, 0)
+
+    # Neither a new issue nor a change of state
+    await events.process_github_issue({"issue": github_issue(1, "Crash at start", "closed")}, async_session)
+    await events.process_github_issue({"issue": github_issue(2, "Freeze")}, async_session)
+    assert await repository_counts(async_session) == (2, 1)
+
+    issues = (
+        await async_session.scalars(select(Issues).order_by(Issues.number).execution_options(populate_existing=True))
+    ).all()
+    assert [(issue.title, issue.state, issue.repository_name) for issue in issues] == [
+        ("Crash at start", False, "files"),
+        ("Freeze", True, "files"),
+    ]
+
+
+def checkout_completed(event_id: str, number: int, amount_total: int) -> dict:
+    return {
+        "id": event_id,
+        "object": "event",
+        "type": "checkout.session.completed",
+        "data": {
+            "object": {
+                "amount_total": amount_total,
+                "metadata": {"repository_name": "files", "issue_number": str(number)},
+            }
+        },
+    }
+
+
+@pytest.mark.anyio
+async def test_bump_bounty_issue_concurrent_checkouts(async_session) -> None:
+    await events.process_github_issue({"issue": github_issue(1, "Crash")}, async_session)
+    session_factory = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+
+    async def checkout(event_id: str):
+        async with session_factory() as db:
+            await events.process_stripe_event(checkout_completed(event_id, 1, 500), db)
+
+    # Every event is delivered twice, as Stripe does on retries.
+    event_ids = [f"evt_{i}" for i in range(100)] * 2
+    await asyncio.gather(*(checkout(event_id) for event_id in event_ids))
+
+    issue = await async_session.scalar(select(Issues).execution_options(populate_existing=True))
+    assert (issue.cumulative_bounty, issue.contributions_count) == (100 * 5, 100)
+    assert await async_session.scalar(select(func.count()).select_from(StripeEvents)) == 100
+
+
+@pytest.mark.anyio
+async def test_bump_bounty_issue_ledger(async_session) -> None:
+    await events.process_github_issue({"issue": github_issue(1, "Crash")}, async_session)
+
+    with count_statements() as counts:
+        assert await crud_issues.bump_bounty_issue(async_session, "files", 1, 5) == 5
+    # The issue update, the ledger insert and the repository update
+    assert len(counts["statements"]) == 3
+    assert counts["commits"] == 1
+    assert await crud_issues.bump_bounty_issue(async_session, "files", 1, 7, event_id="evt_1") == 12
+
+    contributions = (await async_session.scalars(select(BountyContributions))).all()
+    assert [(c.amount, c.stripe_event_id) for c in contributions] == [(5, None), (7, "evt_1")]
+    repository = await async_session.scalar(
+        select(Repositories).execution_options(populate_existing=True)
+    )
+    assert (repository.total_bounty, repository.contributions_count) == (12, 2)
+
+
+@pytest.mark.anyio
+async def test_bump_bounty_issue_missing(async_session) -> None:
+    await events.process_github_issue({"issue": github_issue(1, "Crash")}, async_session)
+
+    with pytest.raises(LookupError):
+        await crud_issues.bump_bounty_issue(async_session, "files", 2, 5, event_id="evt_1")
+    # The event wasn't recorded, so a retry once the issue exists credits it
+    assert await async_session.get(StripeEvents, "evt_1") is None
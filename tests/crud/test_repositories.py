@@ -0,0 +1,69 @@
+# pylint: disable=missing-docstring
+"""Test repositories CRUD."""
+import asyncio
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.crud import repositories as crud_repos
+from app.db import sessions
+from app.db.models import Base, Repositories
+from tests.conftest import async_engine, count_statements
+
+
+@pytest.mark.anyio
+async def test_get_repository_id_cached(async_session) -> None:
+    assert await crud_repos.get_repository_id("files", async_session) is None
+    repo_id = await crud_repos.get_repository_id("files", async_session, create=True)
+
+    with count_statements() as counts:
+        assert await crud_repos.get_repository_id("files", async_session) == repo_id
+    assert not counts["statements"]
+
+
+@pytest.mark.anyio
+async def test_get_repository_id_single_flight(async_session) -> None:
+    session_factory = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+
+    async def lookup():
+        async with session_factory() as db:
+            return await crud_repos.get_repository_id("files", db, create=True)
+
+    with count_statements() as counts:
+        repo_ids = await asyncio.gather(*(lookup() for _ in range(20)))
+
+    assert len(set(repo_ids)) == 1
+    assert len([statement for statement in counts["statements"] if statement.startswith("INSERT")]) == 1
+    assert await async_session.scalar(select(func.count()).select_from(Repositories)) == 1
+
+
+@pytest.mark.anyio
+async def test_get_repository_id_single_writer_connection(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(sessions, "DB_POOL_TIMEOUT", 2)
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'writer.db'}", **sessions.pool_options(pool_size=1, max_overflow=0)
+    )
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+    crud_repos.invalidate_repository_cache()
+
+    async with session_factory() as waiter, session_factory() as leader:
+        # The waiter holds the only connection, e.g. after checking its delivery
+        await waiter.execute(select(1))
+        leading = asyncio.create_task(crud_repos.get_repository_id("files", leader, create=True))
+        await asyncio.sleep(0.1)  # The leader is queued for the connection
+
+        repo_id = await crud_repos.get_repository_id("files", waiter, create=True)
+        assert await leading == repo_id
+    await engine.dispose()
+
+
+@pytest.mark.anyio
+async def test_repository_cache_evicted_on_delete(async_session) -> None:
+    repo_id = await crud_repos.get_repository_id("files", async_session, create=True)
+    await async_session.delete(await async_session.get(Repositories, repo_id))
+    await async_session.commit()
+
+    assert await crud_repos.get_repository_id("files", async_session) is None
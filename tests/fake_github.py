@@ -0,0 +1,128 @@
+"""A fake of the parts of the GitHub REST API used by the sync, served in process."""
+import hashlib
+import json
+import time
+
+from fastapi import FastAPI, Request, Response
+
+
+class FakeGithub:
+    """
+    An organization of repositories and issues behind a paginated API.
+
+    Args:
+        org (str): The name of the organization.
+        per_page_limit (int): The page size cap, like GitHub's 100.
+    """
+
+    def __init__(self, org: str = "elementary", per_page_limit: int = 100):
+        self.org = org
+        self.per_page_limit = per_page_limit
+        self.repos: dict[str, dict] = {}
+        self.issues: dict[str, list[dict]] = {}
+        self.requests: list[str] = []
+        # The path, query parameters and status of every response
+        self.responses: list[tuple[str, dict, int]] = []
+        # Paths whose next request fails, with the status and headers of the response
+        self.failures: dict[str, tuple[int, dict]] = {}
+        self.app = self.create_app()
+
+    def add_repo(self, name: str, description: str | None = None, archived: bool = False) -> None:
+        self.repos[name] = {"name": name, "description": description, "archived": archived}
+        self.issues.setdefault(name, [])
+
+    def add_issue(
+        self, repo: str, number: int, title: str, labels: tuple[str, ...] = ("confirmed",), **fields
+    ) -> dict:
+        issue = {
+            "number": number,
+            "title": title,
+            "state": "open",
+            "html_url": f"https://github.com/{self.org}/{repo}/issues/{number}",
+            "repository_url": f"https://api.github.com/repos/{self.org}/{repo}",
+            "labels": [{"name": label} for label in labels],
+            "updated_at": "2020-01-01T00:00:00Z",
+            **fields,
+        }
+        self.issues[repo].append(issue)
+        return issue
+
+    def update_issue(self, repo: str, number: int, updated_at: str, **fields) -> None:
+        issue = next(issue for issue in self.issues[repo] if issue["number"] == number)
+        issue.update(fields, updated_at=updated_at)
+
+    def fail_next(self, path: str, status_code: int = 500) -> None:
+        """Fail the next request of `path`."""
+        self.failures[path] = (status_code, {})
+
+    def rate_limit_next(self, path: str, retry_after: float | None = 0) -> None:
+        """Rate limit the next request of `path`, with `Retry-After` or an exhausted quota."""
+        if retry_after is not None:
+            self.failures[path] = (429, {"Retry-After": str(retry_after)})
+        else:
+            self.failures[path] = (
+                403,
+                {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": str(int(time.time()))},
+            )
+
+    def page(self, request: Request, items: list[dict]) -> Response:
+        """
+        The requested page of `items`, linking to the next and last pages like GitHub.
+
+        Pages have an ETag and are not sent again if it matches `If-None-Match`.
+        """
+        per_page = min(int(request.query_params.get("per_page", "30")), self.per_page_limit)
+        page = int(request.query_params.get("page", "1"))
+        last_page = max(1, -(-len(items) // per_page))
+
+        headers = {}
+        if page < last_page:
+            headers["Link"] = ", ".join(
+                [
+                    f'<{request.url.include_query_params(page=page + 1)}>; rel="next"',
+                    f'<{request.url.include_query_params(page=last_page)}>; rel="last"',
+                ]
+            )
+        body = json.dumps(items[(page - 1) * per_page : page * per_page])
+        headers["ETag"] = f'"{hashlib.sha1((body + headers.get("Link", "")).encode()).hexdigest()}"'
+        if request.headers.get("if-none-match") == headers["ETag"]:
+            return Response(status_code=304, headers=headers)
+        return Response(body, media_type="application/json", headers=headers)
+
+    def create_app(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.middleware("http")
+        async def record(request: Request, call_next):
+            self.requests.append(request.url.path)
+            failure = self.failures.pop(request.url.path, None)
+            if failure is not None:
+                status_code, headers = failure
+                response = Response(status_code=status_code, headers=headers)
+            else:
+                response = await call_next(request)
+            self.responses.append((request.url.path, dict(request.query_params), response.status_code))
+            return response
+
+        @app.get("/orgs/{org}/repos")
+        async def repos(org: str, request: Request):
+            return self.page(request, list(self.repos.values()) if org == self.org else [])
+
+        @app.get("/repos/{org}/{repo}/issues")
+        async def issues(org: str, repo: str, request: Request):
+            params = request.query_params
+            labels = set(filter(None, params.get("labels", "").split(",")))
+            state = params.get("state", "open")
+            since = params.get("since", "")
+            matching = [
+                issue
+                for issue in self.issues.get(repo, [])
+                if labels <= {label["name"] for label in issue["labels"]}
+                and (state == "all" or issue["state"] == state)
+                and issue["updated_at"] >= since
+            ]
+            if params.get("sort") == "updated":
+                matching.sort(key=lambda issue: issue["updated_at"], reverse=params.get("direction") != "asc")
+            return self.page(request, matching)
+
+        return app
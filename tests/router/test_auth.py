@@ -32,3 +32,54 @@ async def test_login(async_client: AsyncClient) -> None:
     }
     rv = await async_client.post("/auth/login", data=payload_login)
     assert rv.status_code == 200
+
+
+async def login_tokens(async_client: AsyncClient) -> dict:
+    await async_client.post(
+        "/auth/register",
+        json={
+            "first_name": "string",
+            "last_name": "string",
+            "email": "user@example.com",
+            "password": "string",
+            "is_admin": True,
+        },
+    )
+    rv = await async_client.post("/auth/login", data={"username": "user@example.com", "password": "string"})
+    return rv.json()
+
+
+@pytest.mark.anyio
+async def test_refresh_rotates_tokens(async_client: AsyncClient) -> None:
+    tokens = await login_tokens(async_client)
+
+    rv = await async_client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert rv.status_code == 200
+    rotated = rv.json()
+    assert rotated["refresh_token"] != tokens["refresh_token"]
+
+    rv = await async_client.get("/api/users/get/users", headers={"Authorization": f"Bearer {rotated['access_token']}"})
+    assert rv.status_code == 200
+
+
+@pytest.mark.anyio
+async def test_refresh_token_reuse_revokes_all(async_client: AsyncClient) -> None:
+    tokens = await login_tokens(async_client)
+    rv = await async_client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    rotated = rv.json()
+
+    rv = await async_client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert rv.status_code == 401
+    # The token issued by the first refresh is revoked along with it
+    rv = await async_client.post("/auth/refresh", json={"refresh_token": rotated["refresh_token"]})
+    assert rv.status_code == 401
+
+
+@pytest.mark.anyio
+async def test_refresh_rejects_access_token(async_client: AsyncClient) -> None:
+    tokens = await login_tokens(async_client)
+
+    rv = await async_client.post("/auth/refresh", json={"refresh_token": tokens["access_token"]})
+    assert rv.status_code == 401
+    rv = await async_client.get("/api/users/get/users", headers={"Authorization": f"Bearer {tokens['refresh_token']}"})
+    assert rv.status_code in (401, 403)
@@ -0,0 +1,70 @@
+# pylint: disable=missing-docstring
+"""Test the dataset export."""
+import gzip
+import json
+
+from httpx import AsyncClient
+import pytest
+
+from app.crud import issues as crud_issues
+from app.db.models import Issues, Repositories
+
+
+async def login(async_client: AsyncClient) -> dict:
+    payload_register = {
+        "first_name": "string",
+        "last_name": "string",
+        "email": "user@example.com",
+        "password": "string",
+        "is_admin": False,
+    }
+    await async_client.post("/auth/register", json=payload_register)
+    r = await async_client.post("/auth/login", data={"username": "user@example.com", "password": "string"})
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+async def add_dataset(db) -> None:
+    repository = Repositories(name="files")
+    db.add(repository)
+    await db.flush()
+    db.add_all(
+        Issues(number=number, title="Crash", url="", repository_id=repository.id, repository_name="files")
+        for number in range(1, 2501)
+    )
+    await db.commit()
+    await crud_issues.bump_bounty_issue(db, "files", 7, 15)
+
+
+@pytest.mark.anyio
+async def test_export_ndjson(async_client: AsyncClient, async_session) -> None:
+    headers = await login(async_client)
+    await add_dataset(async_session)
+
+    r = await async_client.get("/api/export/ndjson", headers={**headers, "Accept-Encoding": "identity"})
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "application/x-ndjson"
+    assert "content-encoding" not in r.headers
+    records = [json.loads(line) for line in r.text.splitlines()]
+    assert [record["type"] for record in records] == ["repository"] + ["issue"] * 2500 + ["contribution"]
+    assert records[0]["total_bounty"] == 15
+    assert records[7]["number"] == 7 and records[7]["cumulative_bounty"] == 15
+    assert records[-1]["amount"] == 15
+
+
+@pytest.mark.anyio
+async def test_export_ndjson_gzip(async_client: AsyncClient, async_session) -> None:
+    headers = await login(async_client)
+    await add_dataset(async_session)
+
+    async with async_client.stream(
+        "GET", "/api/export/ndjson", headers={**headers, "Accept-Encoding": "gzip"}
+    ) as r:
+        assert r.headers["content-encoding"] == "gzip"
+        body = b"".join([chunk async for chunk in r.aiter_raw()])
+    assert len(gzip.decompress(body).splitlines()) == 2502
+
+
+@pytest.mark.anyio
+async def test_export_ndjson_requires_login(async_client: AsyncClient) -> None:
+    r = await async_client.get("/api/export/ndjson")
+    assert r.status_code == 401
@@ -3,8 +3,84 @@
 from httpx import AsyncClient
 import pytest
 
+from app.crud import issues as crud_issues
+from app.db.models import Repositories
+from tests.conftest import count_statements
+
 
 @pytest.mark.anyio
 async def test_get_repositories(async_client: AsyncClient) -> None:
     r = await async_client.get("/api/repositories/", follow_redirects=True)
     assert r.status_code == 200
+
+
+def github_issue(repo: str, number: int, state: str = "open") -> dict:
+    return {
+        "number": number,
+        "title": "Crash",
+        "state": state,
+        "repository_url": f"https://api.github.com/repos/elementary/{repo}",
+        "html_url": "",
+    }
+
+
+async def add_repositories(db) -> None:
+    db.add_all([Repositories(name="files"), Repositories(name="hidden", is_visible=False), Repositories(name="mail")])
+    await db.commit()
+    for number in range(1, 51):
+        await crud_issues.upsert_issue(github_issue("files", number, "open" if number <= 40 else "closed"), db)
+    await crud_issues.upsert_issue(github_issue("hidden", 1), db)
+    await db.commit()
+    for number in range(1, 51):
+        await crud_issues.bump_bounty_issue(db, "files", number, number)
+
+
+@pytest.mark.anyio
+async def test_get_repositories_summary(async_client: AsyncClient, async_session) -> None:
+    await add_repositories(async_session)
+
+    with count_statements() as counts:
+        r = await async_client.get("/api/repositories/")
+    assert r.status_code == 200
+    assert len(counts["statements"]) == 1
+    # Served from the counts maintained on the repository rows
+    assert [
+        (repo["name"], repo["issues_count"], repo["open_issues_count"], repo["total_bounty"]) for repo in r.json()
+    ] == [
+        ("files", 50, 40, sum(range(1, 51))),
+        ("mail", 0, 0, 0),
+    ]
+    assert "issues" not in r.json()[0]
+
+
+@pytest.mark.anyio
+async def test_get_repositories_include_issues(async_client: AsyncClient, async_session) -> None:
+    await add_repositories(async_session)
+
+    with count_statements() as counts:
+        r = await async_client.get("/api/repositories/", params={"include_issues": True})
+    assert r.status_code == 200
+    assert len(counts["statements"]) == 2
+    assert [(repo["name"], len(repo["issues"])) for repo in r.json()] == [("files", 50), ("mail", 0)]
+
+
+@pytest.mark.anyio
+async def test_get_repositories_pages(async_client: AsyncClient, async_session) -> None:
+    async_session.add_all(Repositories(name=f"repository-{i}") for i in range(25))
+    await async_session.commit()
+
+    names = []
+    url = "/api/repositories/?limit=10"
+    while url:
+        r = await async_client.get(url)
+        assert r.status_code == 200
+        assert len(r.json()) <= 10
+        names += [repo["name"] for repo in r.json()]
+        url = r.links.get("next", {}).get("url")
+    assert names == [f"repository-{i}" for i in range(25)]
+
+
+@pytest.mark.anyio
+async def test_get_repositories_limit_bounds(async_client: AsyncClient) -> None:
+    assert (await async_client.get("/api/repositories/", params={"limit": 0})).status_code == 422
+    assert (await async_client.get("/api/repositories/", params={"limit": 100_000})).status_code == 422
@@ -0,0 +1,137 @@
+# pylint: disable=missing-docstring
+"""Test the search of issues."""
+from httpx import AsyncClient
+from sqlalchemy import delete, update
+import pytest
+
+from app import page_cache
+from app.crud import issues as crud_issues
+from app.db.models import Issues, Repositories
+
+
+async def add_issues(db) -> None:
+    db.add_all([Repositories(id=1, name="files"), Repositories(id=2, name="mail")])
+    db.add_all(
+        [
+            Issues(id=1, repository_id=1, repository_name="files", number=1, title="Crash when renaming a folder",
+                   state=True, cumulative_bounty=10, url="https://github.com/elementary/files/issues/1"),
+            Issues(id=2, repository_id=1, repository_name="files", number=2, title="Sidebar is too wide",
+                   state=True, cumulative_bounty=50, url="https://github.com/elementary/files/issues/2"),
+            Issues(id=3, repository_id=2, repository_name="mail", number=1, title="Crash on startup",
+                   state=True, cumulative_bounty=100, url="https://github.com/elementary/mail/issues/1"),
+            Issues(id=4, repository_id=2, repository_name="mail", number=2, title="Crash crash crash",
+                   state=False, cumulative_bounty=5, url="https://github.com/elementary/mail/issues/2"),
+        ]
+    )
+    await db.commit()
+
+
+async def search(client: AsyncClient, **params) -> list[int]:
+    r = await client.get("/api/issues/search", params=params)
+    assert r.status_code == 200
+    return [issue["id"] for issue in r.json()]
+
+
+def test_fts_query() -> None:
+    assert crud_issues.fts_query("crash folder") == '"crash" "folder"*'
+    # Operators and quotes are searched as words
+    assert crud_issues.fts_query('crash OR "side') == '"crash" "OR" "side"*'
+    assert crud_issues.fts_query("crash fo") == '"crash" "fo"'
+    assert crud_issues.fts_query(" -*() ") is None
+
+
+@pytest.mark.anyio
+async def test_search_issues(async_client: AsyncClient, async_session) -> None:
+    await add_issues(async_session)
+
+    assert set(await search(async_client, q="crash")) == {1, 3}
+    assert await search(async_client, q="crash fold") == [1]
+    # The last word is a prefix, accents and case are ignored
+    assert await search(async_client, q="SIDÉ") == [2]
+    # The repository name is searched too
+    assert set(await search(async_client, q="mail")) == {3}
+    assert set(await search(async_client, q="crash", include_closed=True)) == {1, 3, 4}
+    assert await search(async_client, q="crash", min_bounty=50) == [3]
+    assert await search(async_client, q="crash", max_bounty=50) == [1]
+    assert await search(async_client, q="nothing") == []
+    assert await search(async_client, q="*") == []
+
+
+@pytest.mark.anyio
+async def test_search_issues_ranked(async_client: AsyncClient, async_session) -> None:
+    await add_issues(async_session)
+
+    await async_session.execute(update(Issues).where(Issues.id == 3).values(title="Attachments from files are lost"))
+    await async_session.commit()
+
+    # A match in the title ranks before a match in the repository name
+    ids = await search(async_client, q="files")
+    assert ids[0] == 3
+    assert set(ids[1:]) == {1, 2}
+
+
+@pytest.mark.anyio
+async def test_search_index_follows_writes(async_client: AsyncClient, async_session) -> None:
+    await add_issues(async_session)
+
+    await async_session.execute(update(Issues).where(Issues.id == 1).values(title="Folder icons are blurry"))
+    await async_session.execute(delete(Issues).where(Issues.id == 3))
+    await async_session.commit()
+
+    assert await search(async_client, q="crash") == []
+    assert await search(async_client, q="blurry") == [1]
+
+
+@pytest.mark.anyio
+async def test_search_issues_pages(async_client: AsyncClient, async_session) -> None:
+    async_session.add(Repositories(id=1, name="files"))
+    async_session.add_all(
+        Issues(repository_id=1, repository_name="files", number=number, title=f"Crash number {number}",
+               state=True, url="")
+        for number in range(25)
+    )
+    await async_session.commit()
+
+    ids = []
+    url = "/api/issues/search?q=crash&limit=10"
+    while url:
+        r = await async_client.get(url)
+        assert r.status_code == 200
+        assert len(r.json()) <= 10
+        ids += [issue["id"] for issue in r.json()]
+        url = r.links.get("next", {}).get("url")
+    assert sorted(ids) == list(range(1, 26))
+
+
+@pytest.mark.anyio
+async def test_search_html(async_client: AsyncClient, async_session) -> None:
+    await add_issues(async_session)
+
+    r = await async_client.get("/search", params={"q": "crash"})
+    assert r.status_code == 200
+    assert "Crash when renaming a folder" in r.text
+    assert "Sidebar is too wide" not in r.text
+    r = await async_client.get("/search")
+    assert r.status_code == 200
+    # Searches don't take the place of the other pages in the page cache
+    assert not page_cache._pages
+
+
+@pytest.mark.anyio
+async def test_search_issues_older_than_candidates(
+    async_client: AsyncClient, async_session, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(crud_issues, "SEARCH_MAX_CANDIDATES", 5)
+    async_session.add(Repositories(id=1, name="files"))
+    # Older open issues with a bounty, then more newer closed issues than candidates
+    async_session.add_all(
+        Issues(repository_id=1, repository_name="files", number=number, title=f"Crash number {number}",
+               state=number < 3, cumulative_bounty=10 if number < 3 else 0, url="")
+        for number in range(10)
+    )
+    await async_session.commit()
+
+    assert await search(async_client, q="crash") == [1, 2, 3]
+    assert await search(async_client, q="crash", min_bounty=1, include_closed=True) == [1, 2, 3]
+    r = await async_client.get("/search", params={"q": "crash"})
+    assert "Crash number 0" in r.text
@@ -3,6 +3,8 @@
 from httpx import AsyncClient
 import pytest
 
+from tests.conftest import count_statements
+
 
 @pytest.mark.anyio
 async def test_get_users(async_client: AsyncClient) -> None:
@@ -80,3 +82,66 @@ async def test_delete_user(async_client: AsyncClient) -> None:
 
     rv = await async_client.delete("api/users/delete/user/2", headers=headers)
     assert rv.status_code == 200
+
+
+@pytest.mark.anyio
+async def test_get_users_pages(async_client: AsyncClient) -> None:
+    for i in range(3):
+        payload_register = {
+            "first_name": "string",
+            "last_name": "string",
+            "email": f"user{i}@example.com",
+            "password": "string",
+            "is_admin": False,
+        }
+        await async_client.post("/auth/register", json=payload_register)
+
+    payload_login = {
+        "username": "user0@example.com",
+        "password": "string",
+    }
+    r = await async_client.post("/auth/login", data=payload_login)
+    headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+    rv = await async_client.get("api/users/get/users", params={"limit": 2}, headers=headers)
+    assert [user["email"] for user in rv.json()] == ["user0@example.com", "user1@example.com"]
+    rv = await async_client.get(rv.links["next"]["url"], headers=headers)
+    assert [user["email"] for user in rv.json()] == ["user2@example.com"]
+    assert "next" not in rv.links
+
+
+async def register_and_login(async_client: AsyncClient, email: str, is_admin: bool) -> dict:
+    payload_register = {
+        "first_name": "string",
+        "last_name": "string",
+        "email": email,
+        "password": "string",
+        "is_admin": is_admin,
+    }
+    await async_client.post("/auth/register", json=payload_register)
+    r = await async_client.post("/auth/login", data={"username": email, "password": "string"})
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+@pytest.mark.anyio
+async def test_current_user_cached(async_client: AsyncClient) -> None:
+    headers = await register_and_login(async_client, "user@example.com", True)
+    await async_client.get("api/users/get/user/1", headers=headers)
+
+    with count_statements() as counts:
+        rv = await async_client.get("api/users/get/user/1", headers=headers)
+    assert rv.status_code == 200
+    assert len(counts["statements"]) == 1  # Only the requested user
+
+
+@pytest.mark.anyio
+async def test_current_user_cache_invalidated_on_delete(async_client: AsyncClient) -> None:
+    admin_headers = await register_and_login(async_client, "user@example.com", True)
+    headers = await register_and_login(async_client, "user.two@example.com", False)
+    assert (await async_client.get("api/users/get/user/2", headers=headers)).status_code == 200
+
+    rv = await async_client.delete("api/users/delete/user/2", headers=admin_headers)
+    assert rv.status_code == 200
+
+    rv = await async_client.get("api/users/get/user/1", headers=headers)
+    assert rv.status_code == 404
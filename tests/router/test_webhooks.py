@@ -1,14 +1,32 @@
 """Tests for webhooks."""
 from unittest.mock import AsyncMock, patch
+import asyncio
 import hmac
 import hashlib
+import json
+import time
 import pytest
 from httpx import Response
 from fastapi import HTTPException, Request
 
-from app.db.models import Issues
-from app.routers.webhooks import gate_by_github_ip, webhook_github_issue
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.allowlist import GITHUB_META_RETRY, GithubHooksAllowlist
+from app.cidr import CidrSet
+from app.coalescer import IssueEventCoalescer
+from app.crud.deliveries import clear_delivery_cache
+from app.crud.repositories import get_repository_id, repository_name_from_issue
+from app.routers.webhooks import gate_by_github_ip, gate_by_stripe_ip, webhook_github_issue
 from app.routers.webhooks import verify_signature
+from tests.conftest import async_engine
+
+
+@pytest.fixture(autouse=True)
+def allowlist():
+    """Give every test a cold allowlist cache which isn't persisted."""
+    fresh_allowlist = GithubHooksAllowlist(snapshot_path=None)
+    with patch("app.routers.webhooks.github_hooks_allowlist", fresh_allowlist):
+        yield fresh_allowlist
 
 
 @pytest.mark.anyio
@@ -21,7 +39,7 @@ async def test_gate_by_github_ip_valid_ip():
     async_client_response = Response(200, json={"hooks": ["192.30.252.0/22"]})
 
     with patch(
-        "app.routers.webhooks.AsyncClient.get", return_value=async_client_response
+        "app.allowlist.AsyncClient.get", return_value=async_client_response
     ):
         await gate_by_github_ip(request)  # Should not raise an exception
 
@@ -35,7 +53,7 @@ async def test_gate_by_github_ip_invalid_ip():
     async_client_response = Response(200, json={"hooks": ["192.30.252.0/22"]})
 
     with patch(
-        "app.routers.webhooks.AsyncClient.get", return_value=async_client_response
+        "app.allowlist.AsyncClient.get", return_value=async_client_response
     ):
         with pytest.raises(HTTPException) as exc_info:
             await gate_by_github_ip(request)
@@ -53,6 +71,89 @@ async def test_gate_by_github_ip_invalid_ip_format():
     assert exc_info.value.status_code == 400
 
 
+@pytest.mark.anyio
+async def test_gate_by_github_ip_cached():
+    """Test Github hook ranges are fetched once and then served from memory."""
+    request = AsyncMock(Request)
+    request.client.host = "192.30.252.1"
+
+    async_client_response = Response(200, json={"hooks": ["192.30.252.0/22"]})
+
+    with patch(
+        "app.allowlist.AsyncClient.get", return_value=async_client_response
+    ) as mock_get:
+        await gate_by_github_ip(request)
+        await gate_by_github_ip(request)
+    mock_get.assert_called_once()
+
+
+@pytest.mark.anyio
+async def test_gate_by_github_ip_stale_refreshed_in_background(allowlist):
+    """Test stale Github hook ranges are served while being refreshed."""
+    allowlist.set_hooks(["192.30.252.0/22"], time.time() - allowlist.ttl - 1)
+    request = AsyncMock(Request)
+    request.client.host = "140.82.112.1"
+
+    async_client_response = Response(200, json={"hooks": ["140.82.112.0/20"]})
+
+    with patch("app.allowlist.AsyncClient.get", return_value=async_client_response):
+        with pytest.raises(HTTPException) as exc_info:
+            await gate_by_github_ip(request)
+        assert exc_info.value.status_code == 403
+        await asyncio.sleep(0)
+        await allowlist._refresh_task  # pylint: disable=protected-access
+
+    await gate_by_github_ip(request)  # Should not raise an exception
+
+
+@pytest.mark.anyio
+async def test_gate_by_github_ip_cold_start_from_snapshot(tmp_path):
+    """Test the persisted Github hook ranges are used when the API is down."""
+    snapshot_path = tmp_path / "github_meta.json"
+    snapshot_path.write_text(json.dumps({"fetched_at": time.time(), "hooks": ["192.30.252.0/22"]}))
+    request = AsyncMock(Request)
+    request.client.host = "192.30.252.1"
+
+    with patch("app.routers.webhooks.github_hooks_allowlist", GithubHooksAllowlist(snapshot_path=str(snapshot_path))):
+        with patch("app.allowlist.AsyncClient.get", return_value=Response(503)) as mock_get:
+            await gate_by_github_ip(request)  # Should not raise an exception
+    mock_get.assert_not_called()
+
+
+@pytest.mark.anyio
+async def test_gate_by_github_ip_unavailable(allowlist):
+    """Test Github hook ranges can't be fetched and nothing is cached."""
+    request = AsyncMock(Request)
+    request.client.host = "192.30.252.1"
+
+    with patch("app.allowlist.AsyncClient.get", return_value=Response(503)) as mock_get:
+        for _ in range(3):
+            with pytest.raises(HTTPException) as exc_info:
+                await gate_by_github_ip(request)
+            assert exc_info.value.status_code == 503
+    # The failure is kept until the retry delay is over
+    mock_get.assert_called_once()
+
+    allowlist._last_attempt -= GITHUB_META_RETRY  # pylint: disable=protected-access
+    with patch("app.allowlist.AsyncClient.get", return_value=Response(200, json={"hooks": ["192.30.252.0/22"]})):
+        await gate_by_github_ip(request)  # Should not raise an exception
+
+
+@pytest.mark.anyio
+async def test_gate_by_stripe_ip():
+    """Test the optional Stripe hook allowlist."""
+    request = AsyncMock(Request)
+    request.client.host = "3.18.12.63"
+    await gate_by_stripe_ip(request)  # Not configured, should not raise an exception
+
+    with patch("app.routers.webhooks.STRIPE_WEBHOOK_IPS", CidrSet(["3.18.12.63/32"])):
+        await gate_by_stripe_ip(request)  # Should not raise an exception
+        request.client.host = "8.8.8.8"
+        with pytest.raises(HTTPException) as exc_info:
+            await gate_by_stripe_ip(request)
+        assert exc_info.value.status_code == 403
+
+
 def test_verify_signature_valid():
     """Test valid signature."""
     payload_body = b"test payload"
@@ -94,20 +195,78 @@ async def test_webhook_github_issue_non_eligible(mock_verify_signature):
 
 @pytest.mark.anyio
 @patch("app.routers.webhooks.verify_signature")
-@patch("app.routers.webhooks.crud_issues.get_issue")
-async def test_webhook_github_issue_eligible(mock_get_issue, mock_verify_signature):
+@patch("app.routers.webhooks.crud_issues.upsert_issue")
+async def test_webhook_github_issue_eligible(mock_upsert_issue, mock_verify_signature):
     """Test webhook_github_issue with a non-eligible issue."""
     request = AsyncMock(Request)
     request.body = AsyncMock(return_value=b'{"issue": {"number": 1, "state": "open", "title": "Test Issue", "labels": [{"name":"confirmed"}]}}')
     request.headers = {"x-hub-signature-256": "valid_signature"}
     db = AsyncMock()
-    mock_get_issue.return_value = Issues(
-            title="Test Issue",
-            repository_id=123,
-            state="open",
-            number=1,
-            url="",
-    )
+    mock_upsert_issue.return_value = 1
     response = await webhook_github_issue(request, db, "issues")
     mock_verify_signature.assert_called_once()
     assert response == {"message": "An event for issue #1 received."}
+
+
+@pytest.mark.anyio
+@patch("app.routers.webhooks.GITHUB_IPS_ONLY", False)
+@patch("app.routers.webhooks.verify_signature")
+@patch("app.routers.webhooks.events.process_github_issue")
+async def test_webhook_github_issue_redelivery(mock_process, _verify_signature, async_client):
+    """Test a redelivered GitHub event is handled only once."""
+    mock_process.return_value = {"message": "An event for issue #1 received."}
+    payload = b'{"issue": {"number": 1, "state": "open", "title": "Test Issue", "labels": [{"name":"confirmed"}]}}'
+    headers = {"x-github-event": "issues", "x-github-delivery": "72d3162e-cc78-11e3-81ab-4c9367dc0958"}
+
+    rv = await async_client.post("/webhook/github/issue", content=payload, headers=headers)
+    assert rv.json() == {"message": "An event for issue #1 received."}
+
+    clear_delivery_cache()  # Also check the persisted deliveries
+    rv = await async_client.post("/webhook/github/issue", content=payload, headers=headers)
+    assert rv.json() == {"message": "Delivery 72d3162e-cc78-11e3-81ab-4c9367dc0958 was already received."}
+    mock_process.assert_awaited_once()
+
+
+@pytest.mark.anyio
+@patch("app.routers.webhooks.GITHUB_IPS_ONLY", False)
+@patch("app.routers.webhooks.verify_signature")
+async def test_webhook_github_issue_coalesced_redelivery(_verify_signature, async_client, async_session):
+    """Test a coalesced delivery is only recorded once its event is written."""
+    async def session_factory():
+        async with async_sessionmaker(bind=async_engine, expire_on_commit=False)() as db:
+            yield db
+
+    async def failing_upsert(issue, db):
+        await get_repository_id(repository_name_from_issue(issue), db, create=True)
+        raise RuntimeError("boom")
+
+    coalescer = IssueEventCoalescer(window=60, session_factory=session_factory)
+    payload = json.dumps(
+        {
+            "issue": {
+                "number": 1,
+                "state": "open",
+                "title": "Test Issue",
+                "labels": [{"name": "confirmed"}],
+                "repository_url": "https://api.github.com/repos/elementary/files",
+                "html_url": "https://github.com/elementary/files/issues/1",
+            }
+        }
+    )
+    headers = {"x-github-event": "issues", "x-github-delivery": "72d3162e-cc78-11e3-81ab-4c9367dc0958"}
+    queued = {"message": "An event for issue #1 queued."}
+
+    with patch("app.routers.webhooks.issue_coalescer", coalescer):
+        rv = await async_client.post("/webhook/github/issue", content=payload, headers=headers)
+        assert rv.json() == queued
+        with patch("app.crud.issues.upsert_issue", failing_upsert):
+            await coalescer.flush_all()
+
+        # The write failed after creating the repository, the redelivery is processed
+        rv = await async_client.post("/webhook/github/issue", content=payload, headers=headers)
+        assert rv.json() == queued
+        await coalescer.flush_all()
+
+        clear_delivery_cache()  # Also check the persisted deliveries
+        rv = await async_client.post("/webhook/github/issue", content=payload, headers=headers)
+        assert rv.json() == {"message": "Delivery 72d3162e-cc78-11e3-81ab-4c9367dc0958 was already received."}
@@ -0,0 +1,39 @@
+"""Test CIDR matching."""
+import ipaddress
+
+from app.cidr import CidrSet
+
+
+def test_cidr_set_ipv4() -> None:
+    """Test IPv4 membership."""
+    cidrs = CidrSet(["192.30.252.0/22", "185.199.108.0/22", "140.82.112.0/20"])
+    assert "192.30.252.0" in cidrs
+    assert "192.30.255.255" in cidrs
+    assert "140.82.127.1" in cidrs
+    assert "192.30.0.1" not in cidrs
+    assert "8.8.8.8" not in cidrs
+    assert ipaddress.ip_address("185.199.109.153") in cidrs
+
+
+def test_cidr_set_ipv6() -> None:
+    """Test IPv6 and IPv4-mapped membership."""
+    cidrs = CidrSet(["2a0a:a440::/29", "192.30.252.0/22"])
+    assert "2a0a:a440::1" in cidrs
+    assert "2a0a:a448::1" not in cidrs
+    assert "::ffff:192.30.252.1" in cidrs
+    assert "::1" not in cidrs
+
+
+def test_cidr_set_merges_ranges() -> None:
+    """Test overlapping and adjacent networks are merged."""
+    cidrs = CidrSet(["10.0.0.0/24", "10.0.1.0/24", "10.0.0.128/25", "10.0.3.0/24"])
+    assert len(cidrs) == 2
+    assert "10.0.1.255" in cidrs
+    assert "10.0.2.0" not in cidrs
+
+
+def test_cidr_set_empty() -> None:
+    """Test an empty set matches nothing."""
+    cidrs = CidrSet()
+    assert not cidrs
+    assert "127.0.0.1" not in cidrs
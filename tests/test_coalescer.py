@@ -0,0 +1,51 @@
+"""Test coalescing of GitHub issue events."""
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app import metrics
+from app.coalescer import IssueEventCoalescer
+
+
+async def session_factory():
+    yield AsyncMock()
+
+
+def issue_event(number: int, title: str, updated_at: str) -> dict:
+    return {
+        "issue": {
+            "number": number,
+            "title": title,
+            "state": "open",
+            "updated_at": updated_at,
+            "repository_url": "https://api.github.com/repos/elementary/files",
+        }
+    }
+
+
+@pytest.mark.anyio
+@patch("app.coalescer.events.process_github_issue")
+async def test_coalescer_writes_latest_event_once(mock_process) -> None:
+    metrics.reset()
+    coalescer = IssueEventCoalescer(window=0.05, session_factory=session_factory)
+
+    coalescer.submit(issue_event(1, "First", "2026-01-01T10:00:00Z"))
+    coalescer.submit(issue_event(1, "Third", "2026-01-01T10:00:02Z"))
+    coalescer.submit(issue_event(1, "Second", "2026-01-01T10:00:01Z"))  # Delivered out of order
+    coalescer.submit(issue_event(2, "Other", "2026-01-01T10:00:00Z"))
+    await asyncio.sleep(0.1)
+
+    titles = sorted(call.args[0]["issue"]["title"] for call in mock_process.await_args_list)
+    assert titles == ["Other", "Third"]
+    assert metrics.snapshot()["counters"]["coalescer.writes_saved"] == 2
+
+
+@pytest.mark.anyio
+@patch("app.coalescer.events.process_github_issue")
+async def test_coalescer_flush_all(mock_process) -> None:
+    coalescer = IssueEventCoalescer(window=60, session_factory=session_factory)
+    coalescer.submit(issue_event(1, "First", "2026-01-01T10:00:00Z"))
+
+    await coalescer.flush_all()
+    mock_process.assert_awaited_once()
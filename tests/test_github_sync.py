@@ -0,0 +1,150 @@
+"""Test the GitHub sync against a fake GitHub API."""
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.db.models import Issues, Repositories, SyncCheckpoints
+from app.github_sync import GithubSync, GithubSyncError
+from tests.conftest import async_engine, count_statements
+from tests.fake_github import FakeGithub
+
+
+async def session_factory():
+    async with async_sessionmaker(bind=async_engine, expire_on_commit=False)() as db:
+        yield db
+
+
+def at(day: int):
+    """Run the sync on the given day of January 2024."""
+    return patch("app.github_sync.utcnow", return_value=datetime(2024, 1, day))
+
+
+def issue_requests(github: FakeGithub, repo: str) -> list[tuple[dict, int]]:
+    return [(params, status) for path, params, status in github.responses if path == f"/repos/elementary/{repo}/issues"]
+
+
+def github_sync(github: FakeGithub, **options) -> GithubSync:
+    client = AsyncClient(transport=ASGITransport(app=github.app), base_url="http://github.test")
+    return GithubSync(client, session_factory=session_factory, org=github.org, **options)
+
+
+async def synced_issues(db) -> list[tuple]:
+    result = await db.execute(
+        select(Issues.repository_name, Issues.number, Issues.title).order_by(Issues.repository_name, Issues.number)
+    )
+    return result.tuples().all()
+
+
+@pytest.fixture
+def github() -> FakeGithub:
+    github = FakeGithub()
+    github.add_repo("files", "File browser")
+    github.add_repo("code", "Text editor")
+    github.add_repo("old", archived=True)
+    for number in range(1, 6):
+        github.add_issue("files", number, f"Files issue {number}")
+    github.add_issue("files", 6, "Unconfirmed", labels=())
+    github.add_issue("files", 7, "A pull request", pull_request={})
+    # Same number as in files
+    github.add_issue("code", 1, "Code issue 1")
+    github.add_issue("old", 1, "Archived issue")
+    return github
+
+
+@pytest.mark.anyio
+async def test_sync_writes_repositories_and_issues(async_session, github) -> None:
+    result = await github_sync(github, per_page=2, batch_size=2).sync()
+    assert result == {"repositories": 2, "issues": 6, "not_modified": 0}
+
+    names = await async_session.scalars(select(Repositories.name).order_by(Repositories.name))
+    assert names.all() == ["code", "files"]
+    assert await synced_issues(async_session) == [("code", 1, "Code issue 1")] + [
+        ("files", number, f"Files issue {number}") for number in range(1, 6)
+    ]
+
+
+@pytest.mark.anyio
+async def test_sync_upserts_in_batches(async_session, github) -> None:
+    await github_sync(github).sync()
+    github.issues["files"][0]["title"] = "Renamed"
+    github.add_issue("files", 8, "New issue")
+
+    with count_statements() as counts:
+        result = await github_sync(github, batch_size=100).sync(incremental=False)
+    assert result["issues"] == 7
+    # One upsert of the repositories and one of the issues
+    assert sum(statement.startswith("INSERT INTO repositories") for statement in counts["statements"]) == 1
+    assert sum(statement.startswith("INSERT INTO issues") for statement in counts["statements"]) == 1
+
+    issues = await synced_issues(async_session)
+    assert ("files", 1, "Renamed") in issues
+    assert ("files", 8, "New issue") in issues
+    assert len(issues) == 7
+
+
+@pytest.mark.anyio
+async def test_sync_waits_out_rate_limits(async_session, github) -> None:
+    github.rate_limit_next("/repos/elementary/files/issues", retry_after=0)
+    github.rate_limit_next("/orgs/elementary/repos", retry_after=None)
+
+    result = await github_sync(github).sync()
+    assert result["issues"] == 6
+    assert github.requests.count("/orgs/elementary/repos") == 2
+    assert github.requests.count("/repos/elementary/files/issues") == 2
+
+
+@pytest.mark.anyio
+async def test_sync_gives_up_when_always_rate_limited(async_session, github) -> None:
+    sync = github_sync(github, max_retries=0)
+    github.rate_limit_next("/orgs/elementary/repos")
+    with pytest.raises(GithubSyncError):
+        await sync.sync()
+
+
+@pytest.mark.anyio
+async def test_incremental_sync_uses_checkpoints(async_session, github) -> None:
+    with at(1):
+        await github_sync(github).sync()
+    # Nothing changed since, the listings are requested with the new `since`
+    with at(2):
+        result = await github_sync(github).sync()
+    assert result["issues"] == 0
+    assert issue_requests(github, "files")[-1] == (
+        {"labels": "confirmed", "sort": "updated", "direction": "desc", "state": "all",
+         "since": "2024-01-01T00:00:00Z", "per_page": "100", "page": "1"},
+        200,
+    )
+
+    # Then the same requests are not modified
+    with at(3), count_statements() as counts:
+        result = await github_sync(github).sync()
+    assert result == {"repositories": 2, "issues": 0, "not_modified": 3}
+    assert not any(statement.startswith("INSERT") for statement in counts["statements"])
+
+    github.update_issue("files", 2, "2024-01-03T12:00:00Z", title="Renamed", state="closed")
+    with at(4):
+        result = await github_sync(github).sync()
+    assert result == {"repositories": 2, "issues": 1, "not_modified": 2}
+    issue = (await async_session.execute(select(Issues).where(Issues.title == "Renamed"))).scalar_one()
+    assert (issue.number, issue.state) == (2, False)
+    checkpoint = await async_session.get(SyncCheckpoints, "issues:files")
+    assert (checkpoint.since, checkpoint.etag) == (datetime(2024, 1, 4), None)
+
+
+@pytest.mark.anyio
+async def test_interrupted_sync_resumes(async_session, github) -> None:
+    github.fail_next("/repos/elementary/code/issues")
+    with at(1), pytest.raises(GithubSyncError):
+        await github_sync(github).sync()
+    # The issues of the other repositories are kept with their checkpoint
+    assert [number for _, number, _ in await synced_issues(async_session)] == [1, 2, 3, 4, 5]
+
+    with at(2):
+        result = await github_sync(github).sync()
+    assert result["issues"] == 1
+    assert issue_requests(github, "files")[-1][0]["since"] == "2024-01-01T00:00:00Z"
+    assert "since" not in issue_requests(github, "code")[-1][0]
@@ -0,0 +1,56 @@
+"""Test password hashing off the event loop."""
+import asyncio
+import time
+from unittest.mock import patch
+
+import pytest
+
+from app import metrics
+from app.hashing import PasswordHasher, PasswordHasherBusy, password_hasher
+
+
+def slow_hash(password: str) -> str:
+    time.sleep(0.1)
+    return f"hashed-{password}"
+
+
+@pytest.mark.anyio
+@patch("app.hashing.get_password_hash", slow_hash)
+async def test_password_hasher_bounded() -> None:
+    metrics.reset()
+    hasher = PasswordHasher(workers=1, max_pending=2, executor="thread")
+
+    results = await asyncio.gather(*(hasher.hash(str(i)) for i in range(3)), return_exceptions=True)
+    assert results[:2] == ["hashed-0", "hashed-1"]
+    assert isinstance(results[2], PasswordHasherBusy)
+
+    summaries = metrics.snapshot()["summaries"]
+    assert summaries["passwords.hash_seconds"]["count"] == 2
+    # The second hash waited for the only worker
+    assert summaries["passwords.queue_seconds"]["max"] >= 0.05
+    assert metrics.snapshot()["counters"]["passwords.rejected"] == 1
+    hasher.shutdown()
+
+
+@pytest.mark.anyio
+async def test_password_hasher_verify() -> None:
+    hasher = PasswordHasher(workers=1, executor="process")
+    hashed = await hasher.hash("secret")
+    assert await hasher.verify("secret", hashed)
+    assert not await hasher.verify("wrong", hashed)
+    hasher.shutdown()
+
+
+@pytest.mark.anyio
+async def test_register_when_hashing_saturated(async_client) -> None:
+    payload_register = {
+        "first_name": "string",
+        "last_name": "string",
+        "email": "user@example.com",
+        "password": "string",
+        "is_admin": False,
+    }
+    with patch.object(password_hasher, "max_pending", 0):
+        r = await async_client.post("/auth/register", json=payload_register)
+    assert r.status_code == 503
+    assert r.headers["retry-after"] == "1"
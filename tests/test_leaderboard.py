@@ -0,0 +1,78 @@
+"""Test the hot issues leaderboard."""
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.crud import issues as crud_issues
+from app.db.models import Issues, Repositories
+from app.leaderboard import HotIssues, hot_issues
+from tests.conftest import async_engine, count_statements
+
+
+async def session_factory():
+    async with async_sessionmaker(bind=async_engine, expire_on_commit=False)() as db:
+        yield db
+
+
+def hot_issue(issue_id: int, cumulative_bounty: int) -> dict:
+    return {
+        "id": issue_id,
+        "title": f"Issue {issue_id}",
+        "url": "",
+        "repository_name": "files",
+        "number": issue_id,
+        "cumulative_bounty": cumulative_bounty,
+    }
+
+
+async def add_issues(db, count: int) -> None:
+    repository = Repositories(name="files")
+    db.add(repository)
+    await db.flush()
+    db.add_all(
+        Issues(number=number, title=f"Issue {number}", url="", repository_id=repository.id)
+        for number in range(1, count + 1)
+    )
+    await db.commit()
+
+
+@pytest.mark.anyio
+async def test_hot_issues_keeps_top_n(async_session) -> None:
+    leaderboard = HotIssues(size=3, session_factory=session_factory)
+    await leaderboard.load()
+
+    for issue_id, bounty in [(1, 10), (2, 30), (3, 20), (4, 5), (5, 25), (1, 40)]:
+        leaderboard.credit(hot_issue(issue_id, bounty))
+    leaderboard.credit(hot_issue(5, 15))  # Applied out of order
+
+    ranking = await leaderboard.get()
+    assert [(issue["id"], issue["cumulative_bounty"]) for issue in ranking] == [(1, 40), (2, 30), (5, 25)]
+
+
+@pytest.mark.anyio
+async def test_hot_issues_loaded_ordered_by_bounty(async_session) -> None:
+    await add_issues(async_session, 4)
+    for number, bounty in [(1, 5), (2, 0), (3, 20), (4, 10)]:
+        if bounty:
+            await crud_issues.bump_bounty_issue(async_session, "files", number, bounty)
+
+    leaderboard = HotIssues(size=2, session_factory=session_factory)
+    ranking = await leaderboard.get()
+    assert [(issue["number"], issue["cumulative_bounty"]) for issue in ranking] == [(3, 20), (4, 10)]
+
+
+@pytest.mark.anyio
+async def test_get_hot_html_served_from_memory(async_session, async_client) -> None:
+    await add_issues(async_session, 2)
+
+    with patch.object(hot_issues, "session_factory", session_factory):
+        await async_client.get("/hot")  # Loads the leaderboard
+        await crud_issues.bump_bounty_issue(async_session, "files", 2, 15)
+
+        with count_statements() as counts:
+            response = await async_client.get("/hot")
+    assert response.status_code == 200
+    assert "Issue 2" in response.text
+    assert "$15" in response.text
+    assert not counts["statements"]
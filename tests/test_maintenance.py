@@ -0,0 +1,113 @@
+"""Test the maintenance commands."""
+from datetime import datetime
+
+import pytest
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app import maintenance
+from app.crud import contributions as crud_contributions
+from app.db.models import BountyContributions, Issues, Repositories
+from tests.conftest import async_engine, count_statements
+
+
+async def session_factory():
+    async with async_sessionmaker(bind=async_engine, expire_on_commit=False)() as db:
+        yield db
+
+
+async def add_repositories(db) -> None:
+    db.add_all([Repositories(id=1, name="files", issues_count=0), Repositories(id=2, name="code", issues_count=9)])
+    db.add_all(
+        Issues(id=number, number=number, title=f"Issue {number}", url="", repository_id=1 + number % 2)
+        for number in range(1, 8)
+    )
+    await db.commit()
+
+
+@pytest.mark.anyio
+async def test_backfill_repository_names_in_chunks(async_session) -> None:
+    await add_repositories(async_session)
+    progress = []
+
+    with count_statements() as counts:
+        changed = await maintenance.backfill_repository_names(
+            session_factory, chunk_size=3, progress=lambda *args: progress.append(args)
+        )
+    assert changed == 7
+    assert progress == [
+        ("backfill-repository-names", 3, 7, 3),
+        ("backfill-repository-names", 6, 7, 6),
+        ("backfill-repository-names", 7, 7, 7),
+    ]
+    # One UPDATE and one commit per chunk, whatever the number of rows
+    assert sum(statement.startswith("UPDATE") for statement in counts["statements"]) == 3
+
+    result = await async_session.execute(select(Issues.number, Issues.repository_name).order_by(Issues.number))
+    assert result.tuples().all() == [(number, "code" if number % 2 else "files") for number in range(1, 8)]
+    # Nothing left to change
+    assert await maintenance.backfill_repository_names(session_factory, chunk_size=3) == 0
+
+
+@pytest.mark.anyio
+async def test_recount_issues(async_session) -> None:
+    await add_repositories(async_session)
+    # The triggers count the issues, the counts drifted e.g. with a restored backup
+    await async_session.execute(update(Repositories).values(issues_count=Repositories.id * 10))
+    await async_session.commit()
+
+    assert await maintenance.recount_issues(session_factory, chunk_size=1) == 2
+    result = await async_session.execute(select(Repositories.name, Repositories.issues_count).order_by(Repositories.id))
+    assert result.tuples().all() == [("files", 3), ("code", 4)]
+
+
+@pytest.mark.anyio
+async def test_delete_orphans(async_session) -> None:
+    await add_repositories(async_session)
+    async_session.add_all(
+        [
+            Issues(id=8, number=8, title="Orphan", url="", repository_id=3),
+            BountyContributions(issue_id=8, repository_id=3, amount=5, created_at=datetime(2024, 1, 1)),
+            BountyContributions(issue_id=1, repository_id=2, amount=5, created_at=datetime(2024, 1, 1)),
+        ]
+    )
+    await async_session.commit()
+
+    assert await maintenance.delete_orphans(session_factory, chunk_size=2) == 2
+    assert (await async_session.scalars(select(Issues.id).order_by(Issues.id))).all() == list(range(1, 8))
+    assert (await async_session.scalars(select(BountyContributions.issue_id))).all() == [1]
+
+
+@pytest.mark.anyio
+async def test_delete_orphans_recomputes_aggregates(async_session) -> None:
+    await add_repositories(async_session)
+    async_session.add_all(
+        [
+            BountyContributions(issue_id=1, repository_id=2, amount=3, created_at=datetime(2024, 1, 1)),
+            # The repository of this contribution is gone, its issue still counts it
+            BountyContributions(issue_id=1, repository_id=9, amount=4, created_at=datetime(2024, 1, 1)),
+        ]
+    )
+    await async_session.execute(
+        update(Issues).where(Issues.id == 1).values(cumulative_bounty=7, contributions_count=2)
+    )
+    await async_session.execute(
+        update(Repositories).where(Repositories.id == 2).values(total_bounty=3, contributions_count=1)
+    )
+    await async_session.commit()
+
+    assert await maintenance.delete_orphans(session_factory) == 1
+    issue = await async_session.execute(
+        select(Issues.cumulative_bounty, Issues.contributions_count).where(Issues.id == 1)
+    )
+    assert issue.tuples().one() == (3, 1)
+    repository = await async_session.execute(
+        select(Repositories.total_bounty, Repositories.contributions_count).where(Repositories.id == 2)
+    )
+    assert repository.tuples().one() == (3, 1)
+    assert await crud_contributions.verify_aggregates(session_factory) == 0
+
+
+def test_parse_args() -> None:
+    args = maintenance.parse_args(["--chunk-size", "10", "sync", "--full"])
+    assert (args.command, args.chunk_size, args.full) == ("sync", 10, True)
@@ -0,0 +1,122 @@
+"""Test the webhook outbox."""
+import asyncio
+import json
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app import outbox
+from app.crud.deliveries import clear_delivery_cache
+from app.db.models import Issues, WebhookDeadLetters, WebhookOutbox
+from tests.conftest import async_engine
+
+GITHUB_PAYLOAD = {
+    "issue": {
+        "number": 1,
+        "state": "open",
+        "title": "Test Issue",
+        "labels": [{"name": "confirmed"}],
+        "repository_url": "https://api.github.com/repos/elementary/files",
+        "html_url": "https://github.com/elementary/files/issues/1",
+    }
+}
+
+
+async def session_factory():
+    async with async_sessionmaker(bind=async_engine, expire_on_commit=False)() as db:
+        yield db
+
+
+async def drain(db, pool: outbox.OutboxWorkerPool) -> None:
+    """Run `pool` until the outbox is empty."""
+    await pool.start()
+    for _ in range(100):
+        if not await db.scalar(select(func.count()).select_from(WebhookOutbox)):
+            break
+        await asyncio.sleep(0.05)
+    await pool.stop()
+
+
+@pytest.mark.anyio
+async def test_outbox_processes_entries(async_session) -> None:
+    pool = outbox.OutboxWorkerPool(workers=2, session_factory=session_factory)
+    with patch("app.outbox.worker_pool", pool):
+        await outbox.enqueue(async_session, "github", "issues", json.dumps(GITHUB_PAYLOAD).encode())
+
+    await drain(async_session, pool)
+
+    issue = await async_session.scalar(select(Issues).where(Issues.number == 1))
+    assert issue.title == "Test Issue"
+    assert await async_session.scalar(select(func.count()).select_from(WebhookOutbox)) == 0
+
+
+@pytest.mark.anyio
+async def test_outbox_dead_letters_failing_entries(async_session) -> None:
+    pool = outbox.OutboxWorkerPool(workers=2, session_factory=session_factory)
+    pool.max_attempts = 3
+    pool.backoff = 0
+    handler = AsyncMock(side_effect=RuntimeError("boom"))
+    with patch("app.outbox.worker_pool", pool), patch.dict(outbox.HANDLERS, {"github": handler}):
+        await outbox.enqueue(async_session, "github", "issues", json.dumps(GITHUB_PAYLOAD).encode())
+        await drain(async_session, pool)
+
+    assert handler.await_count == 3
+    dead_letter = await async_session.scalar(select(WebhookDeadLetters))
+    assert dead_letter.attempts == 3
+    assert "boom" in dead_letter.last_error
+
+
+@pytest.mark.anyio
+@patch("app.outbox.WEBHOOK_INGEST_MODE", "queue")
+@patch("app.routers.webhooks.GITHUB_IPS_ONLY", False)
+@patch("app.routers.webhooks.verify_signature")
+async def test_webhook_github_issue_queued(_verify_signature, async_client, async_session) -> None:
+    rv = await async_client.post(
+        "/webhook/github/issue",
+        content=json.dumps(GITHUB_PAYLOAD),
+        headers={"x-github-event": "issues"},
+    )
+    assert rv.status_code == 200
+    assert rv.json() == {"message": "An event for issue #1 queued."}
+    entry = await async_session.scalar(select(WebhookOutbox))
+    assert entry.source == "github"
+    assert await async_session.scalar(select(func.count()).select_from(Issues)) == 0
+
+
+@pytest.mark.anyio
+@patch("app.outbox.WEBHOOK_INGEST_MODE", "queue")
+@patch("app.routers.webhooks.GITHUB_IPS_ONLY", False)
+@patch("app.routers.webhooks.verify_signature")
+async def test_webhook_github_issue_queued_with_delivery(_verify_signature, async_client, async_session) -> None:
+    headers = {"x-github-event": "issues", "x-github-delivery": "72d3162e-cc78-11e3-81ab-4c9367dc0958"}
+    # The process stops right after the outbox entry is committed
+    with patch("app.outbox.worker_pool.notify", side_effect=RuntimeError("crash")), pytest.raises(RuntimeError):
+        await async_client.post("/webhook/github/issue", content=json.dumps(GITHUB_PAYLOAD), headers=headers)
+    clear_delivery_cache()
+
+    # The delivery was committed with the entry, the redelivery isn't queued again
+    rv = await async_client.post("/webhook/github/issue", content=json.dumps(GITHUB_PAYLOAD), headers=headers)
+    assert rv.json() == {"message": "Delivery 72d3162e-cc78-11e3-81ab-4c9367dc0958 was already received."}
+    assert await async_session.scalar(select(func.count()).select_from(WebhookOutbox)) == 1
+
+
+@pytest.mark.anyio
+async def test_outbox_waits_while_entries_in_flight(async_session) -> None:
+    pool = outbox.OutboxWorkerPool(workers=1, session_factory=session_factory)
+    with patch("app.outbox.worker_pool", pool):
+        for _ in range(pool.workers * 4):
+            await outbox.enqueue(async_session, "github", "issues", json.dumps(GITHUB_PAYLOAD).encode())
+    # A full batch of due entries is still being processed by slow workers
+    pool._in_flight.update(await async_session.scalars(select(WebhookOutbox.id)))
+
+    with patch.object(pool, "_due_entries", wraps=pool._due_entries) as due_entries:
+        dispatcher = asyncio.create_task(pool._dispatch())
+        await asyncio.sleep(0.3)
+        dispatcher.cancel()
+        await asyncio.gather(dispatcher, return_exceptions=True)
+
+    # The dispatcher waits for a wakeup instead of polling again right away
+    assert due_entries.await_count == 1
+    assert pool._queue.empty()
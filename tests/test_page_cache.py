@@ -0,0 +1,65 @@
+"""Test the rendered page cache."""
+import pytest
+
+from app import events, page_cache
+from app.db.models import Repositories
+from tests.conftest import count_statements
+
+
+def github_issue(number: int, title: str) -> dict:
+    return {
+        "number": number,
+        "title": title,
+        "state": "open",
+        "labels": [{"name": "confirmed"}],
+        "repository_url": "https://api.github.com/repos/elementary/files",
+        "html_url": f"https://github.com/elementary/files/issues/{number}",
+    }
+
+
+@pytest.mark.anyio
+async def test_cached_page_etag(async_session, async_client) -> None:
+    async_session.add(Repositories(name="files"))
+    await async_session.commit()
+
+    response = await async_client.get("/")
+    assert response.status_code == 200
+    assert "files" in response.text
+    etag = response.headers["etag"]
+
+    with count_statements() as counts:
+        cached = await async_client.get("/")
+        not_modified = await async_client.get("/", headers={"If-None-Match": f"W/{etag}"})
+    assert not counts["statements"]
+    assert cached.text == response.text
+    assert cached.headers["etag"] == etag
+    assert not_modified.status_code == 304
+    assert not_modified.headers["etag"] == etag
+    assert not not_modified.content
+
+
+@pytest.mark.anyio
+async def test_cached_page_invalidated_on_commit(async_session, async_client) -> None:
+    await events.process_github_issue({"issue": github_issue(1, "Crash")}, async_session)
+    response = await async_client.get("/repository/files")
+    assert "Crash" in response.text
+
+    await events.process_github_issue({"issue": github_issue(2, "Freeze")}, async_session)
+    updated = await async_client.get("/repository/files", headers={"If-None-Match": response.headers["etag"]})
+    assert updated.status_code == 200
+    assert "Freeze" in updated.text
+    assert updated.headers["etag"] != response.headers["etag"]
+
+
+@pytest.mark.anyio
+async def test_bump_data_version_on_commit(async_session) -> None:
+    version = page_cache.data_version()
+
+    page_cache.bump_data_version_on_commit(async_session)
+    page_cache.bump_data_version_on_commit(async_session)
+    assert page_cache.data_version() == version
+    await async_session.commit()
+    assert page_cache.data_version() == version + 1
+
+    await async_session.commit()
+    assert page_cache.data_version() == version + 1
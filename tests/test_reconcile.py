@@ -0,0 +1,107 @@
+"""Test the reconciliation with GitHub against a fake GitHub API."""
+import asyncio
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import select, update
+
+from app import events
+from app.db.models import Issues, Repositories
+from app.reconcile import Reconciler
+from tests.conftest import count_statements
+from tests.fake_github import FakeGithub
+from tests.test_github_sync import github_sync, session_factory
+
+
+def reconciler(github: FakeGithub, **options) -> Reconciler:
+    return Reconciler(
+        lambda: AsyncClient(transport=ASGITransport(app=github.app), base_url="http://github.test"),
+        session_factory,
+        org=github.org,
+        **options,
+    )
+
+
+async def open_issues(db) -> list[tuple]:
+    result = await db.execute(
+        select(Issues.repository_name, Issues.number, Issues.title)
+        .where(Issues.state.is_(True))
+        .order_by(Issues.repository_name, Issues.number)
+    )
+    return result.tuples().all()
+
+
+@pytest.fixture
+async def github(async_session) -> FakeGithub:
+    github = FakeGithub()
+    github.add_repo("files")
+    github.add_repo("code")
+    for number in range(1, 4):
+        github.add_issue("files", number, f"Files issue {number}")
+        github.add_issue("code", number, f"Code issue {number}")
+    await github_sync(github).sync()
+    return github
+
+
+@pytest.mark.anyio
+async def test_reconcile_rewrites_drifted_repositories_only(async_session, github) -> None:
+    # Webhooks missed for files only
+    github.update_issue("files", 1, "2024-01-01T00:00:00Z", title="Renamed")
+    github.update_issue("files", 2, "2024-01-01T00:00:00Z", state="closed")
+    github.add_issue("files", 4, "New issue")
+
+    assert await reconciler(github).reconcile() == {"repositories": 2, "rewritten": 1, "not_modified": 0}
+    assert await open_issues(async_session) == [
+        ("code", 1, "Code issue 1"),
+        ("code", 2, "Code issue 2"),
+        ("code", 3, "Code issue 3"),
+        ("files", 1, "Renamed"),
+        ("files", 3, "Files issue 3"),
+        ("files", 4, "New issue"),
+    ]
+    counts = await async_session.execute(
+        select(Repositories.name, Repositories.issues_count, Repositories.open_issues_count).order_by(Repositories.name)
+    )
+    assert counts.tuples().all() == [("code", 3, 3), ("files", 4, 3)]
+
+    # Unchanged on both sides, each listing costs a 304 and nothing is written
+    with count_statements() as counts:
+        result = await reconciler(github).reconcile()
+    assert result == {"repositories": 2, "rewritten": 0, "not_modified": 2}
+    assert not any(statement.startswith(("INSERT", "UPDATE")) for statement in counts["statements"])
+
+
+@pytest.mark.anyio
+async def test_reconcile_keeps_webhook_issues(async_session, github) -> None:
+    # A confirmed issue arrives by webhook before the next reconciliation
+    issue = github.add_issue("files", 4, "From a webhook", labels=("confirmed", "Priority: High"))
+    await events.process_github_issue({"issue": issue}, async_session)
+
+    assert (await reconciler(github).reconcile())["rewritten"] == 0
+    assert ("files", 4, "From a webhook") in await open_issues(async_session)
+
+
+@pytest.mark.anyio
+async def test_reconcile_heals_local_drift(async_session, github) -> None:
+    await reconciler(github).reconcile()
+    await async_session.execute(update(Issues).where(Issues.number == 3).values(title="Edited locally"))
+    await async_session.commit()
+
+    result = await reconciler(github).reconcile()
+    assert result == {"repositories": 2, "rewritten": 2, "not_modified": 2}
+    assert ("code", 3, "Code issue 3") in await open_issues(async_session)
+    assert ("files", 3, "Files issue 3") in await open_issues(async_session)
+
+
+@pytest.mark.anyio
+async def test_reconcile_runs_on_schedule(async_session, github) -> None:
+    synced_requests = len(github.requests)
+    scheduled = reconciler(github, interval=0.01)
+    scheduled.start()
+    for _ in range(100):
+        if len(github.requests) > synced_requests:
+            break
+        await asyncio.sleep(0.01)
+    await scheduled.stop()
+    assert not scheduled.running
+    assert len(github.requests) > synced_requests
@@ -0,0 +1,31 @@
+"""Test the SQLite engine profile."""
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.db import sessions
+
+
+@pytest.mark.anyio
+async def test_sqlite_pragmas(tmp_path) -> None:
+    url = f"sqlite+aiosqlite:///{tmp_path / 'profile.db'}"
+    writer = create_async_engine(url, **sessions.pool_options(pool_size=1, max_overflow=0))
+    reader = create_async_engine(url, **sessions.pool_options())
+    sessions.set_sqlite_pragmas(writer)
+    sessions.set_sqlite_pragmas(reader, read_only=True)
+
+    async with writer.begin() as conn:
+        assert await conn.scalar(text("PRAGMA journal_mode")) == "wal"
+        assert await conn.scalar(text("PRAGMA synchronous")) == 1  # NORMAL
+        assert await conn.scalar(text("PRAGMA busy_timeout")) == sessions.SQLITE_BUSY_TIMEOUT
+        await conn.execute(text("CREATE TABLE bounties (amount INTEGER)"))
+        await conn.execute(text("INSERT INTO bounties VALUES (5)"))
+
+    async with reader.connect() as conn:
+        assert await conn.scalar(text("SELECT amount FROM bounties")) == 5
+        with pytest.raises(OperationalError, match="readonly"):
+            await conn.execute(text("INSERT INTO bounties VALUES (7)"))
+
+    await writer.dispose()
+    await reader.dispose()